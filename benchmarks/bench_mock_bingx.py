@@ -0,0 +1,135 @@
+# End-to-end benchmark of BingXClient (real ccxt.bingx over HTTP) against the local mock BingX server
+#
+# Запуск (з кореня репозиторію):
+#   python benchmarks/bench_mock_bingx.py                                  # 200 сигналів, 1 потік
+#   python benchmarks/bench_mock_bingx.py --workers 8 --latency-ms 30      # паралельні сигнали, пул з'єднань
+#   python benchmarks/bench_mock_bingx.py --rate-limit 20 --error-rate 0.02 --json out.json
+#   python benchmarks/bench_mock_bingx.py --no-client-rate-limit           # без обмежувача запитів ccxt
+#
+# Сервер (mock_bingx_server.py) запускається у фоновому потоці цього ж процесу. Кожен сигнал - ринковий вхід
+# (плече, тікер, ордер), STOP_MARKET та TAKE_PROFIT_MARKET ордери, як у bench_sim_exchange.py, але кожен
+# виклик - підписаний HTTP запит. Звітується: сигналів/с, p50/p99 затримка сигналу, запитів на з'єднання
+# (ефективність пулу), відповіді 429/503 та помилки клієнта за типом.
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import bingx_client # noqa: E402
+import mock_bingx_server # noqa: E402
+
+SYMBOLS = {'BTC-USDT': 65000.0, 'ETH-USDT': 3200.0, 'SOL-USDT': 150.0, 'XRP-USDT': 0.6, 'DOGE-USDT': 0.15,
+           'LINK-USDT': 14.0, 'ADA-USDT': 0.45, 'AVAX-USDT': 28.0, 'DOT-USDT': 6.5, 'PEPE-USDT': 0.00001}
+TP_DISTRIBUTION = [0.3, 0.5, 0.2]
+
+def _percentile(sorted_values: List[int], pct: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_signal(client, symbol: str, price: float, direction: str) -> bool:
+    side = 'buy' if direction == 'LONG' else 'sell'
+    sign = 1 if direction == 'LONG' else -1
+    order = client.place_market_order_basic(symbol, side, direction, margin_usdt=10.0, leverage=20)
+    if not order or not order.get('filled'):
+        return False
+    amount = order['filled']
+    if not client.set_stop_loss(symbol, direction, price * (1 - sign * 0.02), amount):
+        return False
+    tp_prices = [price * (1 + sign * step) for step in (0.01, 0.02, 0.03)]
+    return len(client.set_take_profits(symbol, direction, amount, tp_prices, TP_DISTRIBUTION)) == len(tp_prices)
+
+def bench(signals: int, workers: int, latency_ms: float, rate_limit: float, error_rate: float,
+          client_rate_limit: bool, seed: int) -> dict:
+    rng = random.Random(seed)
+    server = mock_bingx_server.MockBingXServer(symbols=SYMBOLS, latency_seconds=latency_ms / 1000.0,
+                                               rate_limit=rate_limit, seed=seed)
+    base_url, _ = server.start_in_thread()
+    client = bingx_client.BingXClient(server.api_key, server.api_secret, logging.getLogger('BingXClient'), api_url=base_url)
+    client.exchange.enableRateLimit = client_rate_limit
+    # Помилки вмикаються після завантаження ринків (інакше ініціалізація клієнта може не вдатися)
+    server.error_rate = error_rate
+    symbols = [server._symbol(market_id) for market_id in SYMBOLS]
+    jobs = [(rng.choice(symbols), rng.choice(('LONG', 'SHORT'))) for _ in range(signals)]
+
+    def timed_signal(job) -> tuple:
+        symbol, direction = job
+        start = time.perf_counter_ns()
+        try:
+            ok = run_signal(client, symbol, server.exchange.prices[symbol], direction)
+            error = None
+        except Exception as e:
+            ok, error = False, type(e).__name__
+        return ok, error, time.perf_counter_ns() - start
+
+    errors: Dict[str, int] = {}
+    latencies = []
+    completed = 0
+    total_start = time.perf_counter_ns()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for ok, error, elapsed in pool.map(timed_signal, jobs):
+            completed += ok
+            latencies.append(elapsed)
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+    total_ns = time.perf_counter_ns() - total_start
+    latencies.sort()
+
+    stats = server.summary()
+    return {
+        'signals': signals,
+        'workers': workers,
+        'completed': completed,
+        'signals_per_sec': round(signals / (total_ns / 1e9), 1) if total_ns else 0.0,
+        'p50_ms': round(_percentile(latencies, 50) / 1e6, 2),
+        'p99_ms': round(_percentile(latencies, 99) / 1e6, 2),
+        'requests': stats['requests'],
+        'connections': stats['connections'],
+        'requests_per_connection': stats['requests_per_connection'],
+        'rate_limited': stats['rate_limited'],
+        'injected_errors': stats['injected_errors'],
+        'client_errors': errors,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark BingXClient over HTTP against the local mock BingX server.")
+    parser.add_argument('--signals', type=int, default=200, help="Кількість сигналів (default: 200)")
+    parser.add_argument('--workers', type=int, default=1, help="Паралельних сигналів (default: 1)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Затримка відповіді сервера, мс (default: 0)")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Обмеження сервера, запитів/с (default: без обмеження)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Частка відповідей HTTP 503 (default: 0)")
+    parser.add_argument('--no-client-rate-limit', action='store_true', help="Вимкнути обмежувач запитів ccxt (enableRateLimit)")
+    parser.add_argument('--seed', type=int, default=1, help="Зерно генератора (default: 1)")
+    parser.add_argument('--json', dest='json_out', help="Зберегти результати у JSON файл")
+    args = parser.parse_args(argv)
+
+    # BingXClient логує кожен крок - для вимірювань логування вимикаємо
+    logging.disable(logging.CRITICAL)
+
+    result = bench(args.signals, args.workers, args.latency_ms, args.rate_limit, args.error_rate,
+                   not args.no_client_rate_limit, args.seed)
+    print(f"Сигналів: {result['signals']} (успішно: {result['completed']}, потоків: {result['workers']}), "
+          f"{result['signals_per_sec']:.1f} сигналів/с, p50 {result['p50_ms']:.1f} мс, p99 {result['p99_ms']:.1f} мс")
+    print(f"HTTP запитів: {result['requests']}, з'єднань: {result['connections']} "
+          f"({result['requests_per_connection']:.1f} запитів/з'єднання), 429: {result['rate_limited']}, 503: {result['injected_errors']}")
+    if result['client_errors']:
+        print(f"Помилки клієнта: {result['client_errors']}")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Результати збережено у {args.json_out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
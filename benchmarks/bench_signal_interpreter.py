@@ -0,0 +1,178 @@
+# Benchmark suite for signal_interpreter parsers
+#
+# Запуск (з кореня репозиторію):
+#   python benchmarks/bench_signal_interpreter.py                      # таблиця результатів
+#   python benchmarks/bench_signal_interpreter.py --json out.json      # зберегти результати
+#   python benchmarks/bench_signal_interpreter.py --baseline out.json  # порівняти з попереднім запуском
+#
+# Для кожного парсера (вбудовані parse_channel_*, граматики з config.json, prescan_message та
+# повний маршрут parse_signal) проганяється весь корпус benchmarks/corpus/signals.jsonl, включно з
+# "шумом" - повідомленнями цільового чату, які не є сигналами. Звітується: повідомлень/с,
+# p50/p99 затримка одного виклику та тимчасові алокації (tracemalloc) на повідомлення.
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import signal_interpreter # noqa: E402
+
+CORPUS_FILE = os.path.join(ROOT_DIR, 'benchmarks', 'corpus', 'signals.jsonl')
+CONFIG_FILE = os.path.join(ROOT_DIR, 'config.json')
+
+def load_corpus(path: str = CORPUS_FILE) -> List[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_bench_config(path: str = CONFIG_FILE) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    # Канал 3 може бути відсутній у робочому конфігу, але його парсер теж вимірюємо
+    config.setdefault('channels', {}).setdefault('channel_3', {"name": "Внутри графика с Джимми"})
+    return config
+
+def build_targets(config: dict) -> Dict[str, Callable[[str], object]]:
+    """Повертає {назва: функція(text)} для всіх вимірюваних парсерів."""
+    signal_interpreter.load_grammars(config)
+    targets = {
+        'prescan_message': signal_interpreter.prescan_message,
+        'parse_channel_1_entry': signal_interpreter.parse_channel_1_entry,
+        'parse_channel_1_details': lambda text: signal_interpreter.parse_channel_1_details(text, config),
+        'parse_channel_2': lambda text: signal_interpreter.parse_channel_2(text, config),
+        'parse_channel_3': lambda text: signal_interpreter.parse_channel_3(text, config),
+        'parse_channel_4': lambda text: signal_interpreter.parse_channel_4(text, config),
+        'parse_channel_5_entry': signal_interpreter.parse_channel_5_entry,
+        'parse_channel_5_details': lambda text: signal_interpreter.parse_channel_5_details(text, config),
+    }
+    for channel_key, grammar in signal_interpreter._COMPILED_GRAMMARS.items():
+        targets[f'grammar:{channel_key}'] = grammar.parse
+    for channel_key in config.get('channels', {}):
+        targets[f'parse_signal:{channel_key}'] = lambda text, key=channel_key: signal_interpreter.parse_signal(key, text, config)
+    return targets
+
+def _percentile(sorted_values: List[int], pct: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def bench_target(func: Callable[[str], object], texts: List[str], rounds: int) -> dict:
+    # Прогрів (заповнення кешів, ліниві імпорти)
+    for text in texts:
+        func(text)
+
+    # 1. Затримка кожного виклику та пропускна здатність
+    latencies = []
+    matched = 0
+    perf_counter_ns = time.perf_counter_ns
+    total_start = perf_counter_ns()
+    for _ in range(rounds):
+        for text in texts:
+            start = perf_counter_ns()
+            result = func(text)
+            latencies.append(perf_counter_ns() - start)
+            if result:
+                matched += 1
+    total_ns = perf_counter_ns() - total_start
+    latencies.sort()
+
+    # 2. Пам'ять (окремий прохід: tracemalloc помітно сповільнює виконання).
+    # Для кожного виклику - пік тимчасових алокацій понад поточний рівень; плюс блоки, що залишились
+    # після проходу по корпусу (ріст цього значення між версіями вказує на витік/ріст кешу).
+    tracemalloc.start()
+    before_snapshot = tracemalloc.take_snapshot()
+    transient = []
+    for text in texts:
+        current_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func(text)
+        transient.append(tracemalloc.get_traced_memory()[1] - current_bytes)
+    after_snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after_snapshot.compare_to(before_snapshot, 'filename')
+    retained_blocks = sum(max(stat.count_diff, 0) for stat in stats)
+
+    calls = len(latencies)
+    return {
+        'calls': calls,
+        'matched_per_round': matched // rounds if rounds else 0,
+        'msgs_per_sec': round(calls / (total_ns / 1e9), 1) if total_ns else 0.0,
+        'p50_us': round(_percentile(latencies, 50) / 1000.0, 2),
+        'p99_us': round(_percentile(latencies, 99) / 1000.0, 2),
+        'alloc_bytes_avg': round(sum(transient) / len(transient), 1) if transient else 0.0,
+        'alloc_bytes_max': max(transient) if transient else 0,
+        'retained_blocks': retained_blocks,
+    }
+
+def compare_with_baseline(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Повертає список регресій: пропускна здатність або p99 гірші за базові більше ніж на tolerance."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['msgs_per_sec'] and current['msgs_per_sec'] < base['msgs_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: msgs/s {base['msgs_per_sec']} -> {current['msgs_per_sec']}")
+        if base['p99_us'] and current['p99_us'] > base['p99_us'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {base['p99_us']}us -> {current['p99_us']}us")
+        if current['matched_per_round'] != base['matched_per_round']:
+            regressions.append(f"{name}: розпізнано {base['matched_per_round']} -> {current['matched_per_round']} повідомлень")
+    return regressions
+
+def print_table(results: Dict[str, dict], corpus_size: int):
+    print(f"Корпус: {corpus_size} повідомлень")
+    header = f"{'parser':<28}{'matched':>8}{'msgs/s':>12}{'p50 us':>9}{'p99 us':>9}{'alloc B avg':>13}{'alloc B max':>13}{'retained':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<28}{r['matched_per_round']:>8}{r['msgs_per_sec']:>12.1f}{r['p50_us']:>9.2f}{r['p99_us']:>9.2f}"
+              f"{r['alloc_bytes_avg']:>13.1f}{r['alloc_bytes_max']:>13}{r['retained_blocks']:>10}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark signal_interpreter parsers on the message corpus.")
+    parser.add_argument('--rounds', type=int, default=200, help="Кількість проходів по корпусу (default: 200)")
+    parser.add_argument('--corpus', default=CORPUS_FILE, help="Файл корпусу (JSONL)")
+    parser.add_argument('--only', help="Вимірювати лише парсери, назва яких містить цей підрядок")
+    parser.add_argument('--json', dest='json_out', help="Зберегти результати у JSON файл")
+    parser.add_argument('--baseline', help="JSON попереднього запуску для перевірки регресій")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустиме погіршення відносно baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    # Парсери логують кожен виклик - для вимірювань логування вимикаємо
+    logging.disable(logging.CRITICAL)
+
+    corpus = load_corpus(args.corpus)
+    texts = [row['text'] for row in corpus]
+    targets = build_targets(load_bench_config())
+    if args.only:
+        targets = {name: func for name, func in targets.items() if args.only in name}
+
+    results = {name: bench_target(func, texts, args.rounds) for name, func in targets.items()}
+    print_table(results, len(texts))
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump({'corpus_size': len(texts), 'rounds': args.rounds, 'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"Результати збережено у {args.json_out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nРЕГРЕСІЇ відносно baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nРегресій відносно baseline не виявлено.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# Benchmark of BingXClient order placement against the in-process simulated exchange
+#
+# Запуск (з кореня репозиторію):
+#   python benchmarks/bench_sim_exchange.py                         # 5000 сигналів, без затримки
+#   python benchmarks/bench_sim_exchange.py --latency-ms 20 --error-rate 0.01
+#   python benchmarks/bench_sim_exchange.py --json out.json
+#
+# Кожен сигнал проходить той самий шлях BingXClient, що й у SignalPipeline: ринковий вхід
+# (плече, тікер, розрахунок обсягу), STOP_MARKET та TAKE_PROFIT_MARKET ордери. Після цього price feed
+# (випадкове блукання цін) виконує SL/TP ордери. Звітується: сигналів/с, p50/p99 затримка сигналу,
+# тіків/с price feed та кінцевий стан біржі.
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import sim_exchange # noqa: E402
+
+SYMBOL_COUNT = 50
+TP_DISTRIBUTION = [0.3, 0.5, 0.2]
+
+def _percentile(sorted_values: List[int], pct: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def build_symbols(rng: random.Random, count: int = SYMBOL_COUNT) -> Dict[str, float]:
+    """Символи з цінами різного порядку (від 1e-5 до 1e5), як на реальній біржі."""
+    return {f"SIM{i}/USDT:USDT": 10.0 ** rng.uniform(-5, 5) for i in range(count)}
+
+def run_signal(client, symbol: str, price: float, direction: str) -> bool:
+    side = 'buy' if direction == 'LONG' else 'sell'
+    sign = 1 if direction == 'LONG' else -1
+    order = client.place_market_order_basic(symbol, side, direction, margin_usdt=10.0, leverage=20)
+    if not order or not order.get('filled'):
+        return False
+    amount = order['filled']
+    if not client.set_stop_loss(symbol, direction, price * (1 - sign * 0.02), amount):
+        return False
+    tp_prices = [price * (1 + sign * step) for step in (0.01, 0.02, 0.03)]
+    return len(client.set_take_profits(symbol, direction, amount, tp_prices, TP_DISTRIBUTION)) == len(tp_prices)
+
+def bench(signals: int, ticks: int, latency_ms: float, error_rate: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    exchange = sim_exchange.SimulatedExchange(latency_seconds=latency_ms / 1000.0, error_rate=error_rate, seed=seed)
+    client = sim_exchange.create_client(exchange)
+    prices = build_symbols(rng)
+    for symbol, price in prices.items():
+        exchange.set_price(symbol, price)
+    symbols = list(prices)
+
+    # 1. Сигнали: вхід + SL + 3 TP
+    latencies = []
+    completed = 0
+    perf_counter_ns = time.perf_counter_ns
+    total_start = perf_counter_ns()
+    for _ in range(signals):
+        symbol = rng.choice(symbols)
+        start = perf_counter_ns()
+        if run_signal(client, symbol, exchange.prices[symbol], rng.choice(('LONG', 'SHORT'))):
+            completed += 1
+        latencies.append(perf_counter_ns() - start)
+    signals_ns = perf_counter_ns() - total_start
+    latencies.sort()
+
+    # 2. Price feed: виконання SL/TP ордерів
+    feed = list(sim_exchange.random_walk(dict(exchange.prices), steps=max(1, ticks // len(symbols)), volatility=0.005, seed=seed))
+    feed_start = perf_counter_ns()
+    fills = exchange.run_feed(feed)
+    feed_ns = perf_counter_ns() - feed_start
+
+    summary = exchange.summary()
+    return {
+        'signals': signals,
+        'completed': completed,
+        'signals_per_sec': round(signals / (signals_ns / 1e9), 1) if signals_ns else 0.0,
+        'p50_us': round(_percentile(latencies, 50) / 1000.0, 2),
+        'p99_us': round(_percentile(latencies, 99) / 1000.0, 2),
+        'ticks': len(feed),
+        'ticks_per_sec': round(len(feed) / (feed_ns / 1e9), 1) if feed_ns else 0.0,
+        'fills': fills,
+        'open_positions': len(summary['positions']),
+        'realized_pnl': summary['realized_pnl'],
+        'api_calls': sum(summary['calls'].values()),
+        'api_errors': sum(summary['errors'].values()),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark BingXClient against the simulated exchange.")
+    parser.add_argument('--signals', type=int, default=5000, help="Кількість сигналів (default: 5000)")
+    parser.add_argument('--ticks', type=int, default=100000, help="Кількість тіків price feed (default: 100000)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Затримка відповіді біржі на виклик, мс (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Частка викликів API, що завершуються помилкою (default: 0)")
+    parser.add_argument('--seed', type=int, default=1, help="Зерно генератора (default: 1)")
+    parser.add_argument('--json', dest='json_out', help="Зберегти результати у JSON файл")
+    args = parser.parse_args(argv)
+
+    # BingXClient логує кожен крок - для вимірювань логування вимикаємо
+    logging.disable(logging.CRITICAL)
+
+    result = bench(args.signals, args.ticks, args.latency_ms, args.error_rate, args.seed)
+    print(f"Сигналів: {result['signals']} (успішно: {result['completed']}), {result['signals_per_sec']:.1f} сигналів/с, "
+          f"p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us")
+    print(f"Price feed: {result['ticks']} тіків, {result['ticks_per_sec']:.1f} тіків/с, виконано ордерів: {result['fills']}")
+    print(f"Відкритих позицій: {result['open_positions']}, реалізований PnL: {result['realized_pnl']:.2f} USDT, "
+          f"викликів API: {result['api_calls']} (помилок: {result['api_errors']})")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Результати збережено у {args.json_out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# End-to-end benchmark of Telegram intake (python-telegram-bot Application + post_handler) against a local Bot API
+#
+# Запуск (з кореня репозиторію):
+#   python benchmarks/bench_telegram_intake.py                                     # 1000 оновлень одним пакетом, polling
+#   python benchmarks/bench_telegram_intake.py --rate 200 --burst 500 --noise-ratio 0.2 --caption-ratio 0.2
+#   python benchmarks/bench_telegram_intake.py --mode webhook --handler-ms 5 --json out.json
+#
+# mock_telegram_server.py працює у фоновому потоці цього ж процесу, Application створюється
+# telegram_monitor.start_monitoring з тим самим фільтром (TEXT | CAPTION) & CHANNEL_POST, диспетчером та
+# життєвим циклом run_telegram, що й у боті. Головний обробник - заглушка (--handler-ms імітує обробку сигналу).
+# Звітується: оновлень/с прийому, затримка від появи оновлення до виклику post_handler (p50/p99),
+# тривалість post_handler, оновлень на getUpdates та час до обробки всіх сигналів диспетчером.
+# Режим webhook потребує python-telegram-bot[webhooks]; без нього бот переходить на polling (як у роботі).
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from typing import List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import mock_telegram_server # noqa: E402
+import telegram_monitor # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(ROOT_DIR, 'benchmarks', 'corpus', 'signals.jsonl')
+DEFAULT_CONFIG = os.path.join(ROOT_DIR, 'config.json')
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def bench(server: mock_telegram_server.MockTelegramServer, config: dict, handler_ms: float, timeout: float) -> dict:
+    processed = []
+
+    async def main_message_handler(title, text, source_chat_id):
+        if handler_ms:
+            await asyncio.sleep(handler_ms / 1000.0)
+        processed.append(time.perf_counter())
+
+    application = telegram_monitor.start_monitoring(server.token, config, server.target_chat_id, main_message_handler)
+    # Вимірювання post_handler: час входу (від появи оновлення на сервері) та тривалість виклику
+    handled = []
+    message_handler = application.handlers[0][0]
+    post_handler = message_handler.callback
+
+    async def timed_post_handler(update, context):
+        received = time.perf_counter()
+        await post_handler(update, context)
+        handled.append((update.update_id, received, time.perf_counter()))
+
+    message_handler.callback = timed_post_handler
+
+    task = asyncio.create_task(telegram_monitor.run_telegram(application, config))
+    deadline = time.perf_counter() + timeout
+    while (len(server.updates) < server.count or len(processed) < server.matching) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    intake_latencies = sorted(received - server.created[update_id] for update_id, received, _ in handled)
+    handler_durations = sorted(done - received for _, received, done in handled)
+    first_created = min(server.created.values(), default=0.0)
+    last_handled = max((received for _, received, _ in handled), default=first_created)
+    stats = server.summary()
+    return {
+        'mode': 'webhook' if stats['webhook_posts'] else 'polling',
+        'updates': stats['updates'],
+        'matching': stats['matching'],
+        'handled': len(handled),
+        'processed': len(processed),
+        'intake_per_sec': round(len(handled) / (last_handled - first_created), 1) if last_handled > first_created else 0.0,
+        'intake_p50_ms': round(_percentile(intake_latencies, 50) * 1000, 2),
+        'intake_p99_ms': round(_percentile(intake_latencies, 99) * 1000, 2),
+        'post_handler_p50_us': round(_percentile(handler_durations, 50) * 1e6, 1),
+        'post_handler_p99_us': round(_percentile(handler_durations, 99) * 1e6, 1),
+        'processed_in_seconds': round(max(processed) - first_created, 3) if processed else None,
+        'get_updates_calls': stats['get_updates_calls'],
+        'updates_per_poll': stats['updates_per_poll'],
+        'webhook_posts': stats['webhook_posts'],
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Telegram intake against the local Bot API stand-in.")
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling', help="Режим прийому (default: polling)")
+    parser.add_argument('--updates', type=int, default=1000, help="Кількість оновлень (default: 1000)")
+    parser.add_argument('--rate', type=float, default=0.0, help="Оновлень/с після пакета, 0 - всі одразу (default: 0)")
+    parser.add_argument('--burst', type=int, default=0, help="Оновлень, доступних одразу (default: 0)")
+    parser.add_argument('--caption-ratio', type=float, default=0.0, help="Частка постів-фото з підписом (default: 0)")
+    parser.add_argument('--noise-ratio', type=float, default=0.0, help="Частка оновлень, які відкидає фільтр (default: 0)")
+    parser.add_argument('--handler-ms', type=float, default=0.0, help="Тривалість обробки сигналу заглушкою, мс (default: 0)")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="Тексти постів (default: benchmarks/corpus/signals.jsonl)")
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help="Файл конфігурації (default: config.json)")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Максимальна тривалість прогону, с (default: 120)")
+    parser.add_argument('--seed', type=int, default=1, help="Зерно генератора (default: 1)")
+    parser.add_argument('--json', dest='json_out', help="Зберегти результати у JSON файл")
+    args = parser.parse_args(argv)
+
+    # post_handler логує кожне повідомлення - для вимірювань логування вимикаємо
+    logging.disable(logging.CRITICAL)
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    server = mock_telegram_server.MockTelegramServer(
+        mock_telegram_server.load_posts(args.corpus, config), count=args.updates, rate=args.rate, burst=args.burst,
+        caption_ratio=args.caption_ratio, noise_ratio=args.noise_ratio, seed=args.seed)
+    api_url, _ = server.start_in_thread()
+    telegram_config = config.setdefault('telegram', {})
+    telegram_config.update(mode=args.mode, api_url=api_url)
+    if args.mode == 'webhook':
+        port = _free_port()
+        telegram_config['webhook'] = {'listen': '127.0.0.1', 'port': port, 'url_path': 'telegram',
+                                      'webhook_url': f"http://127.0.0.1:{port}/telegram"}
+
+    result = asyncio.run(bench(server, config, args.handler_ms, args.timeout))
+    print(f"Режим: {result['mode']}, оновлень: {result['updates']} (проходять фільтр: {result['matching']}, "
+          f"post_handler: {result['handled']}, оброблено: {result['processed']})")
+    print(f"Прийом: {result['intake_per_sec']:.1f} оновлень/с, затримка до post_handler p50 {result['intake_p50_ms']:.1f} мс, "
+          f"p99 {result['intake_p99_ms']:.1f} мс")
+    print(f"post_handler: p50 {result['post_handler_p50_us']:.1f} us, p99 {result['post_handler_p99_us']:.1f} us; "
+          f"всі сигнали оброблено за {result['processed_in_seconds']} с")
+    if result['mode'] == 'polling':
+        print(f"getUpdates: {result['get_updates_calls']} викликів, {result['updates_per_poll']} оновлень на виклик")
+    else:
+        print(f"Webhook: {result['webhook_posts']} POST запитів")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Результати збережено у {args.json_out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
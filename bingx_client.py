@@ -7,10 +7,40 @@ import math
 import decimal
 import re
 import time
+import urllib.parse
+import metrics
+import tracing
+
+def _instrument_exchange(exchange):
+    """Обгортає HTTP запити та обмежувач запитів ccxt метриками (запити/тривалість за ендпоінтом, очікування rate limit)."""
+    fetch, throttle = exchange.fetch, exchange.throttle
+
+    def instrumented_fetch(url, method='GET', headers=None, body=None):
+        endpoint = urllib.parse.urlsplit(url).path
+        status = 'ok'
+        start = time.perf_counter()
+        try:
+            return fetch(url, method, headers, body)
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            metrics.API_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+            metrics.API_REQUESTS.inc(method=method, endpoint=endpoint, status=status)
+
+    def instrumented_throttle(cost=None):
+        with metrics.RATE_LIMIT_WAIT_SECONDS.time():
+            return throttle(cost)
+
+    exchange.fetch = instrumented_fetch
+    exchange.throttle = instrumented_throttle
 
 class BingXClient:
-    def __init__(self, api_key: str, api_secret: str, logger: logging.Logger):
-        """Ініціалізація клієнта BingX."""
+    def __init__(self, api_key: str, api_secret: str, logger: logging.Logger, exchange=None, api_url=None):
+        """Ініціалізація клієнта BingX.
+           exchange - готовий об'єкт з інтерфейсом ccxt (напр. sim_exchange.SimulatedExchange для replay/бенчмарків).
+           api_url - інша адреса REST API замість https://open-api.bingx.com (напр. локальний mock_bingx_server.py).
+        """
         self.api_key = api_key
         self.api_secret = api_secret
         self.logger = logger
@@ -20,6 +50,13 @@ class BingXClient:
             self.logger.critical("[BingXClient] API ключ або секрет не надано при ініціалізації.")
             raise ValueError("API ключ та секрет є обов'язковими.")
 
+        if exchange is not None:
+            self.exchange = exchange
+            self.exchange.options['defaultType'] = 'swap'
+            self.exchange.load_markets()
+            self.logger.info(f"[BingXClient] Використовується біржа {type(exchange).__name__} замість ccxt.bingx.")
+            return
+
         self.logger.info("[BingXClient] Ініціалізація ccxt.bingx...")
         try:
             self.exchange = ccxt.bingx({
@@ -27,6 +64,11 @@ class BingXClient:
                 'secret': self.api_secret,
                 'enableRateLimit': True,
             })
+            if api_url:
+                base_url = api_url.rstrip('/') + '/openApi'
+                self.exchange.urls['api'] = {section: base_url for section in self.exchange.urls['api']}
+                self.logger.warning(f"[BingXClient] REST API BingX перенаправлено на {base_url}")
+            _instrument_exchange(self.exchange)
             self.logger.info("[BingXClient] Встановлення defaultType='swap'...")
             self.exchange.options['defaultType'] = 'swap'
             self.logger.info("[BingXClient] Завантаження ринків...")
@@ -119,20 +161,26 @@ class BingXClient:
             return None
 
         ccxt_market_symbol = self._format_symbol_for_swap(symbol)
-        market_data = self.exchange.market(ccxt_market_symbol)
+        try:
+            market_data = self.exchange.market(ccxt_market_symbol)
+        except Exception as e:
+            self.logger.error(f"Помилка отримання ринкових даних для {ccxt_market_symbol}: {e}")
+            return None
         self.logger.info(f"-- Початок розміщення ринкового ордера ({ccxt_market_symbol}) --")
         self.logger.info(f"Параметри: side={side}, posSide={position_side}, МАРЖА={margin_usdt} USDT, плече={leverage}x")
 
         self.logger.info(f"Встановлення плеча {leverage}x для {ccxt_market_symbol} ({position_side})...")
         try:
-            self.exchange.set_leverage(leverage, ccxt_market_symbol, params={'side': position_side})
+            with tracing.span('leverage'):
+                self.exchange.set_leverage(leverage, ccxt_market_symbol, params={'side': position_side})
             self.logger.info(f"Плече встановлено.")
         except Exception as e:
             self.logger.warning(f"Помилка при встановленні плеча: {e}. Продовжуємо...", exc_info=True)
 
         self.logger.info(f"Отримання поточної ціни для {ccxt_market_symbol}...")
         try:
-            ticker = self.exchange.fetch_ticker(ccxt_market_symbol)
+            with tracing.span('price'):
+                ticker = self.exchange.fetch_ticker(ccxt_market_symbol)
             current_price = ticker.get('last')
             if not current_price:
                 self.logger.error(f"Не вдалося отримати ціну 'last' з ticker для {ccxt_market_symbol}. Ticker: {ticker}")
@@ -191,16 +239,17 @@ class BingXClient:
                 'leverage': leverage,
                 'positionSide': position_side.upper()
             }
-            if side.lower() == 'buy':
-                order = self.exchange.create_market_buy_order(ccxt_market_symbol, final_amount, params=order_params)
-            elif side.lower() == 'sell':
-                order = self.exchange.create_market_sell_order(ccxt_market_symbol, final_amount, params=order_params)
-            else:
+            if side.lower() not in ('buy', 'sell'):
                 self.logger.error(f"Неправильний параметр 'side': {side}.")
                 return None
+            with tracing.span('entry'), metrics.ORDER_SECONDS.time(type='market'):
+                if side.lower() == 'buy':
+                    order = self.exchange.create_market_buy_order(ccxt_market_symbol, final_amount, params=order_params)
+                else:
+                    order = self.exchange.create_market_sell_order(ccxt_market_symbol, final_amount, params=order_params)
 
             self.logger.info(f"[УСПІХ] Ордер успішно створено! (К-сть: {final_amount} {base_currency}, Розмір позиції ~{final_position_size_usdt:.2f} USDT, Маржа ~{margin_usdt_adjusted:.2f} USDT)")
-            self.logger.debug(f"Деталі ордеру: {order}")
+            self.logger.debug("Деталі ордеру: %s", order)
             return order
 
         except ccxt.InsufficientFunds as e:
@@ -216,6 +265,39 @@ class BingXClient:
             self.logger.error(f"Невідома помилка при створенні ордера для {ccxt_market_symbol}: {e}", exc_info=True)
             return None
 
+    def close_position_market(self, symbol: str, position_side: str, amount: float):
+        """Закриває позицію (або її частину amount) ринковим ордером. Повертає ордер або None."""
+        if not self.exchange:
+            self.logger.error("[Close] Спроба викликати метод на неініціалізованому клієнті.")
+            return None
+
+        ccxt_market_symbol = self._format_symbol_for_swap(symbol)
+        close_side = 'sell' if position_side.upper() == 'LONG' else 'buy'
+        self.logger.info(f"-- Закриття позиції {ccxt_market_symbol} ({position_side}) по ринку: {close_side.upper()} {amount} --")
+        try:
+            amount_to_close = self._round_amount(amount, ccxt_market_symbol)
+            if amount_to_close is None or amount_to_close <= 0:
+                self.logger.error(f"[Close] Не вдалося округлити обсяг {amount} або результат нульовий/від'ємний: {amount_to_close}")
+                return None
+            with metrics.ORDER_SECONDS.time(type='close'):
+                order = self.exchange.create_order(
+                    symbol=ccxt_market_symbol,
+                    type='market',
+                    side=close_side,
+                    amount=amount_to_close,
+                    price=None,
+                    params={'positionSide': position_side.upper()}
+                )
+            self.logger.info(f"[УСПІХ] Позицію {ccxt_market_symbol} ({position_side}) закрито по ринку.")
+            self.logger.debug("Деталі ордеру закриття: %s", order)
+            return order
+        except ccxt.ExchangeError as e:
+            self.logger.error(f"[Close] Помилка біржі при закритті позиції {ccxt_market_symbol}: {e}", exc_info=True)
+            return None
+        except Exception as e:
+            self.logger.error(f"[Close] Невідома помилка при закритті позиції {ccxt_market_symbol}: {e}", exc_info=True)
+            return None
+
     def place_limit_order(self, symbol: str, direction: str, amount: float, limit_price: float, leverage: int = None):
         """Розміщує лімітний ордер (BUY або SELL) за вказаною ціною."""
         self.logger.info(f"Спроба розмістити LIMIT ордер: {direction} {amount} {symbol} @ {limit_price} (плече: {leverage or 'default'})")
@@ -260,10 +342,11 @@ class BingXClient:
 
             params = {'positionSide': position_side_param}
             self.logger.info(f"Розміщую {side.upper()} LIMIT ордер: {rounded_amount} {formatted_symbol} за ціною {rounded_price_str}")
-            if side == 'buy':
-                order = self.exchange.create_limit_buy_order(formatted_symbol, rounded_amount, rounded_price_str, params=params)
-            else:
-                order = self.exchange.create_limit_sell_order(formatted_symbol, rounded_amount, rounded_price_str, params=params)
+            with metrics.ORDER_SECONDS.time(type='limit'):
+                if side == 'buy':
+                    order = self.exchange.create_limit_buy_order(formatted_symbol, rounded_amount, rounded_price_str, params=params)
+                else:
+                    order = self.exchange.create_limit_sell_order(formatted_symbol, rounded_amount, rounded_price_str, params=params)
 
             self.logger.info(f"LIMIT ордер успішно розміщено: ID {order.get('id')}, Symbol: {order.get('symbol')}, Side: {order.get('side')}, Amount: {order.get('amount')}, Price: {order.get('price')}, Status: {order.get('status')}")
             return order
@@ -308,35 +391,29 @@ class BingXClient:
                 'workingType': 'MARK_PRICE',
             }
             
-            # --- Додано детальне логування ПЕРЕД викликом ---
-            log_params = {
-                'symbol': ccxt_market_symbol,
-                'type': order_type,
-                'side': sl_side,
-                'amount': amount_to_set,
-                'price': None, # Ціна не потрібна для STOP_MARKET
-                'params': params
-            }
-            self.logger.debug(f"[SL] Параметри для відправки в exchange.create_order: {log_params}")
+            # --- Додано детальне логування ПЕРЕД викликом (ціна не потрібна для STOP_MARKET) ---
+            self.logger.debug("[SL] Параметри для відправки в exchange.create_order: symbol=%s, type=%s, side=%s, amount=%s, price=None, params=%s",
+                              ccxt_market_symbol, order_type, sl_side, amount_to_set, params)
             # --- Кінець доданого логування ---
 
-            sl_order = self.exchange.create_order(
-                symbol=ccxt_market_symbol,
-                type=order_type,
-                side=sl_side,
-                amount=amount_to_set,
-                price=None, # Ціна не потрібна для STOP_MARKET
-                params=params
-            )
+            with metrics.ORDER_SECONDS.time(type='stop_loss'):
+                sl_order = self.exchange.create_order(
+                    symbol=ccxt_market_symbol,
+                    type=order_type,
+                    side=sl_side,
+                    amount=amount_to_set,
+                    price=None, # Ціна не потрібна для STOP_MARKET
+                    params=params
+                )
 
             # --- Додано детальне логування результату ---
-            self.logger.debug(f"[SL] Результат від exchange.create_order: {sl_order}")
+            self.logger.debug("[SL] Результат від exchange.create_order: %s", sl_order)
             # --- Кінець доданого логування ---
 
             # Перевірка, чи ордер дійсно створено (деякі біржі можуть повертати None або [])
             if sl_order and isinstance(sl_order, dict) and sl_order.get('id'):
                 self.logger.info(f"[УСПІХ] Ордер Stop Loss успішно створено!")
-                self.logger.debug(f"Деталі SL ордеру: {sl_order}")
+                self.logger.debug("Деталі SL ордеру: %s", sl_order)
                 return sl_order
             else:
                 self.logger.error(f"[SL] Не вдалося створити ордер. Відповідь біржі: {sl_order}")
@@ -437,18 +514,20 @@ class BingXClient:
                     'positionSide': position_side.upper(),
                     'workingType': 'MARK_PRICE',
                 }
-                self.logger.debug(f"Параметри для create_order (TP {i+1}): symbol={ccxt_market_symbol}, type={order_type}, side={tp_side}, amount={amount_to_place_final}, params={params}")
-
-                tp_order = self.exchange.create_order(
-                    symbol=ccxt_market_symbol,
-                    type=order_type,
-                    side=tp_side,
-                    amount=amount_to_place_final,
-                    price=None,
-                    params=params
-                )
-
-                self.logger.debug(f"[TP {i+1}] Результат від exchange.create_order: {tp_order}")
+                self.logger.debug("Параметри для create_order (TP %d): symbol=%s, type=%s, side=%s, amount=%s, params=%s",
+                                  i + 1, ccxt_market_symbol, order_type, tp_side, amount_to_place_final, params)
+
+                with metrics.ORDER_SECONDS.time(type='take_profit'):
+                    tp_order = self.exchange.create_order(
+                        symbol=ccxt_market_symbol,
+                        type=order_type,
+                        side=tp_side,
+                        amount=amount_to_place_final,
+                        price=None,
+                        params=params
+                    )
+
+                self.logger.debug("[TP %d] Результат від exchange.create_order: %s", i + 1, tp_order)
                 
                 if tp_order and isinstance(tp_order, dict) and tp_order.get('id'):
                     self.logger.info(f"[TP {i+1}] Ордер успішно створено.")
@@ -497,7 +576,7 @@ class BingXClient:
         try:
             order_info = self.exchange.fetch_order(order_id, ccxt_market_symbol)
             self.logger.info(f"[BingXClient] Дані для ордера {order_id} успішно отримано.")
-            self.logger.debug(f"Деталі ордера {order_id}: {order_info}")
+            self.logger.debug("Деталі ордера %s: %s", order_id, order_info)
             return order_info
         except ccxt.OrderNotFound as e:
             self.logger.warning(f"[BingXClient] Ордер ID {order_id} для {ccxt_market_symbol} не знайдено: {e}")
@@ -591,7 +670,7 @@ class BingXClient:
             )
             
             self.logger.info(f"[BingXClient] Ордер {order_id} успішно змінено (або створено новий з тим же ID).")
-            self.logger.debug(f"Деталі зміненого ордеру: {edited_order}")
+            self.logger.debug("Деталі зміненого ордеру: %s", edited_order)
             return edited_order
 
         except ccxt.NotSupported as e:
@@ -631,7 +710,7 @@ class BingXClient:
             active_positions = [p for p in positions if p.get('contracts') is not None and float(p.get('contracts', 0)) != 0]
             
             self.logger.info(f"[BingXClient] Отримано {len(active_positions)} активних позицій" + (f" для {target_symbol}." if target_symbol else "."))
-            self.logger.debug(f"Активні позиції: {active_positions}")
+            self.logger.debug("Активні позиції: %s", active_positions)
             return active_positions
             
         except ccxt.ExchangeError as e:
@@ -678,6 +757,22 @@ class BingXClient:
             self.logger.error(f"[BingXClient] Неочікувана помилка при скасуванні ордера {order_id} для {ccxt_market_symbol}: {e}", exc_info=True)
             raise e # <--- RE-RAISE THE EXCEPTION
             
+    def cancel_multiple_orders(self, symbol: str, order_ids: list) -> list:
+        """Скасовує кілька ордерів (напр. SL/TP при відкаті частково створеної позиції).
+
+        На відміну від cancel_order, не кидає виняток: помилки логуються, а повертається список
+        ID ордерів, які вдалося скасувати.
+        """
+        canceled_ids = []
+        for order_id in order_ids:
+            try:
+                if self.cancel_order(symbol, order_id):
+                    canceled_ids.append(order_id)
+            except Exception as e:
+                self.logger.error(f"[BingXClient] Не вдалося скасувати ордер {order_id} для {symbol}: {e}")
+        self.logger.info(f"[BingXClient] Скасовано {len(canceled_ids)}/{len(order_ids)} ордерів для {symbol}.")
+        return canceled_ids
+
     def place_tp_order(self, symbol: str, position_side: str, tp_price: float, amount: float):
         """Встановлює ордер Take Profit для існуючої позиції."""
         if not self.exchange:
@@ -702,19 +797,21 @@ class BingXClient:
                 'positionSide': position_side.upper(),
                 'workingType': 'MARK_PRICE',
             }
-            self.logger.debug(f"Параметри для create_order (TP): symbol={ccxt_market_symbol}, type={order_type}, side={tp_side}, amount={amount_to_set}, params={params}")
-
-            tp_order = self.exchange.create_order(
-                symbol=ccxt_market_symbol,
-                type=order_type,
-                side=tp_side,
-                amount=amount_to_set,
-                price=None,
-                params=params
-            )
+            self.logger.debug("Параметри для create_order (TP): symbol=%s, type=%s, side=%s, amount=%s, params=%s",
+                              ccxt_market_symbol, order_type, tp_side, amount_to_set, params)
+
+            with metrics.ORDER_SECONDS.time(type='take_profit'):
+                tp_order = self.exchange.create_order(
+                    symbol=ccxt_market_symbol,
+                    type=order_type,
+                    side=tp_side,
+                    amount=amount_to_set,
+                    price=None,
+                    params=params
+                )
 
             self.logger.info(f"[УСПІХ] Ордер Take Profit успішно створено!")
-            self.logger.debug(f"Деталі TP ордеру: {tp_order}")
+            self.logger.debug("Деталі TP ордеру: %s", tp_order)
             return tp_order
 
         except ccxt.InvalidOrder as e:
@@ -1,18 +1,37 @@
 import sqlite3
 import json
 import logging
+import os
+import sys
 import datetime
-from typing import List, Dict, Optional, Any
+import asyncio
+import threading
+import concurrent.futures
+import time
+from typing import List, Dict, Optional, Any, Callable
+
+import metrics
 
 DATABASE_FILE = 'positions.sqlite'
 
 logger = logging.getLogger(__name__)
 
+class _InstrumentedConnection(sqlite3.Connection):
+    """З'єднання SQLite, що вимірює тривалість COMMIT (метрика db_commit_seconds)."""
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - start)
+
 # --- Ось тут має бути функція ---
 def get_db_connection() -> Optional[sqlite3.Connection]:
     """Встановлює та повертає з'єднання з базою даних SQLite."""
     try:
-        conn = sqlite3.connect(DATABASE_FILE, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        conn = sqlite3.connect(DATABASE_FILE, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                               factory=_InstrumentedConnection)
         conn.row_factory = sqlite3.Row # Повертати результати як словники
         logger.info(f"[DataManager] Успішно підключено до бази даних: {DATABASE_FILE}")
         return conn
@@ -21,8 +40,222 @@ def get_db_connection() -> Optional[sqlite3.Connection]:
         return None
 # ------------------------------------
 
+# --- Міграції схеми ---
+# Кожна міграція: (версія, опис, список кроків). Крок - це SQL-рядок або функція, що приймає cursor.
+# Міграції застосовуються по порядку при старті (initialize_database), кожна у власній транзакції,
+# а номер застосованої версії записується в таблицю schema_version.
+# ВАЖЛИВО: вже випущені міграції не змінюються - будь-яка зміна схеми оформлюється новою міграцією.
+
+def _add_column_if_missing(table: str, column: str, definition: str):
+    """Повертає крок міграції, що додає стовпець, якщо його ще немає (ALTER TABLE не має IF NOT EXISTS)."""
+    def step(cursor: sqlite3.Cursor):
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.__doc__ = f"ADD COLUMN {table}.{column}"
+    return step
+
+MIGRATIONS = [
+    (1, "Базова таблиця active_positions та тригер updated_at", [
+        '''
+        CREATE TABLE IF NOT EXISTS active_positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            signal_channel_key TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            position_side TEXT NOT NULL, -- 'LONG' or 'SHORT'
+            entry_price REAL NOT NULL,
+            initial_amount REAL NOT NULL,
+            current_amount REAL NOT NULL,
+            initial_margin REAL,
+            leverage INTEGER,
+            sl_order_id TEXT,
+            tp_order_ids TEXT, -- JSON list of strings
+            related_limit_order_id TEXT, -- For Channel 3
+            is_breakeven INTEGER NOT NULL DEFAULT 0, -- 0 = False, 1 = True
+            is_active INTEGER NOT NULL DEFAULT 1, -- 0 = False, 1 = True
+            status_info TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Тригер для автоматичного оновлення updated_at
+        '''
+        CREATE TRIGGER IF NOT EXISTS update_active_positions_updated_at
+        AFTER UPDATE ON active_positions
+        FOR EACH ROW
+        BEGIN
+            UPDATE active_positions SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
+        END;
+        ''',
+    ]),
+    (2, "Архів closed_positions та індекси для гарячої/архівної таблиць", [
+        # Гаряча таблиця active_positions містить лише відкриту книгу,
+        # закриті рядки періодично переносяться сюди (див. archive_closed_positions)
+        '''
+        CREATE TABLE IF NOT EXISTS closed_positions (
+            id INTEGER PRIMARY KEY, -- Той самий ID, що був в active_positions
+            signal_channel_key TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            position_side TEXT NOT NULL,
+            entry_price REAL NOT NULL,
+            initial_amount REAL NOT NULL,
+            current_amount REAL NOT NULL,
+            initial_margin REAL,
+            leverage INTEGER,
+            sl_order_id TEXT,
+            tp_order_ids TEXT,
+            related_limit_order_id TEXT,
+            is_breakeven INTEGER NOT NULL DEFAULT 0,
+            is_active INTEGER NOT NULL DEFAULT 0,
+            status_info TEXT,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP, -- Фактично час закриття позиції
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Індекси для історичних запитів по архіву
+        "CREATE INDEX IF NOT EXISTS idx_closed_positions_channel_closed ON closed_positions (signal_channel_key, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_closed_positions_symbol_closed ON closed_positions (symbol, updated_at)",
+        # Індекс для гарячої таблиці (вибірка відкритих позицій з сортуванням за часом створення)
+        "CREATE INDEX IF NOT EXISTS idx_active_positions_active_created ON active_positions (is_active, created_at)",
+    ]),
+    (3, "Журнал ордерів order_events, порядковий номер архівування та стан експорту", [
+        # Журнал подій ордерів: розміщення (entry/sl/tp/limit) та виконання (*_fill).
+        # Унікальність (order_id, event_type) робить запис ідемпотентним при повторних перевірках.
+        '''
+        CREATE TABLE IF NOT EXISTS order_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            position_id INTEGER,
+            symbol TEXT NOT NULL,
+            order_id TEXT NOT NULL,
+            event_type TEXT NOT NULL, -- 'entry', 'sl', 'tp', 'limit', 'entry_fill', 'tp_fill', 'sl_fill', 'limit_fill'
+            side TEXT,
+            amount REAL,
+            price REAL,
+            status TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_order_events_order_type ON order_events (order_id, event_type)",
+        "CREATE INDEX IF NOT EXISTS idx_order_events_position ON order_events (position_id)",
+        # Номер пакета архівування - монотонний ключ для інкрементального експорту архіву
+        _add_column_if_missing('closed_positions', 'archive_seq', 'INTEGER NOT NULL DEFAULT 0'),
+        "CREATE INDEX IF NOT EXISTS idx_closed_positions_archive_seq ON closed_positions (archive_seq)",
+        # Останній експортований ключ для кожного набору даних (інкрементальний експорт)
+        '''
+        CREATE TABLE IF NOT EXISTS export_state (
+            dataset TEXT PRIMARY KEY,
+            last_key INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (4, "Реалізований PnL/TP позицій та інкрементальні агрегати по каналах channel_stats", [
+        # Ціна SL з сигналу (для розрахунку R), накопичений реалізований PnL та кількість спрацьованих TP
+        _add_column_if_missing('active_positions', 'stop_loss_price', 'REAL'),
+        _add_column_if_missing('active_positions', 'realized_pnl', 'REAL NOT NULL DEFAULT 0'),
+        _add_column_if_missing('active_positions', 'tp_hits', 'INTEGER NOT NULL DEFAULT 0'),
+        _add_column_if_missing('closed_positions', 'stop_loss_price', 'REAL'),
+        _add_column_if_missing('closed_positions', 'realized_pnl', 'REAL NOT NULL DEFAULT 0'),
+        _add_column_if_missing('closed_positions', 'tp_hits', 'INTEGER NOT NULL DEFAULT 0'),
+        # Агрегати оновлюються інкрементально при закритті кожної позиції (close_position_with_stats)
+        '''
+        CREATE TABLE IF NOT EXISTS channel_stats (
+            channel_key TEXT PRIMARY KEY,
+            closed_count INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            realized_pnl REAL NOT NULL DEFAULT 0,
+            sum_r REAL NOT NULL DEFAULT 0,
+            r_count INTEGER NOT NULL DEFAULT 0, -- Кількість позицій з відомим ризиком (SL)
+            tp_hit_counts TEXT NOT NULL DEFAULT '{}', -- JSON: {кількість спрацьованих TP: кількість позицій}
+            sum_time_in_trade REAL NOT NULL DEFAULT 0, -- Секунди
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (5, "Хеші вже оброблених повідомлень seen_signals (захист від дублікатів)", [
+        '''
+        CREATE TABLE IF NOT EXISTS seen_signals (
+            content_hash TEXT PRIMARY KEY, -- Хеш нормалізованого тексту + ключ каналу
+            channel_key TEXT NOT NULL,
+            seen_at REAL NOT NULL -- Unix time першої появи
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_seen_signals_seen_at ON seen_signals (seen_at)",
+    ]),
+    (6, "Виконані входи двохетапних сигналів, що очікують деталей (pending_entries)", [
+        '''
+        CREATE TABLE IF NOT EXISTS pending_entries (
+            channel_key TEXT NOT NULL,
+            symbol TEXT NOT NULL, -- Символ ринку (формат BingXClient._format_symbol_for_swap)
+            created_at REAL NOT NULL, -- Unix time виконання входу
+            entry_info TEXT NOT NULL, -- JSON з даними входу (обсяг, ціна, ордери)
+            PRIMARY KEY (channel_key, symbol)
+        )
+        ''',
+    ]),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Повертає номер останньої застосованої міграції (0, якщо міграції ще не застосовувались)."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+def apply_migrations(conn: sqlite3.Connection) -> bool:
+    """Застосовує всі ще не застосовані міграції з MIGRATIONS.
+
+    Кожна міграція виконується в окремій транзакції BEGIN IMMEDIATE (DDL в SQLite транзакційний),
+    тому помилка в середині міграції повністю відкочує її, а попередні міграції залишаються застосованими.
+
+    Returns:
+        True, якщо схема актуальна, False у разі помилки.
+    """
+    try:
+        current_version = get_schema_version(conn)
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Не вдалося визначити версію схеми БД: {e}", exc_info=True)
+        return False
+
+    pending = [m for m in MIGRATIONS if m[0] > current_version]
+    if not pending:
+        logger.info(f"[DataManager] Схема БД актуальна (версія {current_version}).")
+        return True
+
+    logger.info(f"[DataManager] Поточна версія схеми: {current_version}. Міграцій до застосування: {len(pending)}.")
+    for version, description, steps in sorted(pending, key=lambda m: m[0]):
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+            conn.commit()
+            logger.info(f"[DataManager] Міграцію {version} ('{description}') застосовано.")
+        except sqlite3.Error as e:
+            logger.error(f"[DataManager] Помилка при застосуванні міграції {version} ('{description}'): {e}. Міграцію відкочено.", exc_info=True)
+            conn.rollback()
+            return False
+    return True
+
 def initialize_database(conn: Optional[sqlite3.Connection] = None):
-    """Створює таблицю active_positions, якщо вона не існує."""
+    """Створює/оновлює схему БД, застосовуючи міграції (див. MIGRATIONS)."""
     close_conn = False
     if conn is None:
         conn = get_db_connection()
@@ -31,44 +264,11 @@ def initialize_database(conn: Optional[sqlite3.Connection] = None):
         close_conn = True
         
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS active_positions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                signal_channel_key TEXT NOT NULL,
-                symbol TEXT NOT NULL,
-                position_side TEXT NOT NULL, -- 'LONG' or 'SHORT'
-                entry_price REAL NOT NULL,
-                initial_amount REAL NOT NULL,
-                current_amount REAL NOT NULL,
-                initial_margin REAL,
-                leverage INTEGER,
-                sl_order_id TEXT,
-                tp_order_ids TEXT, -- JSON list of strings
-                related_limit_order_id TEXT, -- For Channel 3
-                is_breakeven INTEGER NOT NULL DEFAULT 0, -- 0 = False, 1 = True
-                is_active INTEGER NOT NULL DEFAULT 1, -- 0 = False, 1 = True
-                status_info TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Додаємо тригер для автоматичного оновлення updated_at
-        cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS update_active_positions_updated_at
-            AFTER UPDATE ON active_positions
-            FOR EACH ROW
-            BEGIN
-                UPDATE active_positions SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
-            END;
-        ''')
-        conn.commit()
-        logger.info("[DataManager] Таблиця 'active_positions' успішно ініціалізована (або вже існувала). Тригер оновлення створено.")
+        if not apply_migrations(conn):
+            logger.error("[DataManager] Не вдалося застосувати міграції схеми БД.")
+            return False
+        logger.info("[DataManager] Схема БД успішно ініціалізована (або вже існувала).")
         return True
-    except sqlite3.Error as e:
-        logger.error(f"[DataManager] Помилка при ініціалізації таблиці active_positions: {e}", exc_info=True)
-        conn.rollback()
-        return False
     finally:
         if close_conn and conn:
             conn.close()
@@ -94,13 +294,13 @@ def add_new_position(conn: sqlite3.Connection, data: Dict[str, Any]) -> Optional
     
     sql = '''INSERT INTO active_positions (
                 signal_channel_key, symbol, position_side, entry_price, initial_amount, current_amount,
-                initial_margin, leverage, sl_order_id, tp_order_ids, related_limit_order_id
-             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+                initial_margin, leverage, sl_order_id, tp_order_ids, related_limit_order_id, stop_loss_price
+             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
     params = (
         data['signal_channel_key'], data['symbol'], data['position_side'], data['entry_price'], 
         data['initial_amount'], data['current_amount'], # Використовуємо переданий current_amount
         data.get('initial_margin'), data.get('leverage'), data.get('sl_order_id'), 
-        tp_ids_json, data.get('related_limit_order_id')
+        tp_ids_json, data.get('related_limit_order_id'), data.get('stop_loss_price')
     )
     
     try:
@@ -140,12 +340,16 @@ def get_active_positions(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
         return []
 
 def get_position_by_id(conn: sqlite3.Connection, position_id: int) -> Optional[Dict[str, Any]]:
-    """Повертає дані конкретної позиції за її ID."""
+    """Повертає дані конкретної позиції за її ID (спочатку з active_positions, потім з архіву)."""
     sql = "SELECT * FROM active_positions WHERE id = ?"
+    sql_archive = "SELECT * FROM closed_positions WHERE id = ?"
     try:
         cursor = conn.cursor()
         cursor.execute(sql, (position_id,))
         row = cursor.fetchone()
+        if row is None:
+            cursor.execute(sql_archive, (position_id,))
+            row = cursor.fetchone()
         if row:
             position_dict = dict(row)
             try:
@@ -285,6 +489,545 @@ def update_position_sl_and_breakeven(db_conn: sqlite3.Connection, position_id: i
         logger.error(f"Помилка оновлення SL ID та статусу ББ для позиції {position_id}: {e}", exc_info=True)
         return False
 
+# --- Архівування закритих позицій ---
+# Стовпці, які переносяться з active_positions в closed_positions (archived_at заповнюється за замовчуванням)
+_ARCHIVE_COLUMNS = (
+    'id', 'signal_channel_key', 'symbol', 'position_side', 'entry_price', 'initial_amount', 'current_amount',
+    'initial_margin', 'leverage', 'sl_order_id', 'tp_order_ids', 'related_limit_order_id',
+    'is_breakeven', 'is_active', 'status_info', 'created_at', 'updated_at',
+    'stop_loss_price', 'realized_pnl', 'tp_hits'
+)
+
+def archive_closed_positions(conn: sqlite3.Connection, batch_size: int = 500, max_batches: Optional[int] = None) -> int:
+    """Переносить закриті позиції (is_active = 0) з active_positions в closed_positions пакетами.
+
+    Кожен пакет переноситься в окремій транзакції (INSERT + DELETE), тому перервана
+    операція не залишає дублікатів або втрачених рядків.
+
+    Args:
+        conn: З'єднання з БД.
+        batch_size: Максимальна кількість рядків в одному пакеті (не більше 900 через ліміт параметрів SQLite).
+        max_batches: Обмеження кількості пакетів за один виклик (None - поки є що переносити).
+
+    Returns:
+        Кількість перенесених позицій або -1 у разі помилки.
+    """
+    batch_size = max(1, min(batch_size, 900))
+    columns_sql = ", ".join(_ARCHIVE_COLUMNS)
+    archived_total = 0
+    batches_done = 0
+    try:
+        cursor = conn.cursor()
+        while max_batches is None or batches_done < max_batches:
+            cursor.execute("SELECT id FROM active_positions WHERE is_active = 0 ORDER BY id LIMIT ?", (batch_size,))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            placeholders = ", ".join("?" for _ in ids)
+            cursor.execute(
+                f"INSERT OR REPLACE INTO closed_positions ({columns_sql}) "
+                f"SELECT {columns_sql} FROM active_positions WHERE id IN ({placeholders}) AND is_active = 0",
+                ids
+            )
+            moved = cursor.rowcount
+            # Кожен пакет отримує наступний порядковий номер (для інкрементального експорту архіву)
+            cursor.execute("SELECT COALESCE(MAX(archive_seq), 0) + 1 FROM closed_positions")
+            archive_seq = cursor.fetchone()[0]
+            cursor.execute(f"UPDATE closed_positions SET archive_seq = ? WHERE id IN ({placeholders})", [archive_seq] + ids)
+            cursor.execute(f"DELETE FROM active_positions WHERE id IN ({placeholders}) AND is_active = 0", ids)
+            conn.commit()
+            archived_total += moved
+            batches_done += 1
+            logger.debug(f"[DataManager] Пакет архівування: перенесено {moved} закритих позицій.")
+        if archived_total:
+            logger.info(f"[DataManager] Перенесено в архів {archived_total} закритих позицій ({batches_done} пакет(ів)).")
+        return archived_total
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка під час архівування закритих позицій: {e}", exc_info=True)
+        conn.rollback()
+        return -1
+
+def get_closed_positions(conn: sqlite3.Connection, channel_key: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """Повертає останні закриті позиції з архіву (опціонально - для конкретного каналу)."""
+    if channel_key:
+        sql = "SELECT * FROM closed_positions WHERE signal_channel_key = ? ORDER BY updated_at DESC LIMIT ?"
+        params = (channel_key, limit)
+    else:
+        sql = "SELECT * FROM closed_positions ORDER BY updated_at DESC LIMIT ?"
+        params = (limit,)
+    positions = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            position_dict = dict(row)
+            try:
+                tp_ids = position_dict.get('tp_order_ids')
+                position_dict['tp_order_ids'] = json.loads(tp_ids) if tp_ids else []
+            except (json.JSONDecodeError, TypeError):
+                position_dict['tp_order_ids'] = []
+            positions.append(position_dict)
+        logger.debug(f"[DataManager] Отримано {len(positions)} закритих позицій з архіву.")
+        return positions
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при отриманні закритих позицій з архіву: {e}", exc_info=True)
+        return []
+
+# --- Агрегати ефективності по каналах ---
+def _position_pnl(position_side: str, entry_price: float, exit_price: Optional[float], amount: Optional[float]) -> float:
+    """PnL (в валюті котирування) для закриття amount за exit_price."""
+    if not exit_price or not amount or not entry_price:
+        return 0.0
+    direction = 1 if str(position_side).upper() == 'LONG' else -1
+    return (exit_price - entry_price) * amount * direction
+
+def record_tp_fill(conn: sqlite3.Connection, position_id: int, new_amount: float, pnl_delta: float, tp_hits_delta: int = 1) -> bool:
+    """Фіксує виконання TP: новий залишок, приріст реалізованого PnL та лічильник TP (одним UPDATE)."""
+    sql = '''UPDATE active_positions
+             SET current_amount = ?, realized_pnl = realized_pnl + ?, tp_hits = tp_hits + ?, updated_at = CURRENT_TIMESTAMP
+             WHERE id = ?'''
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, (new_amount, pnl_delta, tp_hits_delta, position_id))
+        conn.commit()
+        if cursor.rowcount > 0:
+            logger.info(f"[DataManager] Зафіксовано TP для позиції ID {position_id}: залишок={new_amount}, PnL +{pnl_delta:.4f}.")
+            return True
+        logger.warning(f"[DataManager] Позицію ID {position_id} не знайдено під час фіксації TP.")
+        return False
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при фіксації TP для позиції ID {position_id}: {e}", exc_info=True)
+        conn.rollback()
+        return False
+
+def close_position_with_stats(conn: sqlite3.Connection, position: Dict[str, Any], status_info: str,
+                              exit_price: Optional[float] = None, exit_amount: Optional[float] = None) -> bool:
+    """Закриває позицію (is_active = 0) та інкрементально оновлює агрегати її каналу в одній транзакції.
+
+    Агрегати не перераховуються з історії: до channel_stats додаються лише внески цієї позиції
+    (PnL, R, кількість TP, час в угоді).
+
+    Args:
+        conn: З'єднання з БД.
+        position: Дані позиції (рядок active_positions).
+        status_info: Причина/деталі закриття.
+        exit_price: Середня ціна фінального закриття (напр. спрацювання SL), якщо відома.
+        exit_amount: Обсяг фінального закриття, якщо відомий.
+    """
+    position_id = position['id']
+    channel_key = position['signal_channel_key']
+    final_pnl = _position_pnl(position['position_side'], position['entry_price'], exit_price, exit_amount)
+    total_pnl = (position.get('realized_pnl') or 0.0) + final_pnl
+
+    # R-множник: PnL відносно початкового ризику (відстань до SL * початковий обсяг)
+    r_multiple = None
+    stop_loss_price = position.get('stop_loss_price')
+    if stop_loss_price:
+        risk = abs(position['entry_price'] - stop_loss_price) * position['initial_amount']
+        if risk > 0:
+            r_multiple = total_pnl / risk
+
+    created_at = position.get('created_at')
+    time_in_trade = 0.0
+    if isinstance(created_at, datetime.datetime):
+        time_in_trade = max(0.0, (datetime.datetime.utcnow() - created_at).total_seconds())
+    tp_hits_key = str(position.get('tp_hits') or 0)
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE active_positions SET is_active = 0, status_info = ?, realized_pnl = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND is_active = 1",
+            (status_info, total_pnl, position_id)
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            logger.warning(f"[DataManager] Позиція ID {position_id} вже закрита або не існує. Агрегати не змінено.")
+            return False
+        cursor.execute("INSERT OR IGNORE INTO channel_stats (channel_key) VALUES (?)", (channel_key,))
+        cursor.execute("SELECT tp_hit_counts FROM channel_stats WHERE channel_key = ?", (channel_key,))
+        tp_hit_counts = json.loads(cursor.fetchone()[0] or '{}')
+        tp_hit_counts[tp_hits_key] = tp_hit_counts.get(tp_hits_key, 0) + 1
+        cursor.execute('''
+            UPDATE channel_stats SET
+                closed_count = closed_count + 1,
+                wins = wins + ?,
+                losses = losses + ?,
+                realized_pnl = realized_pnl + ?,
+                sum_r = sum_r + ?,
+                r_count = r_count + ?,
+                tp_hit_counts = ?,
+                sum_time_in_trade = sum_time_in_trade + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE channel_key = ?
+        ''', (
+            1 if total_pnl > 0 else 0, 1 if total_pnl < 0 else 0, total_pnl,
+            r_multiple or 0.0, 1 if r_multiple is not None else 0,
+            json.dumps(tp_hit_counts, sort_keys=True), time_in_trade, channel_key
+        ))
+        conn.commit()
+        logger.info(f"[DataManager] Позицію ID {position_id} закрито ({status_info[:60]}). PnL={total_pnl:.4f}, R={r_multiple}. Агрегати '{channel_key}' оновлено.")
+        return True
+    except (sqlite3.Error, json.JSONDecodeError) as e:
+        logger.error(f"[DataManager] Помилка при закритті позиції ID {position_id} з оновленням агрегатів: {e}", exc_info=True)
+        conn.rollback()
+        return False
+
+def get_channel_stats(conn: sqlite3.Connection, channel_key: str) -> Optional[Dict[str, Any]]:
+    """Повертає агрегати ефективності каналу (пошук за первинним ключем, без перерахунку з історії).
+
+    Окрім лічильників містить похідні метрики: win_rate, avg_r, avg_time_in_trade та tp_hit_distribution.
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM channel_stats WHERE channel_key = ?", (channel_key,))
+        row = cursor.fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при отриманні агрегатів каналу '{channel_key}': {e}", exc_info=True)
+        return None
+    if not row:
+        return None
+    stats = dict(row)
+    closed_count = stats['closed_count']
+    stats['tp_hit_distribution'] = {int(k): v for k, v in json.loads(stats.pop('tp_hit_counts') or '{}').items()}
+    stats['win_rate'] = stats['wins'] / closed_count if closed_count else None
+    stats['avg_r'] = stats['sum_r'] / stats['r_count'] if stats['r_count'] else None
+    stats['avg_time_in_trade'] = stats['sum_time_in_trade'] / closed_count if closed_count else None
+    return stats
+
+# --- Журнал подій ордерів ---
+def record_order_events(conn: sqlite3.Connection, symbol: str, events: List[tuple], position_id: Optional[int] = None) -> int:
+    """Записує події ордерів (розміщення та виконання) в order_events.
+
+    Args:
+        conn: З'єднання з БД.
+        symbol: Символ ринку.
+        events: Список пар (event_type, order), де order - словник ордера ccxt.
+        position_id: ID позиції в БД (якщо вже відомий).
+
+    Returns:
+        Кількість нових записів (повторні події для того ж ордера ігноруються) або -1 у разі помилки.
+    """
+    rows = []
+    for event_type, order in events:
+        if not order or not order.get('id'):
+            continue
+        price = order.get('average') or order.get('price') or order.get('stopPrice') or order.get('triggerPrice')
+        amount = order.get('filled') if event_type.endswith('_fill') and order.get('filled') else order.get('amount')
+        rows.append((position_id, symbol, str(order['id']), event_type, order.get('side'), amount, price, order.get('status')))
+    if not rows:
+        return 0
+    sql = '''INSERT OR IGNORE INTO order_events (position_id, symbol, order_id, event_type, side, amount, price, status)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(sql, rows)
+        conn.commit()
+        logger.debug(f"[DataManager] Записано {cursor.rowcount} подій ордерів для {symbol} (позиція {position_id}).")
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при записі подій ордерів для {symbol}: {e}", exc_info=True)
+        conn.rollback()
+        return -1
+
+# --- Захист від дублікатів сигналів ---
+def remember_seen_signal(conn: sqlite3.Connection, content_hash: str, channel_key: str, seen_at: float) -> bool:
+    """Зберігає хеш обробленого повідомлення (для вже відомого хешу оновлюється seen_at - відлік TTL починається знову)."""
+    try:
+        conn.execute("""INSERT INTO seen_signals (content_hash, channel_key, seen_at) VALUES (?, ?, ?)
+                        ON CONFLICT(content_hash) DO UPDATE SET seen_at = excluded.seen_at""",
+                     (content_hash, channel_key, seen_at))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при збереженні хешу сигналу {content_hash}: {e}", exc_info=True)
+        conn.rollback()
+        return False
+
+def load_seen_signals(conn: sqlite3.Connection, not_before: float, limit: int) -> List[tuple]:
+    """Видаляє прострочені хеші (seen_at < not_before) та повертає до limit найновіших як [(hash, seen_at)] за зростанням часу."""
+    try:
+        conn.execute("DELETE FROM seen_signals WHERE seen_at < ?", (not_before,))
+        conn.commit()
+        cursor = conn.execute("SELECT content_hash, seen_at FROM seen_signals ORDER BY seen_at DESC LIMIT ?", (limit,))
+        return [(row[0], row[1]) for row in reversed(cursor.fetchall())]
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при завантаженні хешів сигналів: {e}", exc_info=True)
+        conn.rollback()
+        return []
+
+# --- Очікуючі входи двохетапних сигналів ---
+def save_pending_entry(conn: sqlite3.Connection, channel_key: str, symbol: str, created_at: float, entry_info_json: str) -> bool:
+    """Зберігає (або замінює) очікуючий вхід для (channel_key, symbol)."""
+    try:
+        conn.execute("INSERT OR REPLACE INTO pending_entries (channel_key, symbol, created_at, entry_info) VALUES (?, ?, ?, ?)",
+                     (channel_key, symbol, created_at, entry_info_json))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при збереженні очікуючого входу {symbol} ({channel_key}): {e}", exc_info=True)
+        conn.rollback()
+        return False
+
+def delete_pending_entry(conn: sqlite3.Connection, channel_key: str, symbol: str) -> bool:
+    try:
+        conn.execute("DELETE FROM pending_entries WHERE channel_key = ? AND symbol = ?", (channel_key, symbol))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при видаленні очікуючого входу {symbol} ({channel_key}): {e}", exc_info=True)
+        conn.rollback()
+        return False
+
+def load_pending_entries(conn: sqlite3.Connection) -> List[tuple]:
+    """Повертає всі очікуючі входи як [(channel_key, symbol, created_at, entry_info_json)] за зростанням часу."""
+    try:
+        cursor = conn.execute("SELECT channel_key, symbol, created_at, entry_info FROM pending_entries ORDER BY created_at")
+        return [tuple(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"[DataManager] Помилка при завантаженні очікуючих входів: {e}", exc_info=True)
+        return []
+
+# --- Експорт аналітики (Parquet / Arrow IPC) ---
+# Набори даних: (таблиця, монотонний ключ для інкрементального експорту, додаткова умова WHERE)
+EXPORT_DATASETS = {
+    'positions': ('closed_positions', 'archive_seq', None),
+    'order_events': ('order_events', 'id', None),
+    'fills': ('order_events', 'id', "event_type IN ('entry_fill', 'tp_fill', 'sl_fill', 'limit_fill')"),
+}
+
+_ARROW_TYPES_BY_DECLTYPE = {
+    'INTEGER': 'int64',
+    'REAL': 'float64',
+    'TEXT': 'string',
+    'TIMESTAMP': 'timestamp',
+}
+
+def _get_export_state(conn: sqlite3.Connection, dataset: str) -> Optional[int]:
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_key FROM export_state WHERE dataset = ?", (dataset,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _set_export_state(conn: sqlite3.Connection, dataset: str, last_key: int):
+    conn.execute(
+        "INSERT INTO export_state (dataset, last_key, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP) "
+        "ON CONFLICT(dataset) DO UPDATE SET last_key = excluded.last_key, updated_at = excluded.updated_at",
+        (dataset, last_key)
+    )
+    conn.commit()
+
+def export_dataset(conn: sqlite3.Connection, dataset: str, out_dir: str, fmt: str = 'parquet',
+                   chunk_size: int = 10000, incremental: bool = True) -> Optional[str]:
+    """Потоково експортує набір даних у Parquet або Arrow IPC файл.
+
+    Рядки читаються з БД порціями по chunk_size і одразу дописуються у файл, тому пам'ять
+    обмежена розміром однієї порції. В інкрементальному режимі експортуються лише рядки,
+    додані після попереднього запуску (стан зберігається в export_state); кожен запуск
+    створює новий файл-частину `<out_dir>/<dataset>/part-<час>.<ext>`, тож каталог можна
+    читати як один набір даних (pyarrow.dataset / pandas / polars).
+
+    Args:
+        conn: З'єднання з БД.
+        dataset: Назва набору з EXPORT_DATASETS ('positions', 'order_events', 'fills').
+        out_dir: Каталог для експорту.
+        fmt: 'parquet' або 'arrow'.
+        chunk_size: Кількість рядків в одній порції.
+        incremental: True - тільки нові рядки з моменту останнього експорту.
+
+    Returns:
+        Шлях до створеного файлу, '' якщо нових рядків немає, або None у разі помилки.
+    """
+    if dataset not in EXPORT_DATASETS:
+        logger.error(f"[DataManager Export] Невідомий набір даних для експорту: {dataset}")
+        return None
+    if fmt not in ('parquet', 'arrow'):
+        logger.error(f"[DataManager Export] Непідтримуваний формат експорту: {fmt}")
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error("[DataManager Export] Для експорту потрібен пакет pyarrow (pip install pyarrow).")
+        return None
+
+    table, key_column, extra_where = EXPORT_DATASETS[dataset]
+    out_path = None
+    tmp_path = None
+    writer = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [(row[1], (row[2] or 'TEXT').upper()) for row in cursor.fetchall()]
+        fields = []
+        for name, decltype in columns:
+            arrow_type = _ARROW_TYPES_BY_DECLTYPE.get(decltype, 'string')
+            fields.append(pa.field(name, pa.timestamp('s') if arrow_type == 'timestamp' else getattr(pa, arrow_type)()))
+        schema = pa.schema(fields)
+
+        last_key = _get_export_state(conn, dataset) if incremental else None
+        where = []
+        params: list = []
+        if last_key is not None:
+            where.append(f"{key_column} > ?")
+            params.append(last_key)
+        if extra_where:
+            where.append(extra_where)
+        # Часові стовпці читаємо як текст (CAST прибирає конвертер PARSE_DECLTYPES) і конвертуємо векторно в Arrow
+        select_columns = ", ".join(
+            f"CAST({name} AS TEXT) AS {name}" if decltype == 'TIMESTAMP' else name for name, decltype in columns
+        )
+        sql = f"SELECT {select_columns} FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {key_column}"
+
+        cursor.execute(sql, params)
+        key_index = [name for name, _ in columns].index(key_column)
+        max_key = last_key
+        rows_total = 0
+        dataset_dir = os.path.join(out_dir, dataset)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            arrays = []
+            for index, (name, decltype) in enumerate(columns):
+                values = [row[index] for row in rows]
+                if decltype == 'TIMESTAMP':
+                    arrays.append(pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True))
+                else:
+                    arrays.append(pa.array(values, schema.field(name).type))
+            batch = pa.Table.from_arrays(arrays, schema=schema)
+            if writer is None:
+                os.makedirs(dataset_dir, exist_ok=True)
+                stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+                out_path = os.path.join(dataset_dir, f"part-{stamp}.{fmt}")
+                tmp_path = out_path + '.tmp'
+                writer = pq.ParquetWriter(tmp_path, schema) if fmt == 'parquet' else pa.ipc.new_file(tmp_path, schema)
+            writer.write_table(batch)
+            rows_total += len(rows)
+            max_key = rows[-1][key_index]
+
+        if writer is None:
+            logger.info(f"[DataManager Export] Нових рядків для '{dataset}' немає.")
+            return ''
+        writer.close()
+        writer = None
+        os.replace(tmp_path, out_path)
+        # Стан оновлюємо тільки після успішного запису файлу
+        if incremental:
+            _set_export_state(conn, dataset, max_key)
+        logger.info(f"[DataManager Export] Експортовано {rows_total} рядків '{dataset}' у {out_path}.")
+        return out_path
+    except (sqlite3.Error, OSError, pa.ArrowException) as e:
+        logger.error(f"[DataManager Export] Помилка при експорті '{dataset}': {e}", exc_info=True)
+        if writer is not None:
+            writer.close()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+def export_analytics(conn: sqlite3.Connection, out_dir: str, fmt: str = 'parquet', chunk_size: int = 10000,
+                     incremental: bool = True) -> Dict[str, Optional[str]]:
+    """Експортує всі набори даних з EXPORT_DATASETS. Повертає {набір: шлях до файлу / '' / None}."""
+    return {dataset: export_dataset(conn, dataset, out_dir, fmt, chunk_size, incremental) for dataset in EXPORT_DATASETS}
+
+# --- Асинхронний доступ до БД (для asyncio циклу Telegram) ---
+# Усі операції виконуються в ОДНОМУ виділеному потоці з власним з'єднанням,
+# тому з'єднання SQLite ніколи не використовується з кількох потоків, а цикл подій не блокується.
+# Синхронний API вище залишається для PositionManager (він має власне з'єднання у своєму потоці).
+
+class AsyncDBExecutor:
+    """Виконує функції data_manager (перший аргумент - з'єднання) у виділеному потоці БД."""
+
+    def __init__(self):
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _init_db_thread(self):
+        self._conn = get_db_connection()
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="AsyncDBThread", initializer=self._init_db_thread
+                )
+                logger.info("[DataManager] Запущено виділений потік БД для асинхронного доступу.")
+            return self._executor
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict):
+        if self._conn is None:
+            raise sqlite3.OperationalError("З'єднання з БД у потоці AsyncDBThread не створено.")
+        return func(self._conn, *args, **kwargs)
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Виконує func(conn, *args, **kwargs) у потоці БД та повертає результат."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self._call, func, args, kwargs)
+
+    def close(self):
+        """Закриває з'єднання потоку БД та зупиняє потік (очікуючи завершення поставлених запитів)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        def _close_conn():
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+        executor.submit(_close_conn)
+        executor.shutdown(wait=True)
+        logger.info("[DataManager] Потік асинхронного доступу до БД зупинено.")
+
+_async_db = AsyncDBExecutor()
+
+async def run_db_async(func: Callable, *args, **kwargs):
+    """Виконує будь-яку функцію data_manager (що приймає conn першим аргументом) у потоці БД."""
+    return await _async_db.run(func, *args, **kwargs)
+
+async def add_new_position_async(data: Dict[str, Any]) -> Optional[int]:
+    return await _async_db.run(add_new_position, data)
+
+async def get_active_positions_async() -> List[Dict[str, Any]]:
+    return await _async_db.run(get_active_positions)
+
+async def get_position_by_id_async(position_id: int) -> Optional[Dict[str, Any]]:
+    return await _async_db.run(get_position_by_id, position_id)
+
+async def update_position_status_async(position_id: int, is_active: bool, status_info: str = '') -> bool:
+    return await _async_db.run(update_position_status, position_id, is_active, status_info)
+
+async def update_position_amount_async(position_id: int, new_amount: float) -> bool:
+    return await _async_db.run(update_position_amount, position_id, new_amount)
+
+async def update_position_breakeven_async(position_id: int, is_breakeven: bool) -> bool:
+    return await _async_db.run(update_position_breakeven, position_id, is_breakeven)
+
+async def update_position_limit_order_async(position_id: int, limit_order_id: Optional[str]) -> bool:
+    return await _async_db.run(update_position_limit_order, position_id, limit_order_id)
+
+async def update_position_sl_and_breakeven_async(position_id: int, new_sl_order_id: str, is_breakeven: int) -> bool:
+    return await _async_db.run(update_position_sl_and_breakeven, position_id, new_sl_order_id, is_breakeven)
+
+async def get_active_position_count_async(channel_group: str) -> int:
+    return await _async_db.run(get_active_position_count, channel_group)
+
+async def get_total_active_position_count_async() -> int:
+    return await _async_db.run(get_total_active_position_count)
+
+async def get_channel_stats_async(channel_key: str) -> Optional[Dict[str, Any]]:
+    return await _async_db.run(get_channel_stats, channel_key)
+
+async def remember_seen_signal_async(content_hash: str, channel_key: str, seen_at: float) -> bool:
+    return await _async_db.run(remember_seen_signal, content_hash, channel_key, seen_at)
+
+def close_async_db():
+    """Зупиняє потік асинхронного доступу до БД (викликається при завершенні роботи)."""
+    _async_db.close()
+
 # --- Приклад використання --- 
 if __name__ == '__main__':
     # Налаштування логування
@@ -292,6 +1035,15 @@ if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG, format=log_format)
     main_logger = logging.getLogger("DataManagerTest")
 
+    # Експорт аналітики: python data_manager.py export <каталог> [parquet|arrow]
+    if len(sys.argv) >= 3 and sys.argv[1] == 'export':
+        export_conn = get_db_connection()
+        if not export_conn or not initialize_database(export_conn):
+            exit(1)
+        results = export_analytics(export_conn, sys.argv[2], fmt=sys.argv[3] if len(sys.argv) > 3 else 'parquet')
+        export_conn.close()
+        exit(0 if all(result is not None for result in results.values()) else 1)
+
     # 1. Ініціалізація БД
     main_logger.info("Ініціалізація бази даних...")
     conn = get_db_connection()
@@ -396,6 +1148,11 @@ if __name__ == '__main__':
         else:
             main_logger.error("Не вдалося закрити позицію.")
             
+    # 11. Перенесення закритих позицій в архів
+    main_logger.info("\nАрхівування закритих позицій...")
+    archived = archive_closed_positions(conn)
+    main_logger.info(f"Перенесено в архів: {archived}. Останні закриті: {[p['id'] for p in get_closed_positions(conn, limit=5)]}")
+
     # Перевірка активних позицій після закриття
     main_logger.info("\nПеревірка активних позицій після закриття...")
     active_positions = get_active_positions(conn)
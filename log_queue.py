@@ -0,0 +1,142 @@
+# Non-blocking structured logging: records are queued by the bot threads and written as JSON by a background thread
+#
+# Root logger має лише QueueHandler: виклик logger.debug(...) кладе LogRecord у чергу без форматування
+# та запису на диск. Форматування повідомлення (record.getMessage()), серіалізація в JSON, обрізання
+# великих повідомлень та запис у bot.log виконуються потоком QueueListener.
+# Тому у гарячих шляхах великі об'єкти (ордери ccxt, текст сигналу) передаються як аргументи
+# (logger.debug("Деталі ордеру: %s", order)), а не f-рядком - інакше форматування відбувається одразу.
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import List, Optional
+
+from pythonjsonlogger import jsonlogger
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_MESSAGE_CHARS = 4000
+DEFAULT_LARGE_DEBUG_SAMPLE_EVERY = 1 # 1 = записувати всі великі DEBUG повідомлення (лише з обрізанням)
+
+JSON_FIELDS = '%(asctime)s %(levelname)s %(name)s %(threadName)s %(message)s'
+
+class _Limits:
+    """Поточні обмеження (змінюються configure() після завантаження конфігу)."""
+    max_message_chars = DEFAULT_MAX_MESSAGE_CHARS
+    large_debug_sample_every = DEFAULT_LARGE_DEBUG_SAMPLE_EVERY
+
+def _truncate(text: str) -> str:
+    limit = _Limits.max_message_chars
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... [обрізано {len(text) - limit} символів]"
+    return text
+
+class TruncatingJsonFormatter(jsonlogger.JsonFormatter):
+    """JSON-рядок на запис; повідомлення довші за max_message_chars обрізаються."""
+
+    def process_log_record(self, log_record):
+        message = log_record.get('message')
+        if isinstance(message, str):
+            log_record['message'] = _truncate(message)
+        return super().process_log_record(log_record)
+
+class TruncatingFormatter(logging.Formatter):
+    """Текстовий формат для консолі з тим самим обмеженням довжини повідомлення."""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = _truncate(record.message)
+        return super().formatMessage(record)
+
+class LargeDebugSampler(logging.Filter):
+    """Пропускає лише кожне N-те DEBUG повідомлення, довше за max_message_chars (дампи ордерів, позицій)."""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = 0
+        self.skipped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = _Limits.large_debug_sample_every
+        if every <= 1 or record.levelno > logging.DEBUG or len(record.getMessage()) <= _Limits.max_message_chars:
+            return True
+        self.seen += 1
+        if (self.seen - 1) % every == 0:
+            return True
+        self.skipped += 1
+        return False
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Кладе запис у чергу як є. Якщо черга переповнена - запис відкидається (потік бота не чекає на диск)."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартний QueueHandler форматує повідомлення тут, у потоці виклику. Повідомлення
+        # сформується потоком QueueListener; аргументи (словники ccxt) після логування не змінюються.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _BlockingStopListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Сигнал зупинки не можна відкинути навіть при повній черзі
+        self.queue.put(self._sentinel)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_sampler = LargeDebugSampler()
+_lock = threading.Lock()
+
+def install(handlers: List[logging.Handler], level: int = logging.DEBUG, queue_size: int = DEFAULT_QUEUE_SIZE) -> logging.Logger:
+    """Замінює обробники root logger на QueueHandler; handlers виконуються у фоновому потоці (з власними рівнями)."""
+    global _listener, _queue_handler
+    with _lock:
+        stop()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.setLevel(level)
+        log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        root.addHandler(_queue_handler)
+        for handler in handlers:
+            if handler.level <= logging.DEBUG:
+                handler.addFilter(_sampler)
+        _listener = _BlockingStopListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return root
+
+def configure(config: dict):
+    """Обмеження з секції config['logging'] (max_message_chars, large_debug_sample_every)."""
+    logging_config = config.get('logging', {})
+    _Limits.max_message_chars = int(logging_config.get('max_message_chars', DEFAULT_MAX_MESSAGE_CHARS))
+    _Limits.large_debug_sample_every = max(1, int(logging_config.get('large_debug_sample_every', DEFAULT_LARGE_DEBUG_SAMPLE_EVERY)))
+
+def stop():
+    """Дописує всі записи з черги та зупиняє фоновий потік. Безпечно викликати повторно."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    lost = []
+    if _queue_handler is not None and _queue_handler.dropped:
+        lost.append(f"відкинуто через переповнену чергу: {_queue_handler.dropped}")
+    if _sampler.skipped:
+        lost.append(f"пропущено великих DEBUG повідомлень (вибірка): {_sampler.skipped}")
+    if lost:
+        listener.handle(logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f"[Logging] Записів не збережено - {'; '.join(lost)}.",
+        }))
+    for handler in listener.handlers:
+        handler.flush()
+
+atexit.register(stop)
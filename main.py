@@ -5,55 +5,56 @@ import json
 import os
 import sys
 import signal
-import threading
 import time
 import sqlite3
+import asyncio
 from dotenv import load_dotenv
-from pythonjsonlogger import jsonlogger
 import inspect
-from telegram.ext import Application
 
 # Імпорт власних модулів
-import telegram_monitor
 import signal_interpreter
-import bingx_client
 import data_manager
+import log_queue
+import signal_dedup
+import metrics
+import startup
+import tracing
 import re
 from position_manager import PositionManager
-from typing import Optional
+from signal_pipeline import SignalPipeline
+from typing import TYPE_CHECKING, Optional
+
+# Важкі пакети (ccxt, python-telegram-bot) імпортуються у фазах старту, тут - лише для анотацій
+if TYPE_CHECKING:
+    import bingx_client
+    from telegram.ext import Application
 
 # --- Глобальні змінні --- 
 position_manager_instance: Optional[PositionManager] = None
-stop_event_main = threading.Event() # Подія для сигналізації про зупинку всім компонентам
 
-# Словник для зберігання пар з каналу 1, для яких очікуємо деталі
-pending_channel1_details = {}
-# Словник для зберігання пар з каналу 5, для яких очікуємо деталі
-pending_channel5_details = {}
+# Конвеєр виконання сигналів (містить входи двохетапних сигналів, що очікують деталі)
+signal_pipeline_instance: Optional[SignalPipeline] = None
 
-# --- Обробник сигналів ОС (Ctrl+C) --- 
-def signal_handler(sig, frame):
-    logger = logging.getLogger(__name__)
-    logger.warning(f"Отримано сигнал {signal.Signals(sig).name}. Ініціюю зупинку...")
-    stop_event_main.set() # Встановлюємо подію зупинки
+def get_signal_pipeline(config: dict, bingx_api_instance: 'bingx_client.BingXClient') -> SignalPipeline:
+    """Повертає спільний SignalPipeline (створює при першому виклику або зміні клієнта біржі)."""
+    global signal_pipeline_instance
+    if signal_pipeline_instance is None or signal_pipeline_instance.bingx_api is not bingx_api_instance:
+        signal_pipeline_instance = SignalPipeline(bingx_api_instance, config)
+    return signal_pipeline_instance
 
 # --- Logging Setup ---
 def setup_logging(log_file="bot.log"):
-    logger = logging.getLogger()
-    # Видаляємо всі попередні обробники, щоб уникнути дублювання
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-        
-    logger.setLevel(logging.DEBUG) # Встановлюємо рівень DEBUG для детальніших логів у файлі
+    # Обробники виконуються у фоновому потоці log_queue (форматування та запис на диск - поза гарячими шляхами)
+    handlers = []
 
     # Обробник для консолі (залишаємо INFO рівень)
     logHandlerConsole = logging.StreamHandler(sys.stdout)
     logHandlerConsole.setLevel(logging.INFO)
-    formatterConsole = logging.Formatter('%(asctime)s - %(levelname)-8s - %(name)-25s - %(message)s')
+    formatterConsole = log_queue.TruncatingFormatter('%(asctime)s - %(levelname)-8s - %(name)-25s - %(message)s')
     logHandlerConsole.setFormatter(formatterConsole)
-    logger.addHandler(logHandlerConsole)
+    handlers.append(logHandlerConsole)
 
-    # Обробник для запису у файл з ротацією
+    # Обробник для запису у файл з ротацією (JSON - один запис на рядок)
     try:
         logHandlerFile = logging.handlers.TimedRotatingFileHandler(
             filename=log_file, 
@@ -63,14 +64,15 @@ def setup_logging(log_file="bot.log"):
             encoding='utf-8'
         )
         logHandlerFile.setLevel(logging.DEBUG)
-        formatterFile = logging.Formatter('%(asctime)s - %(levelname)-8s - %(name)-25s - %(message)s')
+        formatterFile = log_queue.TruncatingJsonFormatter(log_queue.JSON_FIELDS, json_ensure_ascii=False)
         logHandlerFile.setFormatter(formatterFile)
-        logger.addHandler(logHandlerFile)
+        handlers.append(logHandlerFile)
         print(f"Логування також ведеться у файл: {log_file}")
     except Exception as e:
         print(f"Помилка при налаштуванні логування у файл {log_file}: {e}. Логування тільки в консоль.")
 
-    return logger
+    # Root logger пропускає DEBUG у чергу; рівні застосовуються обробниками
+    return log_queue.install(handlers, level=logging.DEBUG)
 
 # --- Configuration Loading ---
 def load_config(config_path='config.json'):
@@ -91,6 +93,13 @@ def load_config(config_path='config.json'):
         if 'notifications' not in config:
              logging.warning("Секція 'notifications' відсутня в конфігу.")
              config['notifications'] = {}
+
+        # Компіляція граматик сигналів (channels.<key>.grammar) - один раз при завантаженні
+        compiled_grammars = signal_interpreter.load_grammars(config)
+        logging.info(f"Скомпільовано граматик сигналів: {compiled_grammars}")
+        # Індекс маршрутизації каналів (нормалізована назва / chat_id -> ключ каналу та парсер)
+        routes_count = signal_interpreter.build_routing_index(config)
+        logging.info(f"Побудовано індекс маршрутизації каналів: {routes_count} маршрут(ів).")
              
         return config
     except FileNotFoundError:
@@ -101,59 +110,85 @@ def load_config(config_path='config.json'):
         return None
 
 # --- Перевірка лімітів слотів ---
+def _total_slot_limit(config: dict) -> Optional[int]:
+    """Загальний ліміт відкритих позицій для всіх каналів (None - ліміт не задано, відкриття дозволено)."""
+    limit = config.get('position_limits', {}).get('total_max_open')
+    if limit is None:
+        logging.getLogger(__name__).warning(f"[Slot Check] Не знайдено загальний ліміт 'total_max_open' в конфігу. Дозволено відкриття.")
+    return limit
+
+def _has_free_slot(active_count: int, limit: int, reserved: int = 0) -> bool:
+    """Рішення за кількістю активних позицій з БД (-1 - помилка БД) та слотами сигналів, що виконуються."""
+    logger = logging.getLogger(__name__)
+    if active_count == -1: # Помилка отримання даних з БД
+        logger.error(f"[Slot Check] Не вдалося отримати загальну кількість активних позицій. Блокуємо відкриття.")
+        return False
+    logger.info(f"[Slot Check] Загальний ліміт: Активних = {active_count}, Виконуються = {reserved}, Ліміт = {limit}")
+    if active_count + reserved < limit:
+        logger.info(f"[Slot Check] Є вільний слот.")
+        return True
+    logger.warning(f"[Slot Check] Загальний ліміт слотів ({limit}) вичерпано. Нова угода не відкривається.")
+    return False
+
 def check_slot_availability(config: dict) -> bool:
     """Перевіряє, чи є вільний слот для відкриття позиції.
        Використовує загальний ліміт для всіх каналів.
     """
     logger = logging.getLogger(__name__)
-    limits = config.get('position_limits', {})
-    limit = limits.get('total_max_open')
-    active_count = -1
-    conn: Optional[sqlite3.Connection] = None
-    available = False # За замовчуванням - не доступно
-
+    limit = _total_slot_limit(config)
     if limit is None:
-        logger.warning(f"[Slot Check] Не знайдено загальний ліміт 'total_max_open' в конфігу. Дозволено відкриття.")
         return True # Дозволяємо, якщо ліміт не задано
 
+    conn: Optional[sqlite3.Connection] = None
     try:
         # Створюємо тимчасове з'єднання
         conn = data_manager.get_db_connection()
         if not conn:
             logger.error(f"[Slot Check] Не вдалося створити тимчасове з'єднання з БД для перевірки слотів.")
             return False
-
         # Отримуємо загальну кількість активних позицій (для всіх каналів)
-        active_count = data_manager.get_total_active_position_count(conn)
-
-        if active_count == -1: # Помилка отримання даних з БД
-            logger.error(f"[Slot Check] Не вдалося отримати загальну кількість активних позицій. Блокуємо відкриття.")
-            available = False
-        else:
-            logger.info(f"[Slot Check] Загальний ліміт: Активних = {active_count}, Ліміт = {limit}")
-            if active_count < limit:
-                logger.info(f"[Slot Check] Є вільний слот.")
-                available = True
-            else:
-                logger.warning(f"[Slot Check] Загальний ліміт слотів ({limit}) вичерпано. Нова угода не відкривається.")
-                available = False
-
+        return _has_free_slot(data_manager.get_total_active_position_count(conn), limit)
     except sqlite3.Error as db_err:
          logger.error(f"[Slot Check] Помилка БД під час перевірки слотів: {db_err}", exc_info=True)
-         available = False
+         return False
     except Exception as e:
          logger.error(f"[Slot Check] Неочікувана помилка під час перевірки слотів: {e}", exc_info=True)
-         available = False
+         return False
     finally:
         # Гарантовано закриваємо тимчасове з'єднання
         if conn:
             conn.close()
             logger.debug("[Slot Check] Тимчасове з'єднання з БД закрито.")
 
-    return available
+async def check_slot_availability_async(config: dict, reserved: int = 0) -> bool:
+    """Асинхронна версія check_slot_availability для циклу подій Telegram.
+       Запит до БД виконується у виділеному потоці БД (data_manager), тому цикл подій не блокується.
+       reserved - слоти, зайняті сигналами, що зараз виконуються (ще не збережені в БД).
+    """
+    limit = _total_slot_limit(config)
+    if limit is None:
+        return True
+    try:
+        active_count = await data_manager.get_total_active_position_count_async()
+    except sqlite3.Error as db_err:
+        logging.getLogger(__name__).error(f"[Slot Check] Помилка БД під час перевірки слотів: {db_err}", exc_info=True)
+        return False
+    return _has_free_slot(active_count, limit, reserved)
+
+def signal_lane_key(route, signal_text: str, bingx_api_instance: 'bingx_client.BingXClient') -> Optional[str]:
+    """Ключ доріжки виконання: символ ринку сигналу (як у BingXClient), щоб вхід та деталі однієї монети
+       виконувались послідовно. None - якщо пару не знайдено (повідомлення обробляється в окремій доріжці).
+       Викликається в циклі подій при прийомі, тому шукається лише пара (route.pair_hint), без повного парсингу.
+    """
+    if not route:
+        return None
+    pair = route.pair_hint(signal_text)
+    if not pair:
+        return None
+    return bingx_api_instance._format_symbol_for_swap(pair)
 
 # --- Головний обробник повідомлень ---
-def handle_new_message(forwarded_channel_title: str, signal_text: str, config: dict, bingx_api_instance: bingx_client.BingXClient):
+def handle_new_message(forwarded_channel_title: str, signal_text: str, config: dict, bingx_api_instance: 'bingx_client.BingXClient', slots_checked: bool = False, source_chat_id: Optional[int] = None) -> bool:
     """Обробляє переслане повідомлення, отримане від telegram_monitor.
 
     Args:
@@ -161,380 +196,308 @@ def handle_new_message(forwarded_channel_title: str, signal_text: str, config: d
         signal_text: Текст сигналу (з text або caption).
         config: Словник конфігурації.
         bingx_api_instance: Екземпляр BingXClient (може бути None, якщо ініціалізація не вдалась).
+        slots_checked: True, якщо вільний слот вже перевірено (check_slot_availability_async).
+        source_chat_id: ID каналу-джерела (forward_origin.chat.id), якщо відомий.
+
+    Returns:
+        True, якщо за сигналом відкрито позицію або вхід очікує деталей (повторно сигнал не виконується).
     """
     logger = logging.getLogger("MessageHandler")
     
     if not bingx_api_instance:
          logger.error("[MessageHandler] BingX клієнт не доступний. Обробка сигналу неможлива.")
-         return
+         return False
 
-    channel_key, source_name = signal_interpreter.identify_signal_source(forwarded_channel_title, config)
-    if not channel_key:
-        return
+    route = signal_interpreter.route_signal_source(forwarded_channel_title, config, source_chat_id)
+    if not route:
+        logger.info(f"[MessageHandler] Канал '{forwarded_channel_title}' (chat_id={source_chat_id}) не знайдено в config.json.")
+        return False
+    channel_key, source_name = route.channel_key, route.name
         
     channel_config = config.get('channels', {}).get(channel_key)
     if not channel_config:
         logger.error(f"[MessageHandler] Не знайдено конфігурацію для каналу '{source_name}' (key: {channel_key}).")
-        return
+        return False
 
     logger.info(f"--- Обробка сигналу від: {source_name} ({channel_key}) ---")
-    logger.debug(f"\"\"\"Текст сигналу:\n{signal_text}\n---------------------\"\"\"")
+    logger.debug("\"\"\"Текст сигналу:\n%s\n---------------------\"\"\"", signal_text)
+
+    # --- Швидкий попередній прохід: чи може хоч один парсер розпізнати це повідомлення ---
+    if not signal_interpreter.prescan_message(signal_text):
+        logger.info(f"[MessageHandler] Повідомлення від {source_name} не містить ключових слів жодного формату сигналу. Ігнорується.")
+        return False
 
     # --- Перевірка слотів ПЕРЕД парсингом (для всіх каналів) ---
-    if not check_slot_availability(config):
-         return # Вихід, якщо немає вільних слотів
-
-    # --- Обробка для Каналу 1 (Даніель - двохетапний) ---
-    if channel_key == "channel_1":
-        # --- Визначення параметрів для каналу 1 ---
-        leverage = channel_config.get('leverage', 10)
-        entry_percentage = channel_config.get('entry_percentage', 5.0)
-        margin_usdt = config.get('global_settings', {}).get('total_bankroll', 100) * (entry_percentage / 100.0)
-        tp_distribution = channel_config.get('tp_distribution', [])
-        # -----------------------------------------
-        
-        # Спочатку пробуємо парсити як вхідний сигнал ("Заполняю...")
-        entry_data = signal_interpreter.parse_channel_1_entry(signal_text)
-        if entry_data:
-            pair_raw = entry_data['pair'] # Напр. "INJUSDT"
-            direction = entry_data['direction']
-            api_symbol = bingx_api_instance._format_symbol_for_swap(pair_raw)
-            position_side = direction.upper()
-            order_side = 'buy' if position_side == 'LONG' else 'sell'
-            
-            logger.info(f"[Main C1 Entry] Отримано вхідний сигнал для {pair_raw} ({api_symbol}) {position_side}. Ініціюємо вхід по ринку...")
-            market_order_result = bingx_api_instance.place_market_order_basic(
-                symbol=api_symbol,
-                side=order_side,
-                position_side=position_side,
-                margin_usdt=margin_usdt,
-                leverage=leverage
-            )
-            if market_order_result and market_order_result.get('id') and market_order_result.get('filled') > 0:
-                filled_amount = market_order_result.get('filled')
-                market_symbol = market_order_result.get('symbol')
-                logger.info(f"[Main C1 Entry] Ринковий ордер виконано. Обсяг: {filled_amount}. Очікуємо деталі сигналу для {market_symbol}...")
-                # Зберігаємо дані виконаного ордера для подальшого використання
-                pending_channel1_details[market_symbol] = {
-                        'position_side': position_side,
-                    'initial_amount': filled_amount,
-                    'margin_usdt': margin_usdt,
-                    'leverage': leverage,
-                    'entry_price': market_order_result.get('average', market_order_result.get('price')),
-                    'market_order_id': market_order_result.get('id'),
-                    'timestamp': time.time() # Додаємо час для можливого очищення старих
-                }
-            else:
-                 logger.error(f"[Main C1 Entry] Не вдалося виконати ринковий ордер для {api_symbol}. Відповідь: {market_order_result}")
-
-        else: # Якщо це не entry сигнал, пробуємо парсити як details
-            details_data = signal_interpreter.parse_channel_1_details(signal_text, config)
-            if details_data:
-                pair_raw = details_data['pair']
-                api_symbol_details = bingx_api_instance._format_symbol_for_swap(pair_raw)
-                # Шукаємо відповідний запис в pending
-                if api_symbol_details in pending_channel1_details:
-                    logger.info(f"[Main C1 Details] Знайдено деталі для {api_symbol_details}. Встановлюємо SL/TP...")
-                    entry_info = pending_channel1_details.pop(api_symbol_details) # Видаляємо після використання
-                    
-                    # Параметри з попереднього етапу
-                    market_symbol = api_symbol_details # Мають співпадати
-                    position_side = entry_info['position_side']
-                    initial_amount = entry_info['initial_amount']
-                    entry_price = entry_info['entry_price']
-                    # leverage, margin_usdt з entry_info для точності, якщо потрібно
-
-                    # Дані з поточного повідомлення (details)
-                    sl_price = details_data.get('stop_loss') 
-                    tp_prices = details_data.get('take_profits', [])
-
-                    # Розміщення SL
-                    sl_order = None
-                    if sl_price is not None:
-                        sl_order = bingx_api_instance.set_stop_loss(
-                            symbol=market_symbol,
-                            position_side=position_side,
-                            sl_price=sl_price,
-                            amount=initial_amount
-                        )
-                        if not sl_order or not sl_order.get('id'):
-                            logger.error(f"[Main C1 Details] Не вдалося розмістити SL ордер для {market_symbol}. SL Ціна: {sl_price}. Відповідь: {sl_order}")
-                            sl_order = None # Reset to None if failed
-
-                    # Оновлено розміщення TP за допомогою set_take_profits
-                    tp_orders = []
-                    if tp_prices and initial_amount > 0 and tp_distribution:
-                        logger.info(f"[Main C1 Details] Спроба встановити {len(tp_prices)} TP ордер(ів) для {market_symbol}...")
-                        tp_orders = bingx_api_instance.set_take_profits(
-                            symbol=market_symbol,
-                            position_side=position_side,
-                            take_profit_prices=tp_prices,
-                            tp_distribution=tp_distribution,
-                            initial_amount=initial_amount
-                        )
-                        if not tp_orders or len(tp_orders) != len(tp_prices):
-                            logger.error(f"[Main C1 Details] Не вдалося створити повний набір ({len(tp_orders)}/{len(tp_prices)}) TP ордерів для {market_symbol}. TP Ціни: {tp_prices}. Відповідь: {tp_orders}")
-                            tp_orders = [] # Reset TP orders if any failed
-                        else:
-                            logger.info(f"[Main C1 Details] Успішно створено {len(tp_orders)} TP ордер(ів) для {market_symbol}.")
-                    elif tp_prices:
-                        logger.warning(f"[Main C1 Details] TP ціни ({tp_prices}) є, але або обсяг ({initial_amount}) нульовий, або tp_distribution ({tp_distribution}) порожній. TP не встановлюються.")
-                    
-                    # ЗАПИС В БАЗУ ДАНИХ
-                    if sl_order and tp_orders and len(tp_orders) == len(tp_prices):
-                        conn_add: Optional[sqlite3.Connection] = None
-                        try:
-                            conn_add = data_manager.get_db_connection()
-                            if not conn_add:
-                                logger.critical(f"[Main C1 Details] Не вдалося створити з'єднання з БД для збереження позиції {market_symbol}!")
-                                # Скасування створених ордерів
-                                cancel_ids = [o['id'] for o in [sl_order] + tp_orders if o and o.get('id')]
-                                if cancel_ids:
-                                    bingx_api_instance.cancel_multiple_orders(market_symbol, cancel_ids)
-                            else:
-                                position_data_to_db = {
-                                    'signal_channel_key': channel_key,
-                                    'symbol': market_symbol,
-                                    'position_side': position_side,
-                                    'entry_price': entry_price,
-                                    'initial_amount': initial_amount,
-                                    'current_amount': initial_amount,
-                                    'initial_margin': entry_info['margin_usdt'],
-                                    'leverage': entry_info['leverage'],
-                                    'sl_order_id': sl_order['id'],
-                                    'tp_order_ids': [tp['id'] for tp in tp_orders],
-                                    'related_limit_order_id': None,
-                                    'is_breakeven': 0,
-                                    'is_active': 1
-                                }
-                                new_pos_id = data_manager.add_new_position(conn_add, position_data_to_db)
-                                if new_pos_id:
-                                    logger.info(f"[Main C1 Details] Позиція {market_symbol} ({position_side}) успішно збережена в БД з ID {new_pos_id}.")
-                                    # Перевіряємо ще раз і видаляємо, якщо ключ досі існує
-                                    if api_symbol_details in pending_channel1_details:
-                                        del pending_channel1_details[api_symbol_details]
-                                else:
-                                    logger.error(f"[Main C1 Details] Не вдалося зберегти позицію {market_symbol} в БД!")
-                                    # Скасування створених ордерів
-                                    cancel_ids = [o['id'] for o in [sl_order] + tp_orders if o and o.get('id')]
-                                    if cancel_ids:
-                                        bingx_api_instance.cancel_multiple_orders(market_symbol, cancel_ids)
-                        except sqlite3.Error as db_err:
-                            logger.error(f"[Main C1 Details] Помилка БД при збереженні позиції {market_symbol}: {db_err}", exc_info=True)
-                            # Скасування створених ордерів
-                            cancel_ids = [o['id'] for o in [sl_order] + tp_orders if o and o.get('id')]
-                            if cancel_ids:
-                                bingx_api_instance.cancel_multiple_orders(market_symbol, cancel_ids)
-                        finally:
-                            if conn_add:
-                                conn_add.close()
-                    else: # Відступ 24 (відповідає if sl_order and tp_orders...)
-                        logger.error(f"[Main C1 Details] Не вдалося створити повний набір SL/TP ордерів для {market_symbol}. SL: {bool(sl_order)}, TP: {len(tp_orders)}/{len(tp_prices)}. Збереження в БД скасовано.")
-                        # Скасування SL, якщо він був створений
-                        if sl_order and sl_order.get('id'):
-                            logger.warning(f"[Main C1 Details] Скасування частково створеного SL ордера: {sl_order['id']}")
-                            bingx_api_instance.cancel_order(market_symbol, sl_order['id'])
-                else: # Відступ 20 (відповідає if api_symbol_details...)
-                    logger.warning(f"[Main C1 Details] Отримано деталі для {api_symbol_details}, але немає відповідного запису в pending_channel1_details.")
-            else: # Відступ 16 (відповідає if details_data:)
-                logger.debug(f"[Main C1] Повідомлення не розпізнано як 'details' для каналу 1 (після перевірки entry).") # Повідомлення, якщо details_data не отримано
-    # else: # Відступ 8 (відповідає if entry_data:)
-    #     logger.debug(f"[Main C1] Повідомлення не розпізнано як 'entry' для каналу 1.")
-
-    # --- Обробка для Каналу 2 (Мартин - повний сигнал) ---
+    if not slots_checked and not check_slot_availability(config):
+         return False # Вихід, якщо немає вільних слотів
+
+    # --- parse -> validate -> size -> execute -> persist (спільний шлях для всіх каналів) ---
+    with tracing.span('parse'):
+        parsed_signal = route.parse(signal_text)
+    if not parsed_signal:
+        logger.info(f"[MessageHandler] Повідомлення від {source_name} не розпізнано як сигнал.")
+        return False
+    tracing.set_attrs(channel_key=channel_key, signal_type=parsed_signal.type, pair=parsed_signal.pair)
+    executed = get_signal_pipeline(config, bingx_api_instance).process(channel_key, parsed_signal)
 
     logger.info(f"--- Завершено обробку сигналу від: {source_name} ({channel_key}) ---")
+    return executed
+
+async def process_forwarded_signal(forwarded_channel_title: str, signal_text: str, config: dict,
+                                   bingx_api_instance: 'bingx_client.BingXClient', deduplicator: signal_dedup.SignalDeduplicator,
+                                   slot_reservations: dict, source_chat_id: Optional[int] = None) -> bool:
+    """Прийом пересланого повідомлення у циклі подій: маршрут, захист від дублікатів, резерв слота та
+       виконання handle_new_message у пулі потоків. slot_reservations - {'count': слоти сигналів, що виконуються}.
+
+    Returns:
+        True, якщо сигнал виконано (лише тоді його хеш зберігається в БД).
+    """
+    logger = logging.getLogger(__name__)
+    # Повідомлення з невідомих каналів відкидаємо без звернення до БД (O(1) пошук в індексі маршрутів)
+    route = signal_interpreter.route_signal_source(forwarded_channel_title, config, source_chat_id)
+    if not route or not signal_interpreter.prescan_message(signal_text):
+        return False
+    # Повторна доставка або повторне пересилання того ж посту - відкидаємо до будь-яких запитів до біржі
+    seen_at = time.time()
+    with tracing.span('dedup'):
+        is_duplicate, content_hash = deduplicator.check_and_remember(route.channel_key, signal_text, seen_at)
+    if is_duplicate:
+        logger.warning(f"Повідомлення від {route.name} ({route.channel_key}) вже оброблялось (hash {content_hash}). Дублікат ігнорується.")
+        return False
+    # Хеш зберігається в БД лише для виконаного сигналу: відхилене (немає слотів) чи невдале
+    # повідомлення забувається, щоб його можна було переслати повторно
+    executed = False
+    # Слот резервується ДО запиту до БД: доріжка, що перевіряє пізніше, бачить усі попередні резерви,
+    # тож паралельні перевірки не перевищать ліміт. Власний резерв не враховується (- 1).
+    slot_reservations['count'] += 1
+    try:
+        # Перевірка слотів через асинхронний доступ до БД - не блокує цикл подій
+        with tracing.span('slot_check'):
+            slot_available = await check_slot_availability_async(config, reserved=slot_reservations['count'] - 1)
+        if slot_available:
+            # Синхронні виклики біржі/БД виконуються в пулі потоків - цикл подій Telegram не блокується
+            executed = await asyncio.to_thread(handle_new_message, forwarded_channel_title, signal_text, config,
+                                               bingx_api_instance, True, source_chat_id)
+    finally:
+        slot_reservations['count'] -= 1
+        if not executed:
+            deduplicator.forget(content_hash)
+    if executed:
+        await data_manager.remember_seen_signal_async(content_hash, route.channel_key, seen_at)
+    return executed
+
+async def expire_pending_signals_loop(config: dict, bingx_api_instance: 'bingx_client.BingXClient', interval: float = 5.0):
+    """Періодично захищає входи без деталей (понад pending_signals.ttl_seconds) стоп-лосом за замовчуванням."""
+    logger = logging.getLogger(__name__)
+    pipeline = get_signal_pipeline(config, bingx_api_instance)
+    while True:
+        try:
+            await asyncio.to_thread(pipeline.expire_pending)
+        except Exception as expire_err:
+            logger.error(f"Помилка при обробці прострочених очікуючих сигналів: {expire_err}", exc_info=True)
+        await asyncio.sleep(interval)
+
+async def run_bot(telegram_application: 'Application', position_manager: PositionManager, config: dict,
+                  bingx_api_instance: 'bingx_client.BingXClient'):
+    """Єдиний цикл подій бота: прийом Telegram, моніторинг позицій та обробка прострочених сигналів - задачі asyncio.
+
+    Працює до SIGINT/SIGTERM або до несподіваного завершення будь-якої основної задачі (endpoint метрик -
+    допоміжна задача, його завершення бота не зупиняє). Зупинка структурована:
+    задачі скасовуються у зворотному порядку запуску (спочатку прийом сигналів з дочищенням черги), і кожна
+    завершується у власному finally.
+    """
+    import telegram_monitor
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+
+    def request_stop(sig_name: str):
+        logger.warning(f"Отримано сигнал {sig_name}. Ініціюю зупинку...")
+        stop_event.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, request_stop, sig.name)
+        except NotImplementedError:
+            # Windows: цикл подій не підтримує add_signal_handler - передаємо сигнал у цикл вручну
+            signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(request_stop, signal.Signals(signum).name))
+    logger.info("Обробники сигналів SIGINT та SIGTERM встановлено.")
+
+    tasks = {
+        'PositionManager': asyncio.create_task(position_manager.run(), name="PositionManager"),
+        'PendingSignals': asyncio.create_task(expire_pending_signals_loop(config, bingx_api_instance), name="PendingSignals"),
+        'Telegram': asyncio.create_task(telegram_monitor.run_telegram(telegram_application, config), name="Telegram"),
+    }
+    core_tasks = dict(tasks) # Їх завершення зупиняє бота; endpoint метрик - допоміжна задача
+    metrics_endpoint = metrics.server_settings(config)
+    if metrics_endpoint:
+        tasks['Metrics'] = asyncio.create_task(metrics.serve(*metrics_endpoint), name="Metrics")
+    stop_waiter = asyncio.create_task(stop_event.wait(), name="StopEvent")
+    logger.info("Бот працює. Очікування сигналу зупинки (Ctrl+C)...")
+    try:
+        done, _ = await asyncio.wait([stop_waiter, *core_tasks.values()], return_when=asyncio.FIRST_COMPLETED)
+        for name, task in core_tasks.items():
+            if task in done:
+                error = None if task.cancelled() else task.exception()
+                logger.critical(f"Задача {name} несподівано завершилась ({error!r}). Зупинка бота.", exc_info=error)
+    finally:
+        stop_waiter.cancel()
+        for name, task in reversed(tasks.items()):
+            if not task.done():
+                logger.info(f"Зупинка задачі {name}...")
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        logger.info("Усі задачі бота зупинено.")
 
 # --- Основна частина програми --- 
 def main():
     global position_manager_instance
-    # Додаємо глобальні змінні для потоку та application Telegram
-    telegram_application: Optional[Application] = None
-    telegram_thread: Optional[threading.Thread] = None
 
     logger = setup_logging()
     logger.info("===== Запуск торгового бота ====")
 
-    config = load_config()
-    if not config:
-        logger.critical("Не вдалося завантажити конфігурацію. Завершення роботи.")
-        sys.exit(1)
+    # Слоти, зайняті сигналами, що виконуються (доріжки різних монет працюють паралельно)
+    slot_reservations = {'count': 0}
 
-    # Завантаження змінних середовища
-    dotenv_loaded = load_dotenv()
-    logger.info(f"Результат load_dotenv(): {dotenv_loaded}")
-    api_key = os.environ.get("BINGX_API_KEY")
-    api_secret = os.environ.get("BINGX_API_SECRET")
-    telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-    telegram_target_chat_id_str = os.getenv('TELEGRAM_TARGET_CHAT_ID')
-
-    if not all([api_key, api_secret]):
-        logger.critical("API ключі BingX не знайдено. Перевірте BINGX_API_KEY та BINGX_API_SECRET в .env")
-        sys.exit(1)
-    if not telegram_bot_token:
-        logger.critical("Не знайдено токен Telegram бота. Перевірте TELEGRAM_BOT_TOKEN в .env")
-        sys.exit(1)
-    if not telegram_target_chat_id_str:
-        logger.critical("Не знайдено ID цільового чату Telegram. Перевірте TELEGRAM_TARGET_CHAT_ID в .env")
-        sys.exit(1)
-
-    try:
-        telegram_target_chat_id = int(telegram_target_chat_id_str)
-    except ValueError:
-        logger.critical(f"TELEGRAM_TARGET_CHAT_ID ('{telegram_target_chat_id_str}') не є валідним числом.")
-        sys.exit(1)
-
-    logger.info("API ключі BingX, токен Telegram бота та ID цільового чату завантажено.")
+    # Функція-обгортка message_handler_wrapper (виконується доріжками SignalDispatcher у циклі подій бота)
+    async def message_handler_wrapper(forwarded_channel_title, signal_text, source_chat_id=None):
+        try:
+             await process_forwarded_signal(forwarded_channel_title, signal_text, config, bingx_api,
+                                            signal_deduplicator, slot_reservations, source_chat_id)
+        except Exception as handler_err:
+             logger.error(f"Неочікувана помилка всередині message_handler_wrapper: {handler_err}", exc_info=True)
 
-    # ІНІЦІАЛІЗАЦІЯ БД
-    db_conn_init_check = None
-    try:
+    # --- Фази старту ---
+    # Незалежні кроки виконуються паралельно: ініціалізація БД, клієнт біржі (імпорт ccxt + load_markets)
+    # та Telegram Application (імпорт python-telegram-bot). Час старту = найдовший ланцюжок, а не сума.
+    orchestrator = startup.StartupOrchestrator()
+
+    @orchestrator.phase('config')
+    def config_phase(results):
+        loaded_config = load_config()
+        if not loaded_config:
+            raise RuntimeError("Не вдалося завантажити конфігурацію.")
+        tracing.configure(loaded_config)
+        log_queue.configure(loaded_config)
+        return loaded_config
+
+    @orchestrator.phase('env')
+    def env_phase(results):
+        dotenv_loaded = load_dotenv()
+        logger.info(f"Результат load_dotenv(): {dotenv_loaded}")
+        env = {
+            'api_key': os.environ.get("BINGX_API_KEY"),
+            'api_secret': os.environ.get("BINGX_API_SECRET"),
+            'telegram_bot_token': os.getenv('TELEGRAM_BOT_TOKEN'),
+            'api_url': os.getenv('BINGX_API_URL'), # напр. http://127.0.0.1:8765 (mock_bingx_server.py)
+        }
+        telegram_target_chat_id_str = os.getenv('TELEGRAM_TARGET_CHAT_ID')
+        if not all([env['api_key'], env['api_secret']]):
+            raise RuntimeError("API ключі BingX не знайдено. Перевірте BINGX_API_KEY та BINGX_API_SECRET в .env")
+        if not env['telegram_bot_token']:
+            raise RuntimeError("Не знайдено токен Telegram бота. Перевірте TELEGRAM_BOT_TOKEN в .env")
+        if not telegram_target_chat_id_str:
+            raise RuntimeError("Не знайдено ID цільового чату Telegram. Перевірте TELEGRAM_TARGET_CHAT_ID в .env")
+        try:
+            env['telegram_target_chat_id'] = int(telegram_target_chat_id_str)
+        except ValueError:
+            raise RuntimeError(f"TELEGRAM_TARGET_CHAT_ID ('{telegram_target_chat_id_str}') не є валідним числом.")
+        logger.info("API ключі BingX, токен Telegram бота та ID цільового чату завантажено.")
+        return env
+
+    @orchestrator.phase('database', 'config')
+    def database_phase(results):
         logger.info("Ініціалізація бази даних (перевірка/створення таблиці)...")
         db_conn_init_check = data_manager.get_db_connection()
         if not db_conn_init_check:
-            logger.critical("Не вдалося підключитися до бази даних для ініціалізації. Завершення роботи.")
-            sys.exit(1)
-        if not data_manager.initialize_database(db_conn_init_check):
-            logger.critical("Не вдалося ініціалізувати таблиці бази даних. Завершення роботи.")
-            sys.exit(1)
-        logger.info("База даних успішно ініціалізована (або вже існувала).")
-    except Exception as db_init_err:
-         logger.critical(f"Неочікувана помилка при ініціалізації БД: {db_init_err}", exc_info=True)
-         sys.exit(1)
-    finally:
-         if db_conn_init_check:
-             db_conn_init_check.close()
-             logger.info("Тимчасове з'єднання для ініціалізації БД закрито.")
-
-    # Ініціалізація BingX API клієнта
-    bingx_api = None
-    try:
+            raise RuntimeError("Не вдалося підключитися до бази даних для ініціалізації.")
+        try:
+            if not data_manager.initialize_database(db_conn_init_check):
+                raise RuntimeError("Не вдалося ініціалізувати таблиці бази даних.")
+            logger.info("База даних успішно ініціалізована (або вже існувала).")
+            # Відновлення хешів вже оброблених повідомлень (захист від повторної доставки/пересилання)
+            deduplicator = signal_dedup.from_config(results['config'])
+            restored = deduplicator.load(data_manager.load_seen_signals(
+                db_conn_init_check, time.time() - deduplicator.ttl_seconds, deduplicator.max_entries))
+            logger.info(f"Відновлено {restored} хеш(ів) оброблених повідомлень для захисту від дублікатів.")
+            return deduplicator
+        finally:
+            db_conn_init_check.close()
+            logger.info("Тимчасове з'єднання для ініціалізації БД закрито.")
+
+    @orchestrator.phase('exchange', 'env')
+    def exchange_phase(results):
+        import bingx_client # ccxt імпортується лише тут, паралельно з іншими фазами
         logger.info("Ініціалізація BingX API клієнта...")
-        bingx_api = bingx_client.BingXClient(api_key, api_secret, logger)
+        client = bingx_client.BingXClient(results['env']['api_key'], results['env']['api_secret'], logger,
+                                          api_url=results['env']['api_url'])
         logger.info("BingX API клієнт успішно ініціалізовано.")
-    except Exception as e:
-        logger.critical(f"Критична помилка при ініціалізації BingX API: {e}", exc_info=True)
-        sys.exit(1)
+        return client
+
+    @orchestrator.phase('pending_signals', 'config', 'database', 'exchange')
+    def pending_signals_phase(results):
+        # Відновлення входів двохетапних сигналів, що очікували деталей до перезапуску
+        restored_pending = get_signal_pipeline(results['config'], results['exchange']).pending_entries.restore()
+        if restored_pending:
+            logger.warning(f"Відновлено {restored_pending} вхід(ів), що очікують деталей сигналу.")
+        return restored_pending
+
+    @orchestrator.phase('position_manager', 'config', 'exchange')
+    def position_manager_phase(results):
+        # Моніторинг запускається як задача в run_bot
+        logger.info("Ініціалізація PositionManager...")
+        return PositionManager(results['exchange'], results['config'])
+
+    @orchestrator.phase('telegram', 'config', 'env')
+    def telegram_phase(results):
+        import telegram_monitor # python-telegram-bot імпортується лише тут
+        logger.info("Створення та налаштування Telegram Application...")
+        application = telegram_monitor.start_monitoring(
+            token=results['env']['telegram_bot_token'],
+            config=results['config'],
+            target_chat_id=results['env']['telegram_target_chat_id'],
+            main_message_handler=message_handler_wrapper,
+            lane_key=lambda title, text, chat_id: signal_lane_key(
+                signal_interpreter.route_signal_source(title, config, chat_id), text, bingx_api)
+        )
+        if not application:
+            raise RuntimeError("Не вдалося створити Telegram Application.")
+        return application
 
-    # Ініціалізація та запуск PositionManager
     try:
-        logger.info("Ініціалізація PositionManager...")
-        position_manager_instance = PositionManager(bingx_api, config)
-        position_manager_instance.start_monitoring()
-        logger.info("PositionManager успішно запущено.")
-    except Exception as e:
-        logger.critical(f"Критична помилка при ініціалізації PositionManager: {e}", exc_info=True)
+        startup_results = orchestrator.run()
+    except startup.StartupError as e:
+        orchestrator.log_report(logging.INFO, logger)
+        # RuntimeError - очікувані помилки фаз (конфіг, .env, БД) з власним повідомленням, без трасування
+        logger.critical(f"Помилка старту у фазі '{e.phase}': {e.error}. Завершення роботи.",
+                        exc_info=None if isinstance(e.error, RuntimeError) else e.error)
         sys.exit(1)
+    orchestrator.log_report(logging.INFO, logger)
 
-    # Налаштування обробки сигналів ОС
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    logger.info("Обробники сигналів SIGINT та SIGTERM встановлено.")
-
-    # Функція-обгортка message_handler_wrapper
-    def message_handler_wrapper(forwarded_channel_title, signal_text):
-        try:
-             handle_new_message(forwarded_channel_title, signal_text, config, bingx_api)
-        except Exception as handler_err:
-             logger.error(f"Неочікувана помилка всередині message_handler_wrapper: {handler_err}", exc_info=True)
+    # Результати фаз - змінні, які використовує обробник повідомлень
+    config = startup_results['config']
+    signal_deduplicator = startup_results['database']
+    bingx_api = startup_results['exchange']
+    position_manager_instance = startup_results['position_manager']
+    telegram_application = startup_results['telegram']
 
-    # --- Оновлений запуск Telegram монітора ---
-    logger.info("Створення та налаштування Telegram Application...")
     try:
-        # 1. Отримуємо налаштований об'єкт application
-        telegram_application = telegram_monitor.start_monitoring(
-            token=telegram_bot_token,
-            config=config,
-            target_chat_id=telegram_target_chat_id,
-            main_message_handler=message_handler_wrapper
-        )
-
-        if not telegram_application:
-            logger.critical("Не вдалося створити Telegram Application. Завершення роботи.")
-            # Зупиняємо Position Manager, якщо він вже запущений
-            if position_manager_instance:
-                 position_manager_instance.stop_monitoring()
-            sys.exit(1)
-
-        logger.info("Telegram Application успішно створено.")
-
-        # 2. Створюємо та запускаємо потік для polling
-        logger.info("Створення потоку для Telegram polling...")
-        telegram_thread = threading.Thread(
-            target=telegram_monitor.run_telegram_polling,
-            args=(telegram_application,),
-            name="TelegramPollingThread",
-            daemon=True # Робимо потік демоном
-        )
-        telegram_thread.start()
-        logger.info("Потік для Telegram polling запущено.")
-
-        # --- Основний цикл очікування ---
-        logger.info("Бот працює. Очікування сигналу зупинки (Ctrl+C)...")
-        while not stop_event_main.is_set():
-             # Перевірка стану PositionManager
-             if position_manager_instance and position_manager_instance.thread and not position_manager_instance.thread.is_alive():
-                 logger.warning("Потік Position Manager неактивний! Можливо, сталася помилка.")
-                 # TODO: Додати логіку перезапуску?
-
-             # Перевірка стану потоку Telegram
-             if telegram_thread and not telegram_thread.is_alive():
-                  logger.warning("Потік Telegram Polling неактивний! Можливо, сталася помилка або він завершився сам.")
-                  stop_event_main.set() # Ініціюємо зупинку, якщо потік Telegram впав
-                  break # Виходимо з циклу очікування
-
-             time.sleep(5) # Невелике очікування
-
-        logger.info("Головний цикл завершено через подію зупинки.")
-
+        asyncio.run(run_bot(telegram_application, position_manager_instance, config, bingx_api))
     except Exception as e:
-        logger.critical(f"Критична помилка під час запуску компонентів: {e}", exc_info=True)
-        stop_event_main.set() # Сигналізуємо про зупинку іншим компонентам
+        logger.critical(f"Критична помилка під час роботи компонентів: {e}", exc_info=True)
     finally:
-        # --- Оновлена процедура завершення роботи ---
         logger.info("===== Початок процедури завершення роботи бота ====")
-        
-        # Переконуємось, що подія зупинки встановлена
-        if not stop_event_main.is_set():
-             logger.warning("Блок finally в main досягнуто без встановленої події зупинки. Встановлюємо її примусово.")
-             stop_event_main.set()
-             
-        # 1. Зупиняємо PositionManager
-        if position_manager_instance:
-            logger.info("Зупинка PositionManager...")
-            position_manager_instance.stop_monitoring()
-            logger.info("PositionManager зупинено.")
-            
-        # 2. Зупиняємо Telegram Monitor - тепер покладаємось на обробку сигналу в run_polling
-        logger.info("Telegram Monitor мав би зупинитися через сигнал ОС або завершення run_polling.")
-        # Прибираємо явний виклик stop(), бо він асинхронний і некоректний тут
-        # if telegram_application:
-        #      try:
-        #          logger.info("Виклик application.stop() (для python-telegram-bot < 20)...")
-        #          if hasattr(telegram_application, 'stop') and callable(telegram_application.stop):
-        #              telegram_application.stop()
-        #              logger.info("application.stop() викликано.")
-        #          else:
-        #              logger.info("Метод application.stop() не знайдено або не викликається.")
-        #      except Exception as stop_err:
-        #          logger.error(f"Помилка під час спроби викликати stop для Telegram: {stop_err}")
-        
-        # 3. Очікуємо завершення потоку Telegram
-        if telegram_thread and telegram_thread.is_alive():
-            logger.info(f"Очікування завершення потоку Telegram ({telegram_thread.name})...")
-            telegram_thread.join(timeout=10.0) # Чекаємо до 10 секунд
-            if telegram_thread.is_alive():
-                logger.warning(f"Потік Telegram ({telegram_thread.name}) не завершився за 10 секунд!")
-            else:
-                logger.info(f"Потік Telegram ({telegram_thread.name}) успішно завершено.")
-        elif telegram_thread:
-             logger.info(f"Потік Telegram ({telegram_thread.name}) вже був завершений.")
-        else:
-             logger.info("Потік Telegram не було запущено.")
-            
+        # Задачі вже зупинені в run_bot; залишається потік асинхронного доступу до БД
+        data_manager.close_async_db()
+        # Перцентилі затримок етапів обробки сигналів за час роботи (якщо трасування увімкнено)
+        tracing.log_summary()
+        tracing.close()
+
         logger.info("===== Завершення роботи бота ====")
+        # Дописуємо записи, що ще в черзі логування
+        log_queue.stop()
         print("Бот завершив роботу.")
 
 # Переконайтесь, що цей рядок є в кінці файлу
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
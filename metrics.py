@@ -0,0 +1,241 @@
+# In-process metrics registry (counters, gauges, histograms) with a local Prometheus text endpoint
+#
+# Запис метрики - це інкремент під локом (без форматування, I/O чи алокацій на гарячому шляху).
+# Формування тексту у форматі Prometheus відбувається лише під час запиту GET /metrics.
+#
+#   curl http://127.0.0.1:9108/metrics
+
+import asyncio
+import bisect
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 9108
+# Межі кошиків гістограм (секунди): від мілісекунд (БД, парсинг) до десятків секунд (цикл PositionManager)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(label_names: Tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Лічильник, що лише зростає (напр. кількість запитів до API за ендпоінтом)."""
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(_Metric):
+    """Поточне значення. Може задаватися set() або обчислюватися під час запиту (set_function)."""
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """Значення читається лише під час запиту /metrics - нуль накладних витрат на гарячому шляху."""
+        with self._lock:
+            self._functions[self._key(labels)] = func
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, func in functions:
+            try:
+                values[key] = func()
+            except Exception as e:
+                logger.debug(f"[Metrics] Помилка обчислення {self.name}: {e}")
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values.items()]
+
+class Histogram(_Metric):
+    """Розподіл тривалостей (секунди) за фіксованими кошиками."""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {} # ключ -> [лічильники кошиків..., +Inf], sum, count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        lines = []
+        for key, bucket_counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le_label = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Метрику '{metric.name}' вже зареєстровано з іншим типом.")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """Текст у форматі Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# --- Метрики бота ---
+API_REQUESTS = REGISTRY.counter('bingx_api_requests_total', 'HTTP запити до BingX API за методом, ендпоінтом та результатом.', ('method', 'endpoint', 'status'))
+API_REQUEST_SECONDS = REGISTRY.histogram('bingx_api_request_seconds', 'Тривалість HTTP запитів до BingX API (включно з ордерами).', ('method', 'endpoint'))
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram('bingx_rate_limit_wait_seconds', 'Очікування вбудованого обмежувача запитів ccxt перед запитом.')
+ORDER_SECONDS = REGISTRY.histogram('bingx_order_seconds', 'Тривалість розміщення ордерів BingXClient за типом.', ('type',))
+DB_COMMIT_SECONDS = REGISTRY.histogram('db_commit_seconds', 'Тривалість COMMIT у SQLite.')
+SIGNALS = REGISTRY.counter('signals_total', 'Оброблені повідомлення диспетчером сигналів за результатом.', ('result',))
+SIGNAL_QUEUE_WAIT_SECONDS = REGISTRY.histogram('signal_queue_wait_seconds', 'Час від прийому повідомлення до початку обробки.')
+SIGNAL_PROCESSING_SECONDS = REGISTRY.histogram('signal_processing_seconds', 'Тривалість обробки одного повідомлення.')
+QUEUE_DEPTH = REGISTRY.gauge('signal_queue_depth', 'Прийняті, але ще не оброблені повідомлення.')
+ACTIVE_LANES = REGISTRY.gauge('signal_active_lanes', 'Доріжки (символи), що мають необроблені повідомлення.')
+PENDING_ENTRIES = REGISTRY.gauge('pending_signal_entries', 'Виконані входи двохетапних сигналів, що очікують деталей.')
+POSITION_MANAGER_CYCLE_SECONDS = REGISTRY.histogram('position_manager_cycle_seconds', 'Тривалість ітерації перевірки позицій PositionManager.')
+
+# --- HTTP endpoint (задача в циклі подій бота) ---
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, registry: MetricsRegistry):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки не потрібні - дочитуємо до порожнього рядка
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/metrics', '/'):
+            status, content_type, body = '200 OK', 'text/plain; version=0.0.4; charset=utf-8', registry.render().encode('utf-8')
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'Not Found\n'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, registry: MetricsRegistry = REGISTRY):
+    """Віддає метрики на http://host:port/metrics до скасування задачі.
+
+    Якщо порт зайнятий (або недоступний), помилка лише логується - метрики не зупиняють бота.
+    """
+    try:
+        server = await asyncio.start_server(lambda r, w: _handle_request(r, w, registry), host, port)
+    except OSError as e:
+        logger.error(f"[Metrics] Не вдалося запустити endpoint метрик на {host}:{port}: {e}. Бот працює без нього.")
+        return
+    logger.info(f"[Metrics] Метрики доступні на http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
+
+def server_settings(config: dict) -> Optional[Tuple[str, int]]:
+    """(host, port) з config['metrics'], або None, якщо endpoint вимкнено (за замовчуванням)."""
+    metrics_config = config.get('metrics', {})
+    if not metrics_config.get('enabled', False):
+        return None
+    return metrics_config.get('host', DEFAULT_HOST), int(metrics_config.get('port', DEFAULT_PORT))
@@ -0,0 +1,625 @@
+# Local HTTP/websocket stand-in for the BingX swap API (signed REST + gzip websocket) for end-to-end benchmarks
+#
+# Сервер відповідає у форматі BingX ({"code": 0, "msg": "", "data": ...}) на ті REST запити, які робить
+# ccxt.bingx для BingXClient (ринки, тікер, плече, ордери, скасування/заміна, позиції), та перевіряє
+# підпис приватних запитів (HMAC-SHA256 відсортованих параметрів, заголовок X-BX-APIKEY).
+# Стан біржі (ордери, позиції, виконання SL/TP) - sim_exchange.SimulatedExchange.
+# Websocket (/swap-market) - протокол з websocket_example.py: auth, підписки positions/userTrades/balance,
+# ping/pong, повідомлення сервера стиснуті gzip (бінарні кадри).
+#
+# HTTP/1.1 keep-alive (можна виміряти пул з'єднань), затримка відповіді, частка помилок (HTTP 503),
+# обмеження частоти запитів (HTTP 429, code 100410) та примусові розриви websocket (перепідключення)
+# налаштовуються. Статистика сервера: GET /mock/stats.
+#
+#   python mock_bingx_server.py --port 8765 --symbols BTC-USDT=65000,ETH-USDT=3200 --feed-interval 0.5
+#   BINGX_API_URL=http://127.0.0.1:8765 python main.py
+#   BINGX_WS_URL=ws://127.0.0.1:8765/swap-market python websocket_example.py
+
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import random
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+import ccxt
+
+import sim_exchange
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_API_KEY = 'mock'
+DEFAULT_API_SECRET = 'mock'
+DEFAULT_BALANCE = 10000.0
+DEFAULT_SYMBOLS = {'BTC-USDT': 65000.0, 'ETH-USDT': 3200.0, 'SOL-USDT': 150.0, 'XRP-USDT': 0.6, 'DOGE-USDT': 0.15}
+WS_PATH = '/swap-market'
+WS_TOPICS = ('positions', 'userTrades', 'balance')
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Коди помилок BingX (ccxt.bingx перетворює їх на відповідні винятки)
+CODE_SIGNATURE = 100001      # AuthenticationError
+CODE_BAD_REQUEST = 100400    # BadRequest
+CODE_RATE_LIMIT = 100410     # OperationFailed
+CODE_ORDER_NOT_FOUND = 80016 # OrderNotFound
+CODE_INVALID_ORDER = 80014   # BadRequest
+CODE_BAD_SYMBOL = 109425     # BadSymbol
+
+_HTTP_REASONS = {101: 'Switching Protocols', 200: 'OK', 404: 'Not Found', 429: 'Too Many Requests', 503: 'Service Unavailable'}
+
+def _fmt(value: Optional[float]) -> str:
+    """Число рядком без експоненти, як у відповідях BingX."""
+    if value is None:
+        return '0'
+    text = f"{float(value):.12f}".rstrip('0').rstrip('.')
+    return text if text not in ('', '-0') else '0'
+
+def _float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value not in (None, '') else None
+
+def sign(params: Dict[str, Any], secret: str) -> str:
+    """Підпис BingX: HMAC-SHA256 рядка 'k1=v1&k2=v2' з параметрів, відсортованих за ключем."""
+    payload = '&'.join(f"{key}={value}" for key, value in sorted(params.items()))
+    return hmac.new(secret.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).hexdigest()
+
+class _RateLimiter:
+    """Token bucket: rate запитів/с з запасом burst (окремо для кожного API ключа)."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1.0
+        self._buckets[key] = (tokens - 1.0 if allowed else tokens, now)
+        return allowed
+
+class _WebSocketSession:
+    def __init__(self, writer: asyncio.StreamWriter, authenticated: bool):
+        self.writer = writer
+        self.authenticated = authenticated
+        self.topics: set = set()
+
+class MockBingXServer:
+    """REST + websocket сервер поверх SimulatedExchange. Запускається start() у циклі подій (або start_in_thread())."""
+
+    def __init__(self, exchange: Optional[sim_exchange.SimulatedExchange] = None, symbols: Optional[Dict[str, float]] = None,
+                 api_key: str = DEFAULT_API_KEY, api_secret: str = DEFAULT_API_SECRET, balance: float = DEFAULT_BALANCE,
+                 latency_seconds: float = 0.0, latency_jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float = 0.0, rate_burst: Optional[float] = None, feed_interval: float = 0.0,
+                 feed_volatility: float = 0.002, ws_push_interval: float = 5.0, ws_drop_after: float = 0.0,
+                 seed: Optional[int] = None):
+        self.exchange = exchange or sim_exchange.SimulatedExchange(seed=seed)
+        for market_id, price in (symbols or DEFAULT_SYMBOLS).items():
+            self.exchange.set_price(self._symbol(market_id), price)
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.balance = balance
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limiter = _RateLimiter(rate_limit, rate_burst) if rate_limit > 0 else None
+        self.feed_interval = feed_interval
+        self.feed_volatility = feed_volatility
+        self.ws_push_interval = ws_push_interval
+        self.ws_drop_after = ws_drop_after
+        self.sessions: List[_WebSocketSession] = []
+        self.stats: Dict[str, Any] = {
+            'connections': 0, 'requests': 0, 'endpoints': {}, 'status': {},
+            'rate_limited': 0, 'signature_errors': 0, 'injected_errors': 0,
+            'ws_connections': 0, 'ws_dropped': 0, 'ws_messages_in': 0, 'ws_messages_out': 0,
+        }
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+        self._routes = {
+            ('GET', '/openApi/swap/v2/server/time'): self._server_time,
+            ('GET', '/openApi/swap/v2/quote/contracts'): self._contracts,
+            ('GET', '/openApi/cswap/v1/market/contracts'): self._empty_list,
+            ('GET', '/openApi/spot/v1/common/symbols'): self._spot_symbols,
+            ('GET', '/openApi/wallets/v1/capital/config/getall'): self._empty_list,
+            ('GET', '/openApi/swap/v2/quote/ticker'): self._ticker,
+            ('POST', '/openApi/swap/v2/trade/leverage'): self._set_leverage,
+            ('POST', '/openApi/swap/v2/trade/order'): self._create_order,
+            ('GET', '/openApi/swap/v2/trade/order'): self._fetch_order,
+            ('DELETE', '/openApi/swap/v2/trade/order'): self._cancel_order,
+            ('GET', '/openApi/swap/v2/trade/openOrders'): self._open_orders,
+            ('POST', '/openApi/swap/v1/trade/cancelReplace'): self._cancel_replace,
+            ('GET', '/openApi/swap/v2/user/positions'): self._positions,
+        }
+
+    # --- символи ---
+    @staticmethod
+    def _symbol(market_id: str) -> str:
+        base, _, quote = market_id.partition('-')
+        return f"{base}/{quote}:{quote}"
+
+    @staticmethod
+    def _market_id(symbol: str) -> str:
+        base, _, rest = symbol.partition('/')
+        return f"{base}-{rest.split(':')[0]}"
+
+    def _known_symbol(self, params: Dict[str, str]) -> str:
+        symbol = self._symbol(params.get('symbol', ''))
+        if symbol not in self.exchange.prices:
+            raise ccxt.BadSymbol(f"symbol {params.get('symbol')} is not exist")
+        return symbol
+
+    # --- REST: публічні ---
+    def _server_time(self, params):
+        return {'serverTime': int(time.time() * 1000)}
+
+    def _empty_list(self, params):
+        return []
+
+    def _spot_symbols(self, params):
+        return {'symbols': []}
+
+    def _contracts(self, params):
+        contracts = []
+        for index, symbol in enumerate(sorted(self.exchange.prices)):
+            market = self.exchange.market(symbol)
+            amount_step, price_step = market['precision']['amount'], market['precision']['price']
+            contracts.append({
+                'contractId': str(100 + index),
+                'symbol': market['id'],
+                'quantityPrecision': max(0, -round(math.log10(amount_step))),
+                'pricePrecision': max(0, -round(math.log10(price_step))),
+                'tradeMinQuantity': amount_step,
+                'tradeMinUSDT': 2,
+                'currency': market['quote'],
+                'asset': market['base'],
+                'status': 1,
+                'apiStateOpen': 'true',
+                'apiStateClose': 'true',
+                'takerFeeRate': 0.0005,
+                'makerFeeRate': 0.0002,
+            })
+        return contracts
+
+    def _ticker(self, params):
+        symbol = self._known_symbol(params)
+        price = _fmt(self.exchange.prices[symbol])
+        return {
+            'symbol': params['symbol'], 'lastPrice': price, 'lastQty': '1', 'bidPrice': price, 'bidQty': '1',
+            'askPrice': price, 'askQty': '1', 'markPrice': price, 'indexPrice': price, 'openPrice': price,
+            'highPrice': price, 'lowPrice': price, 'volume': '0', 'quoteVolume': '0', 'priceChange': '0',
+            'priceChangePercent': '0', 'closeTime': int(time.time() * 1000),
+        }
+
+    # --- REST: приватні ---
+    def _set_leverage(self, params):
+        symbol = self._known_symbol(params)
+        leverage = int(params.get('leverage', 1))
+        self.exchange.set_leverage(leverage, symbol, {'side': params.get('side')})
+        return {'leverage': leverage, 'symbol': params['symbol']}
+
+    def _order_data(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        status = {'open': 'NEW', 'closed': 'FILLED', 'canceled': 'CANCELLED'}.get(order['status'], 'NEW')
+        return {
+            'symbol': self._market_id(order['symbol']),
+            'orderId': int(order['id']),
+            'side': order['side'].upper(),
+            'positionSide': order['info']['positionSide'],
+            'type': order['info']['type'],
+            'origQty': _fmt(order['amount']),
+            'price': _fmt(order['price']),
+            'executedQty': _fmt(order['filled']),
+            'avgPrice': _fmt(order['average']),
+            'cumQuote': _fmt((order['average'] or 0.0) * order['filled']),
+            'stopPrice': _fmt(order['stopPrice']),
+            'status': status,
+            'time': order['timestamp'],
+            'updateTime': int(time.time() * 1000),
+            'reduceOnly': order['reduceOnly'],
+            'workingType': 'MARK_PRICE',
+            'clientOrderId': '',
+        }
+
+    def _create_order(self, params):
+        symbol = self._known_symbol(params)
+        order_type = params.get('type', 'MARKET').upper()
+        order_params = {'stopPrice': _float(params.get('stopPrice'))}
+        if params.get('positionSide'):
+            order_params['positionSide'] = params['positionSide']
+        order = self.exchange.create_order(symbol, order_type.lower() if order_type in ('MARKET', 'LIMIT') else order_type,
+                                           params.get('side', '').lower(), _float(params.get('quantity')),
+                                           _float(params.get('price')), order_params)
+        if order['status'] == 'closed':
+            self._push_fills([order])
+        return {'order': self._order_data(self.exchange.orders[order['id']])}
+
+    def _fetch_order(self, params):
+        return {'order': self._order_data(self.exchange.fetch_order(params.get('orderId')))}
+
+    def _cancel_order(self, params):
+        order_id = params.get('orderId')
+        self.exchange.cancel_order(order_id)
+        return {'order': self._order_data(self.exchange.orders[str(order_id)])}
+
+    def _open_orders(self, params):
+        symbol = self._symbol(params['symbol']) if params.get('symbol') else None
+        return {'orders': [self._order_data(order) for order in self.exchange.fetch_open_orders(symbol)]}
+
+    def _cancel_replace(self, params):
+        # SimulatedExchange змінює ордер на місці - новий ордер має той самий ID
+        order_id = params.get('cancelOrderId')
+        self.exchange.edit_order(order_id, self._known_symbol(params), params.get('type'), params.get('side', '').lower(),
+                                 _float(params.get('quantity')), _float(params.get('price')),
+                                 {'stopPrice': _float(params.get('stopPrice'))})
+        order = self._order_data(self.exchange.orders[str(order_id)])
+        return {'cancelResult': 'true', 'cancelMsg': '', 'cancelResponse': order,
+                'replaceResult': 'true', 'replaceMsg': '', 'newOrderResponse': order}
+
+    def _position_data(self, position: Dict[str, Any]) -> Dict[str, Any]:
+        leverage = position.get('leverage') or 1
+        notional = position['contracts'] * position['markPrice']
+        return {
+            'symbol': self._market_id(position['symbol']),
+            'positionId': f"{self._market_id(position['symbol'])}-{position['side'].upper()}",
+            'positionSide': position['side'].upper(),
+            'isolated': False,
+            'positionAmt': _fmt(position['contracts']),
+            'availableAmt': _fmt(position['contracts']),
+            'unrealizedProfit': _fmt(position['unrealizedPnl']),
+            'realisedProfit': '0',
+            'initialMargin': _fmt(position['entryPrice'] * position['contracts'] / leverage),
+            'avgPrice': _fmt(position['entryPrice']),
+            'markPrice': _fmt(position['markPrice']),
+            'positionValue': _fmt(notional),
+            'leverage': leverage,
+            'liquidationPrice': 0,
+            'updateTime': int(time.time() * 1000),
+        }
+
+    def _positions(self, params):
+        symbols = [self._symbol(params['symbol'])] if params.get('symbol') else None
+        return [self._position_data(p) for p in self.exchange.fetch_positions(symbols)]
+
+    # --- обробка HTTP запиту ---
+    def verify_signature(self, query: str, headers: Dict[str, str]) -> bool:
+        """Підпис ccxt: HMAC від розкодованого рядка запиту до '&signature=' (параметри вже відсортовані)."""
+        payload, separator, signature = query.rpartition('&signature=')
+        if not separator or headers.get('x-bx-apikey') != self.api_key:
+            return False
+        expected = hmac.new(self.api_secret.encode('utf-8'), urllib.parse.unquote_plus(payload).encode('utf-8'), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    async def handle_request(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        """(HTTP статус, тіло відповіді) на REST запит."""
+        path, _, query = target.partition('?')
+        if method == 'GET' and path == '/mock/stats':
+            return 200, json.dumps(self.summary()).encode('utf-8')
+        # POST від ccxt.bingx передає параметри у рядку запиту, тіло порожнє
+        if not query and body:
+            query = body.decode('utf-8')
+        self.stats['requests'] += 1
+        endpoint = f"{method} {path}"
+        self.stats['endpoints'][endpoint] = self.stats['endpoints'].get(endpoint, 0) + 1
+        status, payload = await self._dispatch(method, path, query, headers)
+        self.stats['status'][status] = self.stats['status'].get(status, 0) + 1
+        return status, payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+
+    async def _dispatch(self, method: str, path: str, query: str, headers: Dict[str, str]) -> Tuple[int, Any]:
+        delay = self.latency_seconds + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        handler = self._routes.get((method, path))
+        if handler is None:
+            logger.warning(f"[MockBingX] Невідомий ендпоінт: {method} {path}")
+            return 404, {'code': CODE_BAD_REQUEST, 'msg': f"this api is not exist: {path}"}
+        if self.rate_limiter and not self.rate_limiter.allow(headers.get('x-bx-apikey', 'public')):
+            self.stats['rate_limited'] += 1
+            return 429, {'code': CODE_RATE_LIMIT, 'msg': 'The request frequency is too high, rate limitation'}
+        if self.error_rate and self._random.random() < self.error_rate:
+            # Не JSON відповідь - ccxt піднімає ExchangeNotAvailable (NetworkError), як при збої шлюзу біржі
+            self.stats['injected_errors'] += 1
+            return 503, b'Service Temporarily Unavailable'
+        private = '/trade/' in path or '/user/' in path or '/wallets/' in path
+        if private and not self.verify_signature(query, headers):
+            self.stats['signature_errors'] += 1
+            return 200, {'code': CODE_SIGNATURE, 'msg': 'Signature verification failed'}
+        params = dict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+        params.pop('signature', None)
+        try:
+            data = handler(params)
+        except ccxt.OrderNotFound as e:
+            return 200, {'code': CODE_ORDER_NOT_FOUND, 'msg': str(e)}
+        except ccxt.BadSymbol as e:
+            return 200, {'code': CODE_BAD_SYMBOL, 'msg': str(e)}
+        except (ccxt.InvalidOrder, ValueError, TypeError, KeyError) as e:
+            return 200, {'code': CODE_INVALID_ORDER, 'msg': str(e)}
+        return 200, {'code': 0, 'msg': '', 'data': data}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, version = (lines[0].split() + ['', '', ''])[:3]
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    await self._websocket(reader, writer, target, headers)
+                    return
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                status, payload = await self.handle_request(method, target, headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write((f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    # --- websocket ---
+    async def _websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, target: str, headers: Dict[str, str]):
+        path, _, query = target.partition('?')
+        if path != WS_PATH or 'sec-websocket-key' not in headers:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + _WS_GUID).encode('latin-1')).digest()).decode('latin-1')
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+        # Підключення з listenKey (як у потоці даних користувача BingX) не потребує auth повідомлення
+        session = _WebSocketSession(writer, authenticated='listenKey=' in query)
+        self.sessions.append(session)
+        self.stats['ws_connections'] += 1
+        deadline = time.monotonic() + self.ws_drop_after if self.ws_drop_after > 0 else None
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+                try:
+                    opcode, payload = await asyncio.wait_for(_read_frame(reader), timeout)
+                except asyncio.TimeoutError:
+                    # Примусовий розрив (1001 Going Away) - перевірка перепідключення клієнта
+                    self.stats['ws_dropped'] += 1
+                    writer.write(_frame(0x8, struct.pack('!H', 1001)))
+                    await writer.drain()
+                    return
+                if opcode == 0x8:
+                    writer.write(_frame(0x8, payload[:2]))
+                    await writer.drain()
+                    return
+                if opcode == 0x9:
+                    writer.write(_frame(0xA, payload))
+                elif opcode in (0x1, 0x2):
+                    self.stats['ws_messages_in'] += 1
+                    self._ws_message(session, payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.sessions.remove(session)
+
+    def _ws_send(self, session: _WebSocketSession, message: Dict[str, Any]):
+        self.stats['ws_messages_out'] += 1
+        session.writer.write(_frame(0x2, gzip.compress(json.dumps(message).encode('utf-8'))))
+
+    def _ws_message(self, session: _WebSocketSession, payload: bytes):
+        try:
+            message = json.loads(payload.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            return
+        if not isinstance(message, dict):
+            return
+        if 'ping' in message:
+            self._ws_send(session, {'pong': message['ping']})
+            return
+        request_id = message.get('id')
+        if request_id == 'auth':
+            params = {'apiKey': message.get('apiKey'), 'timestamp': message.get('timestamp')}
+            session.authenticated = (message.get('apiKey') == self.api_key
+                                     and hmac.compare_digest(sign(params, self.api_secret), str(message.get('signature', ''))))
+            if not session.authenticated:
+                self.stats['signature_errors'] += 1
+            self._ws_send(session, {'id': 'auth', 'code': 0 if session.authenticated else CODE_SIGNATURE,
+                                    'msg': '' if session.authenticated else 'Signature verification failed'})
+            return
+        topic = message.get('topic')
+        if topic not in WS_TOPICS:
+            self._ws_send(session, {'id': request_id, 'code': CODE_BAD_REQUEST, 'msg': f"unknown topic {topic}"})
+        elif not session.authenticated:
+            self._ws_send(session, {'id': request_id, 'code': CODE_SIGNATURE, 'msg': 'not authenticated'})
+        else:
+            session.topics.add(topic)
+            self._ws_send(session, {'id': request_id, 'code': 0, 'msg': ''})
+            if topic != 'userTrades':
+                self._push(topic, self._topic_snapshot(topic), [session])
+
+    def _topic_snapshot(self, topic: str) -> Any:
+        positions = self.exchange.fetch_positions()
+        if topic == 'positions':
+            return [{'symbol': self._market_id(p['symbol']), 'positionSide': p['side'].upper(),
+                     'positionAmt': _fmt(p['contracts'] if p['side'] == 'long' else -p['contracts']),
+                     'entryPrice': _fmt(p['entryPrice']), 'leverage': p.get('leverage') or 1,
+                     'unrealizedProfit': _fmt(p['unrealizedPnl'])} for p in positions]
+        wallet = self.balance + self.exchange.realized_pnl
+        used = sum(p['entryPrice'] * p['contracts'] / (p.get('leverage') or 1) for p in positions)
+        return {'asset': 'USDT', 'totalWalletBalance': _fmt(wallet), 'availableBalance': _fmt(wallet - used)}
+
+    def _push(self, topic: str, data: Any, sessions: Optional[List[_WebSocketSession]] = None):
+        for session in sessions or self.sessions:
+            if topic in session.topics:
+                self._ws_send(session, {'topic': topic, 'data': data})
+
+    def _push_fills(self, orders: List[Dict[str, Any]]):
+        """Виконані ордери: userTrades, потім оновлені positions та balance."""
+        if not self.sessions or not orders:
+            return
+        now = int(time.time() * 1000)
+        self._push('userTrades', [{'symbol': self._market_id(o['symbol']), 'orderId': int(o['id']), 'price': _fmt(o['average']),
+                                   'qty': _fmt(o['filled']), 'side': o['side'].upper(), 'positionSide': o['info']['positionSide'],
+                                   'time': now} for o in orders])
+        for topic in ('positions', 'balance'):
+            self._push(topic, self._topic_snapshot(topic))
+
+    # --- фонові задачі ---
+    async def _price_feed(self):
+        """Випадкове блукання цін усіх символів кожні feed_interval с; спрацьовані SL/TP/лімітні ордери виконуються."""
+        ticks = sim_exchange.random_walk(dict(self.exchange.prices), steps=sys.maxsize,
+                                         volatility=self.feed_volatility, seed=self._random.randrange(2 ** 32))
+        while True:
+            await asyncio.sleep(self.feed_interval)
+            filled = []
+            for symbol, price in itertools.islice(ticks, len(self.exchange.prices)):
+                filled.extend(self.exchange.update_price(symbol, price))
+            self._push_fills(filled)
+
+    async def _periodic_push(self):
+        while True:
+            await asyncio.sleep(self.ws_push_interval)
+            for topic in ('positions', 'balance'):
+                if any(topic in session.topics for session in self.sessions):
+                    self._push(topic, self._topic_snapshot(topic))
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        if self.feed_interval > 0:
+            self._tasks.append(asyncio.create_task(self._price_feed(), name="MockBingXFeed"))
+        if self.ws_push_interval > 0:
+            self._tasks.append(asyncio.create_task(self._periodic_push(), name="MockBingXPush"))
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"[MockBingX] REST: http://{host}:{port}/openApi, websocket: ws://{host}:{port}{WS_PATH}")
+        return self._server
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_in_thread(self, host: str = DEFAULT_HOST, port: int = 0) -> Tuple[str, threading.Thread]:
+        """Запускає сервер у фоновому потоці з власним циклом подій (для бенчмарків). Повертає (base_url, потік)."""
+        started = threading.Event()
+        address: List[str] = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            server = loop.run_until_complete(self.start(host, port))
+            address.append(f"http://{host}:{server.sockets[0].getsockname()[1]}")
+            started.set()
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name="MockBingXServer", daemon=True)
+        thread.start()
+        started.wait()
+        return address[0], thread
+
+    def summary(self) -> Dict[str, Any]:
+        """Статистика сервера (з'єднання, запити за ендпоінтом і статусом, 429/503, websocket) та стан біржі."""
+        stats = dict(self.stats)
+        stats['requests_per_connection'] = round(stats['requests'] / stats['connections'], 2) if stats['connections'] else 0.0
+        stats['ws_sessions'] = len(self.sessions)
+        stats['exchange'] = self.exchange.summary()
+        return stats
+
+# --- кадри websocket (RFC 6455) ---
+def _frame(opcode: int, payload: bytes) -> bytes:
+    """Кадр сервера (FIN, без маски)."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """(opcode, payload) кадру клієнта. Фрагментовані повідомлення клієнти BingX не надсилають."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else b''
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return first & 0x0F, payload
+
+def parse_symbols(value: str) -> Dict[str, float]:
+    """'BTC-USDT=65000,ETH-USDT=3200' -> {'BTC-USDT': 65000.0, 'ETH-USDT': 3200.0}"""
+    symbols = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        market_id, _, price = item.partition('=')
+        symbols[market_id.upper()] = float(price)
+    return symbols
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the BingX swap REST and websocket API.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Адреса (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Порт REST та websocket (default: {DEFAULT_PORT})")
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY, help="Очікуваний API ключ (default: mock)")
+    parser.add_argument('--api-secret', default=DEFAULT_API_SECRET, help="Секрет для перевірки підпису (default: mock)")
+    parser.add_argument('--symbols', type=parse_symbols, help="Символи з початковими цінами: BTC-USDT=65000,ETH-USDT=3200")
+    parser.add_argument('--balance', type=float, default=DEFAULT_BALANCE, help=f"Початковий баланс USDT (default: {DEFAULT_BALANCE:.0f})")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Затримка відповіді REST, мс (default: 0)")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Випадкова додаткова затримка 0..N мс (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Частка запитів з відповіддю HTTP 503 (default: 0)")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Запитів/с на API ключ, понад - HTTP 429 (default: без обмеження)")
+    parser.add_argument('--rate-burst', type=float, help="Запас запитів понад rate-limit (default: rate-limit)")
+    parser.add_argument('--feed-interval', type=float, default=0.0, help="Період тіків price feed, с (default: 0 - ціни не змінюються)")
+    parser.add_argument('--feed-volatility', type=float, default=0.002, help="Волатильність тіку (default: 0.002)")
+    parser.add_argument('--ws-push-interval', type=float, default=5.0, help="Період повідомлень positions/balance, с (default: 5)")
+    parser.add_argument('--ws-drop-after', type=float, default=0.0, help="Розривати websocket з'єднання через N с (default: 0 - ні)")
+    parser.add_argument('--seed', type=int, help="Зерно генератора помилок, затримок та цін")
+    parser.add_argument('--log-level', default='INFO', help="Рівень логування (default: INFO)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)-8s - %(name)-25s - %(message)s')
+    server = MockBingXServer(symbols=args.symbols, api_key=args.api_key, api_secret=args.api_secret, balance=args.balance,
+                             latency_seconds=args.latency_ms / 1000.0, latency_jitter=args.jitter_ms / 1000.0,
+                             error_rate=args.error_rate, rate_limit=args.rate_limit, rate_burst=args.rate_burst,
+                             feed_interval=args.feed_interval, feed_volatility=args.feed_volatility,
+                             ws_push_interval=args.ws_push_interval, ws_drop_after=args.ws_drop_after, seed=args.seed)
+
+    async def run():
+        await server.start(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.summary(), indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,438 @@
+# Local stand-in for the Telegram Bot API: forwarded channel posts via getUpdates or webhook pushes at a set rate
+#
+# Сервер відповідає на методи Bot API, які викликає python-telegram-bot для прийому оновлень (getMe,
+# getUpdates з long polling, setWebhook/deleteWebhook/getWebhookInfo, sendMessage) у форматі
+# {"ok": true, "result": ...}. Оновлення - пости в цільовому каналі, переслані з каналів сигналів
+# (channel_post з forward_origin типу channel), з тексту корпусу (JSONL як у benchmarks/corpus або
+# bot.log - формати replay.py). Частина постів може надходити як фото з підписом (caption) та як
+# "шум", який фільтр telegram_monitor не пропускає (фото без підпису, edited_channel_post).
+#
+# Оновлення з'являються з частотою --rate (після початкового пакета --burst), починаючи з першого
+# getUpdates або setWebhook бота. Після setWebhook сервер надсилає їх POST запитами на адресу webhook
+# (до max_connections паралельно), getUpdates тоді повертає 409 Conflict, як Telegram.
+# Статистика: GET /mock/stats.
+#
+#   python mock_telegram_server.py --corpus benchmarks/corpus/signals.jsonl --rate 50 --burst 500
+#   TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+#   python benchmarks/bench_telegram_intake.py --updates 2000 --burst 2000
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8081
+DEFAULT_TOKEN = '123456:mock'
+DEFAULT_TARGET_CHAT_ID = -1001000000001
+DEFAULT_TARGET_TITLE = 'Signals Inbox'
+UNKNOWN_CHANNEL_TITLE = 'Mock Channel' # для записів корпусу без каналу (повідомлення не з каналів сигналів)
+DEFAULT_POSTS = [('Mock Signals', None, "Монета: BTC LONG\nЦена входа: 65000\nТэйки: 65500 66000 67000\nСтоп: 64000")]
+DEFAULT_WEBHOOK_CONNECTIONS = 40
+MAX_UPDATES_PER_REQUEST = 100
+
+_HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found', 409: 'Conflict'}
+
+def _channel_id(title: str) -> int:
+    """Стабільний ID каналу-джерела для назви (записи корпусу не містять chat_id)."""
+    return -1001000000000 - zlib.crc32(title.encode('utf-8')) % 1000000000
+
+def load_posts(path: str, config: dict) -> List[Tuple[str, Optional[int], str]]:
+    """(назва каналу-джерела, його chat_id, текст) з JSONL запису чи bot.log - через replay.load_messages."""
+    import replay # replay імпортує конвеєр бота - лише коли потрібен корпус
+    return [(m['title'] or UNKNOWN_CHANNEL_TITLE, m.get('chat_id'), m['text']) for m in replay.load_messages(path, config)]
+
+def _parse_params(query: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    """Параметри методу: рядок запиту, form-urlencoded (значення JSON-кодовані, як у python-telegram-bot) або JSON."""
+    params: Dict[str, Any] = dict(urllib.parse.parse_qsl(query))
+    content_type = headers.get('content-type', '')
+    if body and content_type.startswith('application/json'):
+        params.update(json.loads(body.decode('utf-8')))
+        return params
+    if body and content_type.startswith('application/x-www-form-urlencoded'):
+        params.update(urllib.parse.parse_qsl(body.decode('utf-8')))
+    for key, value in params.items():
+        if isinstance(value, str):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                pass
+    return params
+
+class MockTelegramServer:
+    """Bot API сервер з генератором оновлень. start() у циклі подій або start_in_thread()."""
+
+    def __init__(self, posts: Optional[List[Tuple[str, Optional[int], str]]] = None, token: str = DEFAULT_TOKEN,
+                 target_chat_id: int = DEFAULT_TARGET_CHAT_ID, target_title: str = DEFAULT_TARGET_TITLE,
+                 count: int = 1000, rate: float = 0.0, burst: int = 0, caption_ratio: float = 0.0,
+                 noise_ratio: float = 0.0, seed: Optional[int] = None):
+        self.posts = posts or DEFAULT_POSTS
+        self.token = token
+        self.target_chat_id = target_chat_id
+        self.target_title = target_title
+        self.count = count
+        self.rate = rate
+        self.burst = burst
+        self.caption_ratio = caption_ratio
+        self.noise_ratio = noise_ratio
+        self.updates: List[Dict[str, Any]] = [] # update_id = індекс + 1
+        self.created: Dict[int, float] = {}     # update_id -> time.perf_counter() появи
+        self.delivered: Dict[int, float] = {}   # update_id -> час відправки боту (відповідь getUpdates / POST webhook)
+        self.matching = 0 # оновлень, які має пропустити фільтр (TEXT | CAPTION) & CHANNEL_POST
+        self.webhook: Optional[Dict[str, Any]] = None
+        self.stats: Dict[str, Any] = {
+            'connections': 0, 'requests': 0, 'methods': {}, 'get_updates_calls': 0, 'empty_polls': 0,
+            'conflicts': 0, 'webhook_posts': 0, 'webhook_errors': 0,
+        }
+        self._random = random.Random(seed)
+        self._confirmed = 0 # update_id, до якого (включно) бот підтвердив отримання (offset - 1)
+        self._new_updates: Optional[asyncio.Event] = None
+        self._webhook_queue: Optional[asyncio.Queue] = None
+        self._webhook_tasks: List[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._producer: Optional[asyncio.Task] = None
+        self._methods = {
+            'getme': self._get_me,
+            'getupdates': self._get_updates,
+            'setwebhook': self._set_webhook,
+            'deletewebhook': self._delete_webhook,
+            'getwebhookinfo': self._get_webhook_info,
+            'sendmessage': self._send_message,
+            'close': self._true,
+            'logout': self._true,
+        }
+
+    # --- оновлення ---
+    def _make_update(self, index: int) -> Dict[str, Any]:
+        title, source_chat_id, text = self.posts[index % len(self.posts)]
+        now = int(time.time())
+        message: Dict[str, Any] = {
+            'message_id': index + 1,
+            'date': now,
+            'chat': {'id': self.target_chat_id, 'type': 'channel', 'title': self.target_title},
+            'forward_origin': {'type': 'channel', 'chat': {'id': source_chat_id or _channel_id(title), 'type': 'channel', 'title': title},
+                               'message_id': index + 1, 'date': now},
+        }
+        photo = [{'file_id': f"mock-photo-{index}", 'file_unique_id': f"mock-{index}", 'width': 90, 'height': 90}]
+        update_type = 'channel_post'
+        roll = self._random.random()
+        if roll < self.noise_ratio:
+            # Оновлення, які фільтр відкидає: фото без підпису або редагування посту
+            if self._random.random() < 0.5:
+                message['photo'] = photo
+            else:
+                update_type, message['text'], message['edit_date'] = 'edited_channel_post', text, now
+        else:
+            self.matching += 1
+            if roll < self.noise_ratio + self.caption_ratio:
+                message['photo'], message['caption'] = photo, text
+            else:
+                message['text'] = text
+        return {'update_id': index + 1, update_type: message}
+
+    def _publish(self, amount: int):
+        for _ in range(amount):
+            update = self._make_update(len(self.updates))
+            self.updates.append(update)
+            self.created[update['update_id']] = time.perf_counter()
+            if self._webhook_queue is not None:
+                self._webhook_queue.put_nowait(update['update_id'])
+        self._new_updates.set()
+
+    def _begin_updates(self):
+        """Генерація оновлень починається з першого getUpdates/setWebhook - час старту бота не входить у затримку."""
+        if self._producer is None:
+            self._producer = asyncio.create_task(self._produce(), name="MockTelegramProducer")
+
+    async def _produce(self):
+        """Початковий пакет burst, далі rate оновлень/с (rate=0 - все одразу) до count."""
+        self._publish(min(self.burst, self.count))
+        if self.rate <= 0:
+            self._publish(self.count - len(self.updates))
+            return
+        started = time.perf_counter()
+        published_at_rate = 0
+        while len(self.updates) < self.count:
+            await asyncio.sleep(min(0.01, 1.0 / self.rate))
+            due = int((time.perf_counter() - started) * self.rate) - published_at_rate
+            if due > 0:
+                due = min(due, self.count - len(self.updates))
+                published_at_rate += due
+                self._publish(due)
+
+    # --- методи Bot API ---
+    def _true(self, params):
+        return True
+
+    def _get_me(self, params):
+        return {'id': int(self.token.split(':')[0]), 'is_bot': True, 'first_name': 'Mock Bot', 'username': 'mock_bot',
+                'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+
+    async def _get_updates(self, params):
+        if self.webhook:
+            self.stats['conflicts'] += 1
+            raise _ApiError(409, "Conflict: can't use getUpdates method while webhook is active; use deleteWebhook to delete the webhook first")
+        self.stats['get_updates_calls'] += 1
+        self._begin_updates()
+        offset = int(params.get('offset') or 0)
+        if offset > 0:
+            self._confirmed = max(self._confirmed, min(offset - 1, len(self.updates)))
+        limit = max(1, min(int(params.get('limit') or MAX_UPDATES_PER_REQUEST), MAX_UPDATES_PER_REQUEST))
+        timeout = float(params.get('timeout') or 0)
+        if self._confirmed >= len(self.updates) and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = self.updates[self._confirmed:self._confirmed + limit]
+        if not batch:
+            self.stats['empty_polls'] += 1
+        now = time.perf_counter()
+        for update in batch:
+            self.delivered.setdefault(update['update_id'], now)
+        return batch
+
+    def _set_webhook(self, params):
+        url = params.get('url') or ''
+        if not url:
+            return self._delete_webhook(params)
+        self._stop_webhook()
+        if params.get('drop_pending_updates'):
+            self._confirmed = len(self.updates)
+        self.webhook = {'url': url, 'secret_token': params.get('secret_token'),
+                        'max_connections': int(params.get('max_connections') or DEFAULT_WEBHOOK_CONNECTIONS)}
+        self._webhook_queue = asyncio.Queue()
+        for update in self.updates[self._confirmed:]:
+            self._webhook_queue.put_nowait(update['update_id'])
+        self._webhook_tasks = [asyncio.create_task(self._webhook_sender(), name=f"MockTelegramWebhook-{i}")
+                               for i in range(self.webhook['max_connections'])]
+        logger.info(f"[MockTelegram] Webhook встановлено: {url} (max_connections={self.webhook['max_connections']})")
+        self._begin_updates()
+        return True
+
+    def _stop_webhook(self):
+        for task in self._webhook_tasks:
+            task.cancel()
+        self._webhook_tasks = []
+        self._webhook_queue = None
+
+    def _delete_webhook(self, params):
+        if self.webhook:
+            logger.info(f"[MockTelegram] Webhook видалено: {self.webhook['url']}")
+        self._stop_webhook()
+        self.webhook = None
+        if params.get('drop_pending_updates'):
+            self._confirmed = len(self.updates)
+        return True
+
+    def _get_webhook_info(self, params):
+        return {'url': self.webhook['url'] if self.webhook else '', 'has_custom_certificate': False,
+                'pending_update_count': len(self.updates) - self._confirmed,
+                'max_connections': self.webhook['max_connections'] if self.webhook else None}
+
+    def _send_message(self, params):
+        return {'message_id': len(self.updates) + 1, 'date': int(time.time()),
+                'chat': {'id': params.get('chat_id'), 'type': 'private'}, 'text': str(params.get('text', ''))}
+
+    # --- webhook ---
+    async def _webhook_sender(self):
+        """Одне з'єднання з webhook (keep-alive): POST оновлення, при помилці - повтор через 1 с."""
+        url = urllib.parse.urlsplit(self.webhook['url'])
+        headers = f"POST {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+        if self.webhook['secret_token']:
+            headers += f"X-Telegram-Bot-Api-Secret-Token: {self.webhook['secret_token']}\r\n"
+        queue = self._webhook_queue
+        reader = writer = None
+        while True:
+            update_id = await queue.get()
+            body = json.dumps(self.updates[update_id - 1]).encode('utf-8')
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        url.hostname, url.port or (443 if url.scheme == 'https' else 80),
+                        ssl=ssl.create_default_context() if url.scheme == 'https' else None)
+                self.delivered.setdefault(update_id, time.perf_counter())
+                writer.write(f"{headers}Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+                status, response_headers = await _read_response_head(reader)
+                await reader.readexactly(int(response_headers.get('content-length', 0) or 0))
+                if response_headers.get('connection', '').lower() == 'close':
+                    writer.close()
+                    writer = None
+                if status >= 300:
+                    raise ConnectionError(f"webhook відповів HTTP {status}")
+                self.stats['webhook_posts'] += 1
+                self._confirmed = max(self._confirmed, update_id)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                self.stats['webhook_errors'] += 1
+                logger.warning(f"[MockTelegram] Помилка доставки оновлення {update_id} на webhook: {e}")
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                await asyncio.sleep(1.0)
+                queue.put_nowait(update_id)
+
+    # --- HTTP ---
+    async def handle_request(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        path, _, query = target.partition('?')
+        if method == 'GET' and path == '/mock/stats':
+            return 200, json.dumps(self.summary()).encode('utf-8')
+        self.stats['requests'] += 1
+        prefix, _, api_method = path.rpartition('/')
+        if prefix != f"/bot{self.token}":
+            status, payload = 401, {'ok': False, 'error_code': 401, 'description': 'Unauthorized'}
+        elif api_method.lower() not in self._methods:
+            status, payload = 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        else:
+            self.stats['methods'][api_method] = self.stats['methods'].get(api_method, 0) + 1
+            try:
+                result = self._methods[api_method.lower()](_parse_params(query, headers, body))
+                if asyncio.iscoroutine(result):
+                    result = await result
+                status, payload = 200, {'ok': True, 'result': result}
+            except _ApiError as e:
+                status, payload = e.code, {'ok': False, 'error_code': e.code, 'description': e.description}
+            except (ValueError, TypeError) as e:
+                status, payload = 400, {'ok': False, 'error_code': 400, 'description': f"Bad Request: {e}"}
+        return status, json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, version = (lines[0].split() + ['', '', ''])[:3]
+                headers = _parse_headers(lines[1:])
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                status, payload = await self.handle_request(method, target, headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write((f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        self._new_updates = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"[MockTelegram] Bot API: http://{host}:{port}/bot{self.token}/<метод>, оновлень: {self.count}")
+        return self._server
+
+    async def stop(self):
+        self._stop_webhook()
+        if self._producer is not None:
+            self._producer.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_in_thread(self, host: str = DEFAULT_HOST, port: int = 0) -> Tuple[str, threading.Thread]:
+        """Запускає сервер у фоновому потоці з власним циклом подій (для бенчмарків). Повертає (base_url, потік)."""
+        started = threading.Event()
+        address: List[str] = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            server = loop.run_until_complete(self.start(host, port))
+            address.append(f"http://{host}:{server.sockets[0].getsockname()[1]}")
+            started.set()
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name="MockTelegramServer", daemon=True)
+        thread.start()
+        started.wait()
+        return address[0], thread
+
+    def summary(self) -> Dict[str, Any]:
+        """Статистика: згенеровані/доставлені оновлення, виклики getUpdates (оновлень на виклик), webhook."""
+        stats = dict(self.stats)
+        polls_with_updates = stats['get_updates_calls'] - stats['empty_polls']
+        stats.update(
+            updates=len(self.updates), matching=self.matching, delivered=len(self.delivered),
+            confirmed=self._confirmed, webhook_url=self.webhook['url'] if self.webhook else None,
+            updates_per_poll=round((len(self.delivered) - stats['webhook_posts']) / polls_with_updates, 1) if polls_with_updates > 0 else None,
+        )
+        return stats
+
+class _ApiError(Exception):
+    def __init__(self, code: int, description: str):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+
+def _parse_headers(lines: List[str]) -> Dict[str, str]:
+    headers = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+async def _read_response_head(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+    lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    return int(lines[0].split()[1]), _parse_headers(lines[1:])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Telegram Bot API serving forwarded channel posts.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Адреса (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Порт (default: {DEFAULT_PORT})")
+    parser.add_argument('--token', default=DEFAULT_TOKEN, help=f"Токен бота, який приймає сервер (default: {DEFAULT_TOKEN})")
+    parser.add_argument('--target-chat-id', type=int, default=DEFAULT_TARGET_CHAT_ID,
+                        help=f"ID цільового каналу - TELEGRAM_TARGET_CHAT_ID бота (default: {DEFAULT_TARGET_CHAT_ID})")
+    parser.add_argument('--corpus', help="Тексти постів: JSONL (benchmarks/corpus/signals.jsonl, запис replay) або bot.log")
+    parser.add_argument('--config', default='config.json', help="Конфігурація для назв каналів корпусу (default: config.json)")
+    parser.add_argument('--updates', type=int, default=1000, help="Кількість оновлень (default: 1000)")
+    parser.add_argument('--rate', type=float, default=10.0, help="Оновлень/с після початкового пакета, 0 - всі одразу (default: 10)")
+    parser.add_argument('--burst', type=int, default=0, help="Оновлень, доступних одразу на старті (default: 0)")
+    parser.add_argument('--caption-ratio', type=float, default=0.0, help="Частка постів-фото з текстом у підписі (default: 0)")
+    parser.add_argument('--noise-ratio', type=float, default=0.0, help="Частка оновлень, які фільтр має відкинути (default: 0)")
+    parser.add_argument('--seed', type=int, help="Зерно генератора типів оновлень")
+    parser.add_argument('--log-level', default='INFO', help="Рівень логування (default: INFO)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)-8s - %(name)-25s - %(message)s')
+    posts = None
+    if args.corpus:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            posts = load_posts(args.corpus, json.load(f))
+    server = MockTelegramServer(posts, token=args.token, target_chat_id=args.target_chat_id, count=args.updates,
+                                rate=args.rate, burst=args.burst, caption_ratio=args.caption_ratio,
+                                noise_ratio=args.noise_ratio, seed=args.seed)
+
+    async def run():
+        await server.start(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.summary(), indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
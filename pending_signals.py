@@ -0,0 +1,144 @@
+# Module for the bounded, persistent store of two-stage signals waiting for their details message
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import data_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 15 * 60
+DEFAULT_MAX_ENTRIES = 100
+
+PendingKey = Tuple[str, str] # (channel_key, market_symbol)
+
+class PendingSignalStore:
+    """Виконані входи двохетапних сигналів, що очікують повідомлення з деталями (SL/TP).
+
+    Пошук O(1) за (channel_key, символ ринку); символ вже нормалізований BingXClient._format_symbol_for_swap.
+    Записи впорядковані за часом додавання, тому прострочені (старші за ttl_seconds) завжди на початку.
+    Запис, що прострочився або був витіснений через max_entries, передається в on_expire(entry_info) -
+    позиція вже відкрита, тому власник сховища має її захистити (напр. стоп-лосом за замовчуванням).
+    Якщо persist=True, кожна зміна дублюється в таблицю БД pending_entries і відновлюється через restore().
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 on_expire: Optional[Callable[[Dict[str, Any]], Any]] = None, persist: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.on_expire = on_expire
+        self.persist = persist
+        self._entries: "OrderedDict[PendingKey, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: PendingKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: PendingKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    # --- збереження в БД ---
+    def _db_call(self, func: Callable, *args) -> Any:
+        if not self.persist:
+            return None
+        conn: Optional[sqlite3.Connection] = None
+        try:
+            conn = data_manager.get_db_connection()
+            if not conn:
+                logger.error("[PendingSignals] Немає з'єднання з БД. Стан очікуючих сигналів не збережено.")
+                return None
+            return func(conn, *args)
+        finally:
+            if conn:
+                conn.close()
+
+    # --- основні операції ---
+    def put(self, key: PendingKey, entry_info: Dict[str, Any], now: Optional[float] = None):
+        """Додає (або замінює) очікуючий вхід. Найстаріші записи понад max_entries витісняються через on_expire."""
+        entry_info.setdefault('timestamp', time.time() if now is None else now)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry_info
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        self._db_call(data_manager.save_pending_entry, key[0], key[1], entry_info['timestamp'], _serialize(entry_info))
+        for evicted_key, evicted_info in evicted:
+            logger.warning(f"[PendingSignals] Перевищено ліміт ({self.max_entries}) очікуючих сигналів. Витіснено найстаріший: {evicted_key}.")
+            self._finish_expired(evicted_key, evicted_info)
+
+    def pop(self, key: PendingKey, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Забирає очікуючий вхід (деталі отримано). Прострочений запис не повертається - він чекає expire()."""
+        with self._lock:
+            entry_info = self._entries.get(key)
+            if entry_info is None or time.time() - entry_info['timestamp'] >= self.ttl_seconds:
+                return default
+            del self._entries[key]
+        self._db_call(data_manager.delete_pending_entry, key[0], key[1])
+        return entry_info
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Прибирає прострочені записи та викликає для кожного on_expire. Повертає кількість прострочених."""
+        now = time.time() if now is None else now
+        expire_before = now - self.ttl_seconds
+        expired = []
+        with self._lock:
+            while self._entries:
+                key, entry_info = next(iter(self._entries.items()))
+                if entry_info['timestamp'] >= expire_before:
+                    break
+                self._entries.popitem(last=False)
+                expired.append((key, entry_info))
+        for key, entry_info in expired:
+            logger.warning(f"[PendingSignals] Деталі для {key[1]} ({key[0]}) не надійшли за {self.ttl_seconds} с.")
+            self._finish_expired(key, entry_info)
+        return len(expired)
+
+    def _finish_expired(self, key: PendingKey, entry_info: Dict[str, Any]):
+        # Запис у БД видаляється лише після обробки: якщо бот впаде всередині on_expire, запис відновиться при старті
+        if self.on_expire:
+            try:
+                self.on_expire(entry_info)
+            except Exception as e:
+                logger.error(f"[PendingSignals] Помилка обробки простроченого сигналу {key}: {e}", exc_info=True)
+        self._db_call(data_manager.delete_pending_entry, key[0], key[1])
+
+    def restore(self) -> int:
+        """Відновлює очікуючі входи з БД (після перезапуску). Прострочені будуть оброблені першим expire()."""
+        rows = self._db_call(data_manager.load_pending_entries) or []
+        with self._lock:
+            for channel_key, symbol, created_at, payload in rows:
+                try:
+                    entry_info = json.loads(payload)
+                except (TypeError, ValueError) as e:
+                    logger.error(f"[PendingSignals] Пошкоджений запис очікуючого сигналу {symbol} ({channel_key}): {e}")
+                    continue
+                entry_info['timestamp'] = created_at
+                self._entries.pop((channel_key, symbol), None)
+                self._entries[(channel_key, symbol)] = entry_info
+            return len(self._entries)
+
+def _serialize(entry_info: Dict[str, Any]) -> str:
+    # Відповіді ccxt можуть містити Decimal/datetime - зберігаємо їх як рядки
+    return json.dumps(entry_info, default=str, ensure_ascii=False)
+
+def from_config(config: dict, on_expire: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                persist: bool = True) -> PendingSignalStore:
+    """Створює PendingSignalStore з секції config['pending_signals'] (ttl_seconds, max_entries)."""
+    pending_config = config.get('pending_signals', {})
+    return PendingSignalStore(
+        ttl_seconds=pending_config.get('ttl_seconds', DEFAULT_TTL_SECONDS),
+        max_entries=pending_config.get('max_entries', DEFAULT_MAX_ENTRIES),
+        on_expire=on_expire,
+        persist=persist,
+    )
@@ -1,119 +1,119 @@
 # Position and Order Management Module
+import asyncio
+import concurrent.futures
 import time
 import logging
 import threading
 import sqlite3
 import json
 import datetime
-from typing import List, Dict, Optional, Any
-from bingx_client import BingXClient  # Припускаємо, що ваш клієнт BingX тут
+from typing import TYPE_CHECKING, List, Dict, Optional, Any
+
+if TYPE_CHECKING:
+    from bingx_client import BingXClient # ccxt імпортується лише під час створення клієнта біржі
 # TODO: Додати імпорт бази даних або сховища стану
 
 # Імпортуємо функції з data_manager
 import data_manager 
+import metrics
 
 class PositionManager:
-    def __init__(self, bingx_api: BingXClient, config: dict):
+    def __init__(self, bingx_api: 'BingXClient', config: dict):
         self.logger = logging.getLogger(__name__)
         self.bingx_api = bingx_api
         self.config = config
-        self.stop_event = threading.Event()
-        self.thread = None
+        self.stop_event = threading.Event() # Сигнал зупинки для ітерації, що виконується в потоці вводу/виводу
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
         # Отримуємо інтервал з конфігу, або значення за замовчуванням
         self.check_interval_seconds = config.get('position_manager', {}).get('check_interval_seconds', 60)
         self.logger.info(f"[PositionManager] Інтервал перевірки стану: {self.check_interval_seconds} секунд.")
+        # Періодичне перенесення закритих позицій в архів (closed_positions)
+        self.archive_interval_seconds = config.get('position_manager', {}).get('archive_interval_seconds', 3600)
+        self.archive_batch_size = config.get('position_manager', {}).get('archive_batch_size', 500)
+        self._last_archive_time = 0.0
         # TODO: Завантажити активні позиції з БД при старті? (Можливо, не потрібно, цикл сам їх підхопить)
 
-    def start_monitoring(self):
-        """Запускає потік моніторингу позицій."""
-        if self.thread is not None and self.thread.is_alive():
-            self.logger.warning("[PositionManager] Спроба запустити моніторинг, коли він вже працює.")
-            return
-            
-        self.logger.info("[PositionManager] Запуск потоку моніторингу...")
-        self.stop_event.clear()
-        self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.thread.start()
-        self.logger.info("[PositionManager] Потік моніторингу запущено.")
-
-    def stop_monitoring(self):
-        """Зупиняє потік моніторингу."""
-        if self.thread is None or not self.thread.is_alive():
-            self.logger.warning("[PositionManager] Спроба зупинити моніторинг, коли він не працює.")
-            return
-            
-        self.logger.info("[PositionManager] Зупинка потоку моніторингу...")
-        self.stop_event.set()
-        # Збільшимо таймаут на випадок довгих запитів до API
-        join_timeout = self.check_interval_seconds * 1.5 
-        self.thread.join(timeout=join_timeout) 
-        if self.thread.is_alive():
-             self.logger.warning(f"[PositionManager] Потік моніторингу не завершився за {join_timeout} сек.")
-        else:
-             self.logger.info("[PositionManager] Потік моніторингу успішно зупинено.")
-        self.thread = None
+    async def run(self):
+        """Цикл моніторингу позицій як задача asyncio у спільному циклі подій бота. Зупиняється скасуванням задачі.
 
-    def _monitor_loop(self):
-        """Головний цикл моніторингу стану позицій та ордерів."""
-        self.logger.info("[PositionManager] Початок циклу моніторингу (в окремому потоці).")
-        
-        # Створюємо з'єднання з БД СПЕЦІАЛЬНО для цього потоку
-        db_conn_thread: Optional[sqlite3.Connection] = None 
+        Синхронні звернення до біржі (ccxt) та БД виконуються у виділеному потоці вводу/виводу PositionManager
+        (один потік - тому власне з'єднання SQLite ніколи не використовується з кількох потоків).
+        Очікування між ітераціями - asyncio.sleep, тож скасування спрацьовує одразу.
+        """
+        self.logger.info("[PositionManager] Початок циклу моніторингу (задача asyncio).")
+        loop = asyncio.get_running_loop()
+        self.stop_event.clear()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="PositionManagerIO")
+        db_conn: Optional[sqlite3.Connection] = None
         try:
-            db_conn_thread = data_manager.get_db_connection()
-            if not db_conn_thread:
-                 self.logger.critical("[PositionManager] Не вдалося створити з'єднання з БД для потоку моніторингу. Зупинка потоку.")
-                 return # Зупиняємо потік
-                 
-            self.logger.info("[PositionManager] З'єднання з БД для потоку моніторингу створено.")
-
-            while not self.stop_event.is_set():
+            db_conn = await loop.run_in_executor(self._executor, data_manager.get_db_connection)
+            if not db_conn:
+                self.logger.critical("[PositionManager] Не вдалося створити з'єднання з БД для моніторингу. Зупинка моніторингу.")
+                return
+            self.logger.info("[PositionManager] З'єднання з БД для моніторингу створено.")
+
+            while True:
                 start_time = time.time()
                 try:
-                    self.logger.debug("[PositionManager] Початок ітерації перевірки стану позицій...") 
-                    # 1. Отримати список активних позицій з БД (використовуємо з'єднання потоку)
-                    active_positions = data_manager.get_active_positions(db_conn_thread)
-                    if not active_positions:
-                        self.logger.debug("[PositionManager] Немає активних позицій для моніторингу.") 
-                    else:
-                        self.logger.info(f"[PositionManager] Знайдено {len(active_positions)} активних позицій для перевірки.")
-                        # 2. Для кожної позиції перевірити її стан
-                        for position in active_positions:
-                            if self.stop_event.is_set(): 
-                                self.logger.info("[PositionManager] Отримано сигнал зупинки під час обробки позицій.")
-                                break 
-                            time.sleep(self.config.get('position_manager', {}).get('api_request_delay', 0.2)) 
-                            # Передаємо з'єднання потоку в функцію перевірки
-                            self._check_and_update_position_status(position, db_conn_thread)
-                    
-                    if self.stop_event.is_set():
-                        break
-                         
-                    self.logger.debug("[PositionManager] Ітерацію перевірки стану позицій завершено.") 
-                    
+                    await loop.run_in_executor(self._executor, self._run_cycle, db_conn)
                 except sqlite3.Error as db_err:
-                     self.logger.critical(f"[PositionManager] Помилка бази даних в циклі моніторингу: {db_err}", exc_info=True)
-                     self.stop_event.set() 
-                     break 
+                    self.logger.critical(f"[PositionManager] Помилка бази даних в циклі моніторингу: {db_err}", exc_info=True)
+                    return
                 except Exception as e:
                     self.logger.error(f"[PositionManager] Неочікувана помилка в циклі моніторингу: {e}", exc_info=True)
-                
+
                 # Розрахунок часу очікування
                 elapsed_time = time.time() - start_time
+                metrics.POSITION_MANAGER_CYCLE_SECONDS.observe(elapsed_time)
                 wait_time = max(0, self.check_interval_seconds - elapsed_time)
                 self.logger.debug(f"[PositionManager] Цикл завершено за {elapsed_time:.2f} сек. Очікування {wait_time:.2f} сек...")
-                interrupted = self.stop_event.wait(wait_time)
-                if interrupted:
-                     self.logger.info("[PositionManager] Очікування перервано сигналом зупинки.")
-                     break 
-                     
+                await asyncio.sleep(wait_time)
+        except asyncio.CancelledError:
+            self.logger.info("[PositionManager] Моніторинг скасовано.")
+            raise
         finally:
-            # Гарантовано закриваємо з'єднання потоку при виході з циклу/потоку
-            if db_conn_thread:
-                 self.logger.info("[PositionManager] Закриття з'єднання з БД для потоку моніторингу.")
-                 db_conn_thread.close()
+            # Поточна ітерація в потоці вводу/виводу перевіряє stop_event між позиціями і завершується сама
+            self.stop_event.set()
+            executor, self._executor = self._executor, None
+            if db_conn:
+                self.logger.info("[PositionManager] Закриття з'єднання з БД моніторингу.")
+                executor.submit(db_conn.close)
+            executor.shutdown(wait=False)
             self.logger.info("[PositionManager] Цикл моніторингу завершено.")
 
+    def _run_cycle(self, db_conn: sqlite3.Connection):
+        """Одна ітерація перевірки стану позицій (виконується в потоці вводу/виводу PositionManager)."""
+        self.logger.debug("[PositionManager] Початок ітерації перевірки стану позицій...")
+        # 1. Отримати список активних позицій з БД
+        active_positions = data_manager.get_active_positions(db_conn)
+        if not active_positions:
+            self.logger.debug("[PositionManager] Немає активних позицій для моніторингу.")
+        else:
+            self.logger.info(f"[PositionManager] Знайдено {len(active_positions)} активних позицій для перевірки.")
+            # 2. Для кожної позиції перевірити її стан
+            for position in active_positions:
+                if self.stop_event.is_set():
+                    self.logger.info("[PositionManager] Отримано сигнал зупинки під час обробки позицій.")
+                    return
+                time.sleep(self.config.get('position_manager', {}).get('api_request_delay', 0.2))
+                self._check_and_update_position_status(position, db_conn)
+
+        # 3. Періодично переносимо закриті позиції в архів, щоб гаряча таблиця лишалась малою
+        self._archive_closed_positions_if_due(db_conn)
+        self.logger.debug("[PositionManager] Ітерацію перевірки стану позицій завершено.")
+
+    def _archive_closed_positions_if_due(self, db_conn: sqlite3.Connection):
+        """Переносить закриті позиції в архів, якщо минув archive_interval_seconds."""
+        now = time.time()
+        if now - self._last_archive_time < self.archive_interval_seconds:
+            return
+        self._last_archive_time = now
+        archived = data_manager.archive_closed_positions(db_conn, batch_size=self.archive_batch_size)
+        if archived > 0:
+            self.logger.info(f"[PositionManager] Перенесено в архів {archived} закритих позицій.")
+        elif archived < 0:
+            self.logger.error("[PositionManager] Не вдалося перенести закриті позиції в архів.")
+
     def _fetch_order_status(self, symbol: str, order_id: Optional[str]) -> Optional[Dict[str, Any]]:
         """Допоміжна функція для отримання статусу ордера з обробкою помилок."""
         if not order_id:
@@ -127,6 +127,22 @@ class PositionManager:
             self.logger.error(f"[PositionManager] Помилка при отриманні статусу ордера ID {order_id} для {symbol}: {e}", exc_info=False)
             return None # Повертаємо None у разі будь-якої помилки запиту
 
+    def _handle_position_closed(self, position_id: int, reason: str, position_data: Dict[str, Any],
+                                db_conn: sqlite3.Connection, order_info: Optional[Dict[str, Any]] = None):
+        """Позначає позицію закритою та інкрементально оновлює агрегати ефективності її каналу."""
+        status_info = f"{reason} at {datetime.datetime.now().isoformat()}"
+        if order_info:
+            status_info += f" | Order: {json.dumps(order_info, default=str)}"
+        # Фінальне закриття враховуємо в PnL тільки якщо ордер реально виконано (напр. спрацював SL)
+        exit_price = exit_amount = None
+        if order_info and order_info.get('status') == 'closed' and order_info.get('filled'):
+            exit_price = order_info.get('average') or order_info.get('stopPrice')
+            exit_amount = order_info.get('filled')
+        if data_manager.close_position_with_stats(db_conn, position_data, status_info, exit_price, exit_amount):
+            self.logger.info(f"[PositionManager] Позицію ID={position_id} позначено як закриту ({reason}).")
+        else:
+            self.logger.error(f"[PositionManager] Не вдалося позначити позицію ID={position_id} як закриту ({reason})!")
+
     def _check_and_update_position_status(self, position_data: Dict[str, Any], db_conn: sqlite3.Connection):
         """Перевіряє стан конкретної позиції та її ордерів на біржі."""
         position_id = position_data['id']
@@ -145,7 +161,7 @@ class PositionManager:
         # Отримуємо статус SL
         sl_order_info = self._fetch_order_status(symbol, sl_order_id)
         sl_status = sl_order_info.get('status') if sl_order_info else 'unknown' # unknown, якщо не вдалось отримати
-        self.logger.debug(f"[PM Check ID={position_id}] SL статус: {sl_status} (Info: {sl_order_info})")
+        self.logger.debug("[PM Check ID=%s] SL статус: %s (Info: %s)", position_id, sl_status, sl_order_info)
 
         # Отримуємо статус TP ордерів (тільки якщо є ID)
         tp_orders_info = {}
@@ -165,6 +181,7 @@ class PositionManager:
              average_price = sl_order_info.get('average') # Ціна виконання
              if filled_amount > 0:
                  self.logger.info(f"[PositionManager] Позиція ID={position_id} ({symbol}) ЗАКРИТА по Stop Loss (ID: {sl_order_id}). Виконано: {filled_amount} @ {average_price}.")
+                 data_manager.record_order_events(db_conn, symbol, [('sl_fill', sl_order_info)], position_id=position_id)
                  self._handle_position_closed(position_id, 'stop_loss_hit', position_data, db_conn, sl_order_info)
                  return # Позиція закрита, виходимо
              else:
@@ -184,6 +201,8 @@ class PositionManager:
         closed_tp_ids = [] # Список ID TP, які спрацювали в цьому циклі
         all_tp_closed_or_irrelevant = True # Флаг, що всі TP або закриті, або їх немає
         any_tp_filled_or_closed = False # Флаг, що хоча б один TP спрацював/закрився
+        realized_pnl_delta = 0.0 # Реалізований PnL нових виконань TP в цьому циклі
+        new_tp_hits = 0 # Кількість TP, виконання яких зафіксовано в цьому циклі
 
         if not tp_order_ids:
             all_tp_closed_or_irrelevant = True
@@ -199,9 +218,15 @@ class PositionManager:
                 if tp_status == 'closed':
                     self.logger.info(f"[PositionManager] Take Profit (ID: {tp_id}) для позиції {position_id} ({symbol}) має статус 'closed'. Обсяг ордера: {tp_order_amount}")
                     closed_tp_ids.append(tp_id)
-                    # Зменшуємо залишок на обсяг *цього* TP ордера
-                    if tp_order_amount > 0:
-                         remaining_amount -= tp_order_amount
+                    # Журнал ігнорує повторні події, тому новий запис = TP виконано вперше (не в попередніх циклах)
+                    is_new_fill = data_manager.record_order_events(db_conn, symbol, [('tp_fill', tp_info)], position_id=position_id) > 0
+                    if is_new_fill:
+                        # Зменшуємо залишок на обсяг *цього* TP ордера (лише один раз)
+                        if tp_order_amount > 0:
+                             remaining_amount -= tp_order_amount
+                        tp_exit_price = tp_info.get('average') or tp_info.get('stopPrice') or tp_info.get('triggerPrice')
+                        realized_pnl_delta += data_manager._position_pnl(position_data['position_side'], entry_price, tp_exit_price, tp_order_amount)
+                        new_tp_hits += 1
                     any_tp_filled_or_closed = True # Зафіксували спрацювання/закриття TP
                 elif tp_status == 'open' or tp_status == 'new':
                     # Якщо хоча б один TP ще відкритий, то не всі закриті
@@ -216,10 +241,12 @@ class PositionManager:
         if closed_tp_ids:
             # Оновлюємо тільки якщо розрахунковий remaining_amount відрізняється від поточного в БД
             # Порівняння float потребує обережності
-            if abs(current_amount - remaining_amount) > 1e-9: # Якщо є зміна
-                # Переконуємось, що функція update_position_amount існує
-                update_amount_ok = data_manager.update_position_amount(db_conn, position_id, remaining_amount)
+            if new_tp_hits or abs(current_amount - remaining_amount) > 1e-9: # Якщо є зміна
+                # Залишок, реалізований PnL та лічильник TP оновлюються разом (для агрегатів каналу)
+                update_amount_ok = data_manager.record_tp_fill(db_conn, position_id, remaining_amount, realized_pnl_delta, new_tp_hits)
                 if update_amount_ok:
+                     position_data['realized_pnl'] = (position_data.get('realized_pnl') or 0.0) + realized_pnl_delta
+                     position_data['tp_hits'] = (position_data.get('tp_hits') or 0) + new_tp_hits
                      self.logger.info(f"[PositionManager] Оновлено current_amount для позиції {position_id} на {remaining_amount:.8f}")
                 else:
                      self.logger.error(f"[PositionManager] Не вдалося оновити current_amount для позиції {position_id}!")
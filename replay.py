@@ -0,0 +1,252 @@
+# Replay harness: drives recorded Telegram messages through main.handle_new_message against a simulated exchange
+#
+# Запуск:
+#   python replay.py recorded.jsonl                      # якнайшвидше
+#   python replay.py bot.log --speed 1                   # з оригінальними інтервалами між повідомленнями
+#   python replay.py benchmarks/corpus/signals.jsonl --json report.json
+#
+# Формати входу:
+#   JSONL - {"ts": <unix час>, "title": "<назва каналу>", "chat_id": <id або null>, "text": "..."} на рядок;
+#           замість title можна вказати "channel": "<ключ каналу з config.json>" (як у benchmarks/corpus).
+#   bot.log - текстовий або JSON (log_queue) формат: пари записів "Обробка сигналу від: ..." та "Текст сигналу: ...".
+#
+# Біржа - sim_exchange.SimulatedExchange (без мережі та ключів), позиції зберігаються у тимчасову БД
+# (робоча positions.sqlite не змінюється). Звіт: пропускна здатність, перцентилі затримки обробки
+# (загалом та за етапами трасування) і кінцевий стан (позиції в БД, очікуючі входи, ордери на біржі).
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import data_manager
+import main as bot
+import signal_interpreter
+import sim_exchange
+import tracing
+
+logger = logging.getLogger(__name__)
+
+_LOG_LINE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) - \w+\s+- \S+\s+- (.*)$')
+_LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+_SOURCE_MESSAGE = re.compile(r'--- Обробка сигналу від: (.+) \((\w+)\) ---')
+_TEXT_PREFIX = '"""Текст сигналу:\n'
+_TEXT_SUFFIX = '\n---------------------"""'
+
+# --- завантаження записаних повідомлень ---
+def _parse_log_time(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.datetime.strptime(value, _LOG_TIME_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def _log_records(lines: Iterable[str]) -> Iterator[Tuple[Optional[float], str]]:
+    """(час, повідомлення) записів bot.log. Текстовий запис може займати кілька рядків."""
+    current: Optional[List[Any]] = None
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                if current:
+                    yield current[0], '\n'.join(current[1])
+                current = None
+                yield _parse_log_time(record.get('asctime')), str(record.get('message', ''))
+                continue
+        match = _LOG_LINE.match(line)
+        if match:
+            if current:
+                yield current[0], '\n'.join(current[1])
+            current = [_parse_log_time(match.group(1)), [match.group(2)]]
+        elif current:
+            current[1].append(line)
+    if current:
+        yield current[0], '\n'.join(current[1])
+
+def messages_from_log(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Повідомлення, що надійшли в handle_new_message, з bot.log (назва джерела + текст сигналу)."""
+    messages = []
+    source = None
+    for ts, message in _log_records(lines):
+        match = _SOURCE_MESSAGE.search(message)
+        if match:
+            source = (match.group(1), match.group(2))
+        elif source and message.startswith(_TEXT_PREFIX):
+            text = message[len(_TEXT_PREFIX):]
+            if text.endswith(_TEXT_SUFFIX):
+                text = text[:-len(_TEXT_SUFFIX)]
+            messages.append({'ts': ts, 'title': source[0], 'channel': source[1], 'chat_id': None, 'text': text})
+            source = None
+    return messages
+
+def load_messages(path: str, config: dict) -> List[Dict[str, Any]]:
+    """Записані повідомлення у порядку надходження: {'ts', 'title', 'chat_id', 'text'}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    first = next((line for line in lines if line.strip()), '')
+    try:
+        is_recording = 'text' in json.loads(first)
+    except (ValueError, TypeError):
+        is_recording = False
+    if not is_recording:
+        return messages_from_log(lines)
+
+    channels = config.get('channels', {})
+    messages = []
+    for line in lines:
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        channel = row.get('channel') or '' # У корпусі channel може бути null (шум без каналу)
+        title = row.get('title') or channels.get(channel, {}).get('name') or channel
+        messages.append({'ts': row.get('ts'), 'title': title, 'chat_id': row.get('chat_id'), 'text': row['text']})
+    return messages
+
+# --- симульована біржа ---
+def seed_prices(exchange: sim_exchange.SimulatedExchange, client, messages: List[Dict[str, Any]], config: dict) -> int:
+    """Початкові ціни символів з самих сигналів (ціна входу, інакше середина між SL та TP1),
+       щоб SL/TP сигналів були з правильного боку від ціни виконання. Повертає кількість символів."""
+    for message in messages:
+        route = signal_interpreter.route_signal_source(message['title'], config, message.get('chat_id'))
+        parsed = route.parse(message['text']) if route else None
+        if not parsed or not parsed.pair:
+            continue
+        symbol = client._format_symbol_for_swap(parsed.pair)
+        if symbol in exchange.prices:
+            continue
+        if isinstance(parsed.entry_price, float):
+            exchange.set_price(symbol, parsed.entry_price)
+        elif parsed.stop_loss is not None and parsed.take_profits:
+            exchange.set_price(symbol, (parsed.stop_loss + parsed.take_profits[0]) / 2.0)
+    return len(exchange.prices)
+
+# --- прогін ---
+def replay(messages: List[Dict[str, Any]], config: dict, speed: float = 0.0,
+           exchange: Optional[sim_exchange.SimulatedExchange] = None) -> Dict[str, Any]:
+    """Проганяє повідомлення через handle_new_message. speed=0 - якнайшвидше, 1 - оригінальний темп, 10 - у 10 разів швидше."""
+    exchange = exchange or sim_exchange.SimulatedExchange()
+    client = sim_exchange.create_client(exchange)
+    seeded = seed_prices(exchange, client, messages, config)
+    recorder = tracing.configure({'tracing': {'enabled': True, 'max_traces': max(1, len(messages))}})
+
+    first_ts = next((m['ts'] for m in messages if m.get('ts') is not None), None)
+    errors = 0
+    started = time.perf_counter()
+    for message in messages:
+        if speed > 0 and first_ts is not None and message.get('ts') is not None:
+            delay = (message['ts'] - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        trace = tracing.Trace('replay', title=message['title'])
+        token = tracing.activate(trace)
+        try:
+            bot.handle_new_message(message['title'], message['text'], config, client, source_chat_id=message.get('chat_id'))
+        except Exception as e:
+            errors += 1
+            logger.error(f"[Replay] Помилка обробки повідомлення від '{message['title']}': {e}", exc_info=True)
+        finally:
+            tracing.deactivate(token)
+            tracing.finish_trace(trace)
+    elapsed = time.perf_counter() - started
+
+    summary = recorder.summary()
+    pipeline = bot.get_signal_pipeline(config, client)
+    conn = data_manager.get_db_connection()
+    try:
+        active_positions = data_manager.get_active_positions(conn) if conn else []
+    finally:
+        if conn:
+            conn.close()
+    return {
+        'messages': len(messages),
+        'errors': errors,
+        'seeded_symbols': seeded,
+        'elapsed_seconds': round(elapsed, 3),
+        'msgs_per_sec': round(len(messages) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': summary.get('total', {}),
+        'stages_ms': {name: stats for name, stats in summary.items() if name != 'total'},
+        'final_state': {
+            'active_positions': [
+                {'id': p['id'], 'channel': p['signal_channel_key'], 'symbol': p['symbol'], 'side': p['position_side'],
+                 'entry_price': p['entry_price'], 'amount': p['current_amount'], 'tp_orders': len(p.get('tp_order_ids') or [])}
+                for p in active_positions
+            ],
+            'pending_entries': len(pipeline.pending_entries),
+            'exchange': exchange.summary(),
+        },
+    }
+
+def print_report(report: Dict[str, Any]):
+    latency = report['latency_ms']
+    print(f"Повідомлень: {report['messages']} (помилок: {report['errors']}), символів з ціною: {report['seeded_symbols']}")
+    print(f"Час: {report['elapsed_seconds']:.3f} с, {report['msgs_per_sec']:.1f} повідомлень/с")
+    if latency:
+        print(f"Затримка handle_new_message: p50 {latency['p50']:.2f} мс, p90 {latency['p90']:.2f} мс, "
+              f"p99 {latency['p99']:.2f} мс, max {latency['max']:.2f} мс")
+    if report['stages_ms']:
+        for line in tracing.format_summary(report['stages_ms']):
+            print(f"  {line}")
+    state = report['final_state']
+    print(f"Активних позицій у БД: {len(state['active_positions'])}, очікуючих входів: {state['pending_entries']}")
+    for p in state['active_positions']:
+        print(f"  ID {p['id']} {p['channel']} {p['symbol']} {p['side']} {p['amount']} @ {p['entry_price']} (TP: {p['tp_orders']})")
+    print(f"Ордери на біржі: {state['exchange']['orders']}")
+    print(f"Позиції на біржі: {state['exchange']['positions']}")
+    if state['exchange']['errors']:
+        print(f"Помилки API біржі (імітовані): {state['exchange']['errors']}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram messages through the signal pipeline against a simulated exchange.")
+    parser.add_argument('recording', help="JSONL із записаними повідомленнями або bot.log")
+    parser.add_argument('--config', default='config.json', help="Файл конфігурації (default: config.json)")
+    parser.add_argument('--speed', type=float, default=0.0, help="0 - якнайшвидше (default), 1 - оригінальний темп, N - у N разів швидше")
+    parser.add_argument('--max-open', type=int, help="Замінити position_limits.total_max_open (напр. для прогону всього запису)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Затримка відповіді симульованої біржі на виклик, мс (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Частка викликів API біржі, що завершуються помилкою (default: 0)")
+    parser.add_argument('--seed', type=int, help="Зерно генератора помилок/затримок біржі")
+    parser.add_argument('--db', help="Файл БД для прогону (default: тимчасовий файл)")
+    parser.add_argument('--json', dest='json_out', help="Зберегти звіт у JSON файл")
+    parser.add_argument('--log-level', default='WARNING', help="Рівень логування бота під час прогону (default: WARNING)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)-8s - %(name)-25s - %(message)s')
+    config = bot.load_config(args.config)
+    if not config:
+        return 1
+    if args.max_open is not None:
+        config.setdefault('position_limits', {})['total_max_open'] = args.max_open
+
+    data_manager.DATABASE_FILE = args.db or os.path.join(tempfile.mkdtemp(prefix='replay-'), 'replay.sqlite')
+    conn = data_manager.get_db_connection()
+    if not conn or not data_manager.initialize_database(conn):
+        print(f"Не вдалося ініціалізувати БД {data_manager.DATABASE_FILE}")
+        return 1
+    conn.close()
+
+    messages = load_messages(args.recording, config)
+    if not messages:
+        print(f"У {args.recording} не знайдено повідомлень.")
+        return 1
+    exchange = sim_exchange.SimulatedExchange(latency_seconds=args.latency_ms / 1000.0, error_rate=args.error_rate, seed=args.seed)
+    report = replay(messages, config, speed=args.speed, exchange=exchange)
+    report['database'] = data_manager.DATABASE_FILE
+    print_report(report)
+    print(f"БД прогону: {data_manager.DATABASE_FILE}")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        print(f"Звіт збережено у {args.json_out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
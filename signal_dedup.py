@@ -0,0 +1,91 @@
+# Module for duplicate signal suppression (content-hash LRU with TTL)
+
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+def normalize_signal_text(text: str) -> str:
+    """Нормалізує текст для порівняння: NFKC, без регістру, пробіли згорнуті до одного."""
+    return " ".join(unicodedata.normalize('NFKC', text or "").casefold().split())
+
+def signal_content_hash(channel_key: str, text: str) -> str:
+    """Хеш нормалізованого тексту повідомлення разом з ключем каналу."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((channel_key or "").encode('utf-8'))
+    digest.update(b"\x00")
+    digest.update(normalize_signal_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+class SignalDeduplicator:
+    """Обмежений LRU хешів вже оброблених повідомлень з часом життя (TTL).
+
+    Перевірка виконується в пам'яті (dict + OrderedDict), без звернень до БД чи біржі.
+    Збереження між перезапусками - через data_manager.seen_signals (load() / remember_seen_signal).
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, float]" = OrderedDict() # hash -> час першої появи (від старих до нових)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        # Записи впорядковані за часом появи, тому прострочені завжди на початку
+        expire_before = now - self.ttl_seconds
+        while self._entries:
+            _, seen_at = next(iter(self._entries.items()))
+            if seen_at >= expire_before and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def check_and_remember(self, channel_key: str, text: str, now: Optional[float] = None) -> Tuple[bool, str]:
+        """Перевіряє повідомлення і запам'ятовує його, якщо воно нове.
+
+        Returns:
+            (is_duplicate, content_hash)
+        """
+        now = time.time() if now is None else now
+        content_hash = signal_content_hash(channel_key, text)
+        with self._lock:
+            seen_at = self._entries.get(content_hash)
+            if seen_at is not None and now - seen_at < self.ttl_seconds:
+                return True, content_hash
+            self._entries.pop(content_hash, None)
+            self._entries[content_hash] = now
+            self._evict(now)
+        return False, content_hash
+
+    def forget(self, content_hash: str):
+        """Забуває хеш повідомлення, яке не було виконано (напр. немає слотів) - його можна надіслати повторно."""
+        with self._lock:
+            self._entries.pop(content_hash, None)
+
+    def load(self, entries: Iterable[Tuple[str, float]], now: Optional[float] = None) -> int:
+        """Відновлює стан з пар (hash, seen_at), впорядкованих за зростанням часу. Повертає кількість записів."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for content_hash, seen_at in entries:
+                self._entries.pop(content_hash, None)
+                self._entries[content_hash] = seen_at
+            self._evict(now)
+            return len(self._entries)
+
+def from_config(config: dict) -> SignalDeduplicator:
+    """Створює SignalDeduplicator з секції config['signal_dedup'] (ttl_seconds, max_entries)."""
+    dedup_config = config.get('signal_dedup', {})
+    return SignalDeduplicator(
+        ttl_seconds=dedup_config.get('ttl_seconds', DEFAULT_TTL_SECONDS),
+        max_entries=dedup_config.get('max_entries', DEFAULT_MAX_ENTRIES),
+    )
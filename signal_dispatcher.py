@@ -0,0 +1,159 @@
+# Module for dispatching incoming signals to per-symbol execution lanes
+
+import asyncio
+import inspect
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE_SIZE = 1000
+
+class SignalDispatcher:
+    """Планувальник обробки вхідних повідомлень у циклі подій Telegram.
+
+    post_handler лише ставить повідомлення в чергу (submit) і одразу повертається, тому прийом
+    оновлень Telegram не чекає на БД чи біржу. Повідомлення розкладаються по "доріжках" (lanes) за
+    ключем lane_key(*args) - напр. символом ринку: всередині доріжки обробка строго FIFO (деталі
+    сигналу виконуються тільки після входу), різні доріжки обробляються паралельно, але не більше
+    ніж workers одночасно. Повідомлення без ключа (None) отримують власну доріжку.
+
+    handler: корутина виконується в циклі подій, звичайна функція - в пулі потоків (asyncio.to_thread).
+    Якщо повідомлення передано з трасою (submit(..., trace=...)), вона стає поточною на час обробки,
+    а час від прийому до початку обробки записується як спан queue_wait.
+    """
+
+    def __init__(self, handler: Callable, workers: int = DEFAULT_WORKERS, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 lane_key: Optional[Callable[..., Optional[Hashable]]] = None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue_size = max_queue_size
+        self.lane_key = lane_key
+        self._lanes: Dict[Hashable, deque] = {} # ключ доріжки -> черга (args, trace, час постановки) (FIFO)
+        self._lane_tasks: Dict[Hashable, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        self._anonymous_lanes = itertools.count()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def qsize(self) -> int:
+        """Кількість прийнятих, але ще не оброблених повідомлень."""
+        return self._pending
+
+    async def start(self):
+        """Готує планувальник (викликати з циклу подій, напр. в post_init Application)."""
+        if self._running:
+            return
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self._running = True
+        metrics.QUEUE_DEPTH.set_function(self.qsize)
+        metrics.ACTIVE_LANES.set_function(lambda: len(self._lanes))
+        logger.info(f"[Dispatcher] Запущено обробку сигналів: до {self.workers} доріжок паралельно, черга до {self.max_queue_size}.")
+
+    def _resolve_lane(self, args: tuple) -> Hashable:
+        key = None
+        if self.lane_key is not None:
+            try:
+                key = self.lane_key(*args)
+            except Exception as e:
+                logger.error(f"[Dispatcher] Помилка визначення доріжки для повідомлення: {e}", exc_info=True)
+        return key if key is not None else ('__anonymous__', next(self._anonymous_lanes))
+
+    def submit(self, *args, trace: Optional[tracing.Trace] = None) -> bool:
+        """Ставить повідомлення в доріжку без очікування. Повертає False, якщо черга переповнена або не запущена."""
+        if not self._running:
+            logger.error("[Dispatcher] Спроба поставити повідомлення в чергу до запуску обробки.")
+            metrics.SIGNALS.inc(result='dropped')
+            return False
+        if self._pending >= self.max_queue_size:
+            logger.error(f"[Dispatcher] Черга сигналів переповнена ({self.max_queue_size}). Повідомлення відкинуто.")
+            metrics.SIGNALS.inc(result='dropped')
+            return False
+        enqueued_ns = time.perf_counter_ns()
+        lane = self._resolve_lane(args)
+        self._lanes.setdefault(lane, deque()).append((args, trace, enqueued_ns))
+        self._pending += 1
+        if lane not in self._lane_tasks:
+            self._lane_tasks[lane] = asyncio.create_task(self._drain_lane(lane), name=f"SignalLane-{lane}")
+        logger.debug(f"[Dispatcher] Повідомлення поставлено в доріжку {lane} (у черзі: {self._pending}).")
+        return True
+
+    async def _run_handler(self, args: tuple):
+        if inspect.iscoroutinefunction(self.handler):
+            await self.handler(*args)
+        else:
+            result = await asyncio.to_thread(self.handler, *args)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _drain_lane(self, lane: Hashable):
+        queue = self._lanes[lane]
+        try:
+            while queue:
+                args, trace, enqueued_ns = queue[0]
+                async with self._semaphore:
+                    started_ns = time.perf_counter_ns()
+                    tracing.record_span('queue_wait', enqueued_ns, started_ns, trace=trace)
+                    metrics.SIGNAL_QUEUE_WAIT_SECONDS.observe((started_ns - enqueued_ns) / 1e9)
+                    token = tracing.activate(trace)
+                    result = 'ok'
+                    try:
+                        await self._run_handler(args)
+                    except asyncio.CancelledError:
+                        result = 'cancelled'
+                        raise
+                    except Exception as e:
+                        result = 'error'
+                        logger.error(f"[Dispatcher] Помилка в доріжці {lane} під час обробки повідомлення: {e}", exc_info=True)
+                    finally:
+                        metrics.SIGNAL_PROCESSING_SECONDS.observe((time.perf_counter_ns() - started_ns) / 1e9)
+                        metrics.SIGNALS.inc(result=result)
+                        tracing.deactivate(token)
+                        tracing.finish_trace(trace)
+                        queue.popleft()
+                        self._pending -= 1
+        finally:
+            # Порожня доріжка прибирається; нове повідомлення з тим же ключем створить її знову
+            self._lane_tasks.pop(lane, None)
+            if not queue:
+                self._lanes.pop(lane, None)
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Чекає (до drain_timeout) обробки вже прийнятих повідомлень і зупиняє обробку."""
+        if not self._running:
+            return
+        self._running = False
+        tasks = list(self._lane_tasks.values())
+        if tasks:
+            logger.info(f"[Dispatcher] Очікування обробки прийнятих повідомлень (у черзі: {self._pending})...")
+            _, not_done = await asyncio.wait(tasks, timeout=drain_timeout)
+            if not_done:
+                logger.warning(f"[Dispatcher] Не всі повідомлення оброблено за {drain_timeout} с. Решта ({self._pending}) відкидається.")
+                for task in not_done:
+                    task.cancel()
+                await asyncio.gather(*not_done, return_exceptions=True)
+        self._lanes.clear()
+        self._lane_tasks.clear()
+        self._pending = 0
+        logger.info("[Dispatcher] Обробку сигналів зупинено.")
+
+def from_config(handler: Callable, config: dict, lane_key: Optional[Callable[..., Any]] = None) -> SignalDispatcher:
+    """Створює SignalDispatcher з секції config['dispatcher'] (workers, max_queue_size)."""
+    dispatcher_config = config.get('dispatcher', {})
+    return SignalDispatcher(
+        handler,
+        workers=dispatcher_config.get('workers', DEFAULT_WORKERS),
+        max_queue_size=dispatcher_config.get('max_queue_size', DEFAULT_MAX_QUEUE_SIZE),
+        lane_key=lane_key,
+    )
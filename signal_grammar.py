@@ -0,0 +1,301 @@
+# Module for declarative (config-driven) signal grammars
+
+import logging
+import re
+from typing import Dict, List, Optional, Any
+
+from signal_interpreter import safe_float, normalize_pair, ParsedSignal, PARSED_SIGNAL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Граматика каналу описується в config.json (channels.<key>.grammar) і компілюється при завантаженні
+# конфігу в об'єкти ChannelGrammar. Приклад:
+#
+#   "grammar": {
+#     "number_format": {"thousands": " "},
+#     "stages": [
+#       {"type": "entry", "match": ["Заполняю {pair} {direction}"]},
+#       {"type": "details",
+#        "match": ["Монета: {pair} {direction}", "Тэйки: {take_profits:numbers}", "Стоп: {stop_loss}"],
+#        "required": ["pair", "direction", "stop_loss"]}
+#     ]
+#   }
+#
+# Шаблон - це якорний текст з полями {name} або {name:kind}. Пробіли в шаблоні відповідають
+# будь-якій кількості пробільних символів. Шаблон з префіксом "re:" - це сирий регулярний вираз
+# з іменованими групами (?P<name>...). Етапи ("stages") перевіряються по черзі; перший етап, для
+# якого знайдено всі обов'язкові поля, визначає тип сигналу (entry / details / full).
+
+# Регулярні вирази для типів полів
+_KIND_PATTERNS = {
+    'pair': r"#?(\w+(?:/\w+)?)",
+    'direction': r"(long|short|лонг|шорт)",
+    'number': r"([\d.,]+)",
+    'int': r"(\d+)",
+    'numbers': r"([\d.,\s]+)", # Для явного роздільника (separator) замінюється на "(.+)"
+    'text': r"(.+)",
+}
+
+# Тип поля за замовчуванням (якщо в шаблоні не вказано {name:kind})
+_DEFAULT_KINDS = {
+    'pair': 'pair',
+    'direction': 'direction',
+    'leverage': 'int',
+    'take_profits': 'numbers',
+}
+
+_DIRECTION_MAP = {'long': 'LONG', 'лонг': 'LONG', 'short': 'SHORT', 'шорт': 'SHORT'}
+
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)(?::(\w+))?\}")
+_NON_NUMERIC_RE = re.compile(r"[^\d.,]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+class GrammarError(ValueError):
+    """Помилка в описі граматики каналу (config.json)."""
+
+class _Template:
+    """Один скомпільований шаблон: регулярний вираз + список полів (ім'я, тип) за групами."""
+    __slots__ = ('source', 'regex', 'fields', 'anchor', 'named')
+
+    def __init__(self, source: str, regex: re.Pattern, fields: List[tuple], anchor: Optional[str], named: bool = False):
+        self.source = source
+        self.regex = regex
+        self.fields = fields
+        self.anchor = anchor
+        self.named = named # True для "re:" шаблонів (поля беруться з іменованих груп)
+
+    def values(self, m: re.Match):
+        for index, (name, kind) in enumerate(self.fields, start=1):
+            yield name, kind, (m.group(name) if self.named else m.group(index))
+
+def _literal_to_regex(literal: str) -> str:
+    """Екранує якорний текст; пробіли замінює на \\s* (біля знаків/емодзі) або \\s+ (між словами)."""
+    parts = []
+    for i, chunk in enumerate(_WHITESPACE_RE.split(literal)):
+        if i > 0:
+            prev_char = parts[-1][-1:] if parts and parts[-1] else ''
+            next_char = chunk[:1]
+            word_boundary = prev_char.isalnum() and next_char.isalnum()
+            parts.append(r"\s+" if word_boundary else r"\s*")
+        parts.append(re.escape(chunk))
+    return "".join(parts)
+
+def _compile_template(source: str, field_options: Dict[str, dict], flags: int) -> _Template:
+    if source.startswith("re:"):
+        try:
+            regex = re.compile(source[3:], flags)
+        except re.error as e:
+            raise GrammarError(f"Некоректний регулярний вираз '{source}': {e}") from e
+        fields = [(name, field_options.get(name, {}).get('kind', _DEFAULT_KINDS.get(name, 'number')))
+                  for name in regex.groupindex]
+        if not fields:
+            raise GrammarError(f"Шаблон '{source}' не містить іменованих груп (?P<name>...).")
+        return _Template(source, regex, fields, None, named=True)
+
+    pattern_parts = []
+    fields = []
+    literals = []
+    position = 0
+    for placeholder in _PLACEHOLDER_RE.finditer(source):
+        literal = source[position:placeholder.start()]
+        literals.append(literal)
+        pattern_parts.append(_literal_to_regex(literal))
+        name = placeholder.group(1)
+        kind = placeholder.group(2) or field_options.get(name, {}).get('kind') or _DEFAULT_KINDS.get(name, 'number')
+        if kind not in _KIND_PATTERNS:
+            raise GrammarError(f"Невідомий тип поля '{kind}' у шаблоні '{source}'.")
+        if kind == 'numbers' and field_options.get(name, {}).get('separator'):
+            pattern_parts.append(_KIND_PATTERNS['text'])
+        else:
+            pattern_parts.append(_KIND_PATTERNS[kind])
+        fields.append((name, kind))
+        position = placeholder.end()
+    literals.append(source[position:])
+    pattern_parts.append(_literal_to_regex(source[position:]))
+
+    if not fields:
+        raise GrammarError(f"Шаблон '{source}' не містить жодного поля {{name}}.")
+    # Якір для швидкої перевірки - найдовший фрагмент якорного тексту без пробілів
+    chunks = [chunk.lower() for literal in literals for chunk in literal.split()]
+    anchor = max(chunks, key=len) if chunks else None
+    try:
+        regex = re.compile("".join(pattern_parts), flags)
+    except re.error as e:
+        raise GrammarError(f"Не вдалося скомпілювати шаблон '{source}': {e}") from e
+    return _Template(source, regex, fields, anchor)
+
+class StageMatcher:
+    """Скомпільований етап граматики (один тип повідомлення каналу)."""
+
+    def __init__(self, stage_type: str, templates: List[_Template], required: List[str],
+                 defaults: Dict[str, Any], field_options: Dict[str, dict], number_format: Dict[str, str],
+                 extra_anchors: Optional[List[str]] = None):
+        self.stage_type = stage_type
+        self.templates = templates
+        self.required = required
+        self.defaults = defaults
+        self.field_options = field_options
+        self.thousands = number_format.get('thousands') or ''
+        # Якорі шаблонів з обов'язковими полями - без них етап гарантовано не спрацює
+        required_set = set(required)
+        # ("anchors" в описі етапу доповнюють їх, напр. для "re:" шаблонів, з яких якір не виводиться)
+        anchors = {t.anchor for t in templates if t.anchor and any(name in required_set for name, _ in t.fields)}
+        anchors.update(anchor.lower() for anchor in (extra_anchors or []))
+        self.anchors = tuple(sorted(anchors))
+
+    def anchors_present(self, lowered_text: str) -> bool:
+        return all(anchor in lowered_text for anchor in self.anchors)
+
+    def _to_number(self, value_str: str) -> Optional[float]:
+        if value_str is None:
+            return None
+        if self.thousands:
+            value_str = value_str.replace(self.thousands, '')
+        return safe_float(_NON_NUMERIC_RE.sub('', value_str))
+
+    def _convert(self, name: str, kind: str, raw: str):
+        if raw is None:
+            return None
+        if kind == 'pair':
+            return normalize_pair(raw.lstrip('#'))
+        if kind == 'direction':
+            return _DIRECTION_MAP.get(raw.strip().lower())
+        if kind == 'int':
+            try:
+                return int(raw)
+            except ValueError:
+                return None
+        if kind == 'numbers':
+            separator = self.field_options.get(name, {}).get('separator')
+            items = raw.split(separator) if separator else raw.split()
+            return [p for p in (self._to_number(item) for item in items) if p is not None]
+        if kind == 'text':
+            return raw.strip()
+        return self._to_number(raw)
+
+    def pair(self, text: str) -> Optional[str]:
+        """Лише поле pair (перший шаблон, що його містить і знайдений у тексті) - без розбору решти полів."""
+        for template in self.templates:
+            if not any(name == 'pair' for name, _ in template.fields):
+                continue
+            m = template.regex.search(text)
+            if not m:
+                continue
+            for name, kind, raw in template.values(m):
+                if name == 'pair':
+                    value = self._convert(name, kind, raw)
+                    if value:
+                        return value
+        return None
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        values: Dict[str, Any] = {}
+        for template in self.templates:
+            repeated = [name for name, _ in template.fields if self.field_options.get(name, {}).get('repeat')]
+            if repeated:
+                # Поле, що повторюється (напр. кілька рядків "✅TP: ..."), збирається в список
+                for m in template.regex.finditer(text):
+                    for name, kind, raw in template.values(m):
+                        value = self._convert(name, kind, raw)
+                        if value is None:
+                            continue
+                        if name in repeated:
+                            values.setdefault(name, []).extend(value if isinstance(value, list) else [value])
+                        else:
+                            values.setdefault(name, value)
+                continue
+            m = template.regex.search(text)
+            if not m:
+                continue
+            for name, kind, raw in template.values(m):
+                value = self._convert(name, kind, raw)
+                if value is not None and name not in values:
+                    values[name] = value
+
+        missing = [name for name in self.required if values.get(name) in (None, [])]
+        if missing:
+            logger.debug(f"  [Grammar {self.stage_type}] Не знайдено обов'язкові поля: {missing}")
+            return None
+        return values
+
+class ChannelGrammar:
+    """Граматика одного каналу: впорядкований список етапів."""
+
+    def __init__(self, channel_key: str, source_name: str, stages: List[StageMatcher]):
+        self.channel_key = channel_key
+        self.source_name = source_name
+        self.stages = stages
+
+    def could_match(self, lowered_text: str) -> bool:
+        """Чи може хоч один етап розпізнати текст (перевірка якорів, без регулярних виразів)."""
+        return any(stage.anchors_present(lowered_text) for stage in self.stages)
+
+    def pair_hint(self, text: str) -> Optional[str]:
+        """Пара з першого етапу, якорі якого є в тексті (для ключа доріжки виконання, без повного парсингу)."""
+        if not text:
+            return None
+        lowered = text.lower()
+        for stage in self.stages:
+            if stage.anchors_present(lowered):
+                pair = stage.pair(text)
+                if pair:
+                    return pair
+        return None
+
+    def parse(self, text: str) -> Optional[ParsedSignal]:
+        if not text:
+            return None
+        lowered = text.lower()
+        for stage in self.stages:
+            if not stage.anchors_present(lowered):
+                continue
+            values = stage.match(text)
+            if values is None:
+                continue
+            parsed_signal = ParsedSignal(type=stage.stage_type, source=self.channel_key, source_name=self.source_name,
+                                         raw_text=text, **{**stage.defaults, **values})
+            logger.info(f"  [Grammar {self.channel_key}] Розпізнано сигнал ({stage.stage_type}): {parsed_signal}")
+            return parsed_signal
+        return None
+
+def compile_grammar(channel_key: str, channel_config: dict) -> ChannelGrammar:
+    """Компілює секцію 'grammar' конфігурації каналу. Кидає GrammarError, якщо опис некоректний."""
+    grammar = channel_config.get('grammar')
+    if not isinstance(grammar, dict) or not grammar.get('stages'):
+        raise GrammarError(f"Граматика каналу {channel_key} не містить жодного етапу ('stages').")
+
+    flags = re.IGNORECASE if grammar.get('ignore_case', True) else 0
+    number_format = grammar.get('number_format', {})
+    stages = []
+    for stage_config in grammar['stages']:
+        stage_type = stage_config.get('type', 'full')
+        if stage_type not in ('entry', 'details', 'full'):
+            raise GrammarError(f"Невідомий тип етапу '{stage_type}' у граматиці каналу {channel_key}.")
+        field_options = stage_config.get('fields', {})
+        templates = [_compile_template(source, field_options, flags) for source in stage_config.get('match', [])]
+        if not templates:
+            raise GrammarError(f"Етап '{stage_type}' граматики каналу {channel_key} не містить шаблонів ('match').")
+        declared = {name for t in templates for name, _ in t.fields}
+        unsupported = sorted((declared | set(stage_config.get('defaults', {}))) - (PARSED_SIGNAL_FIELDS - {'type', 'source', 'source_name', 'raw_text'}))
+        if unsupported:
+            raise GrammarError(f"Поля {unsupported} етапу '{stage_type}' каналу {channel_key} не підтримуються (див. ParsedSignal).")
+        required = stage_config.get('required', sorted(declared))
+        unknown = [name for name in required if name not in declared]
+        if unknown:
+            raise GrammarError(f"Обов'язкові поля {unknown} етапу '{stage_type}' каналу {channel_key} не описані в жодному шаблоні.")
+        stages.append(StageMatcher(stage_type, templates, required, stage_config.get('defaults', {}),
+                                   field_options, number_format, stage_config.get('anchors')))
+    return ChannelGrammar(channel_key, channel_config.get('name', channel_key), stages)
+
+def compile_grammars(config: dict) -> Dict[str, ChannelGrammar]:
+    """Компілює граматики всіх каналів, що їх мають. Некоректні граматики пропускаються з помилкою в лозі."""
+    compiled = {}
+    for channel_key, channel_config in config.get('channels', {}).items():
+        if 'grammar' not in channel_config:
+            continue
+        try:
+            compiled[channel_key] = compile_grammar(channel_key, channel_config)
+            logger.info(f"Граматику сигналів для {channel_key} скомпільовано ({len(compiled[channel_key].stages)} етап(и)).")
+        except GrammarError as e:
+            logger.error(f"Граматика каналу {channel_key} некоректна, використовується вбудований парсер: {e}")
+    return compiled
@@ -2,6 +2,12 @@
 
 import logging
 import re
+import threading
+import unicodedata
+from collections import namedtuple
+from dataclasses import dataclass, field as dataclass_field, fields as dataclass_fields, replace as dataclass_replace
+from functools import partial
+from typing import Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +19,118 @@ logger = logging.getLogger(__name__)
 #     "KostyaKogan": "channel_4",
 # }
 
+# --- Розпізнаний сигнал ---
+
+@dataclass(frozen=True, slots=True)
+class ParsedSignal:
+    """Результат парсингу повідомлення (спільний для всіх парсерів та main.py).
+
+    raw_text зберігається як посилання на вихідний рядок і не бере участі в repr/порівнянні/хешуванні,
+    тож логування сигналу (f"{signal}") не копіює текст повідомлення.
+    """
+    type: str # entry / details / full
+    source: Optional[str] = None
+    source_name: Optional[str] = None
+    pair: Optional[str] = None
+    direction: Optional[str] = None
+    entry_price: Union[float, str, None] = None # Число або "MARKET"
+    take_profits: Tuple[float, ...] = ()
+    stop_loss: Optional[float] = None
+    limit_order_price: Optional[float] = None
+    leverage: Optional[int] = None
+    raw_text: Optional[str] = dataclass_field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not isinstance(self.take_profits, tuple):
+            object.__setattr__(self, 'take_profits', tuple(self.take_profits or ()))
+
+    def missing_fields(self, required) -> Tuple[str, ...]:
+        """Повертає обов'язкові поля, які не заповнені (None або порожній список тейків)."""
+        return tuple(name for name in required if getattr(self, name) in (None, ()))
+
+    def with_changes(self, **changes) -> 'ParsedSignal':
+        """Копія сигналу зі зміненими полями (напр. напрямок з попереднього повідомлення)."""
+        return dataclass_replace(self, **changes)
+
+    def to_dict(self, include_raw_text: bool = False) -> dict:
+        data = {f.name: getattr(self, f.name) for f in dataclass_fields(self) if include_raw_text or f.name != 'raw_text'}
+        data['take_profits'] = list(self.take_profits)
+        return data
+
+PARSED_SIGNAL_FIELDS = frozenset(f.name for f in dataclass_fields(ParsedSignal))
+
+# --- Реєстр регулярних виразів ---
+# Усі патерни компілюються один раз при імпорті модуля (не покладаємось на внутрішній кеш модуля re).
+_PATTERNS = {
+    # Канал 1
+    'c1_entry': re.compile(r"Заполняю\s+(\w+)\s+(long|short)", re.IGNORECASE),
+    'c1_pair': re.compile(r"Монета:\s+(\w+)\s+(LONG|SHORT)", re.IGNORECASE),
+    'c1_entry_price': re.compile(r"Цена входа:\s*([\d.,]+)"),
+    'c1_take_profits': re.compile(r"Тэйки:\s*([\d.,\s]+)"),
+    'c1_stop_loss': re.compile(r"Стоп:\s*([\d.,]+)"),
+    # Канал 2
+    'c2_pair': re.compile(r"Заходим\s+([\w\/]+)\s+(long|short)", re.IGNORECASE),
+    'c2_entry_price': re.compile(r"Точка входа:\s*([\d.,]+)", re.IGNORECASE),
+    'c2_take_profits': re.compile(r"Тейки:\s*(.+)", re.IGNORECASE),
+    'c2_stop_loss': re.compile(r"Стоп:\s*([\d.,]+)", re.IGNORECASE),
+    # Канал 3
+    'c3_entry_range': re.compile(r"Начинаю\s+открывать\s+(лонг|шорт)\s+в\s+диапазоне\s+цены\s+([\d.,]+)\s*-\s*([\d.,]+)", re.IGNORECASE),
+    'c3_ticker': re.compile(r"\b([A-Z]{3,})\b"),
+    'c3_pair_slash': re.compile(r"\b(\w+/usdt)\b", re.IGNORECASE),
+    'c3_stop_loss': re.compile(r"Сл\s+ставлю\s+на\s+([\d.,]+)", re.IGNORECASE),
+    'c3_take_profits': re.compile(r"Мои цели на сделку\s+(.+)", re.IGNORECASE),
+    'c3_non_numeric': re.compile(r"[^\d.,]"),
+    # Канал 4
+    'c4_pair': re.compile(r"Открыл\s+([A-Z0-9/]+)\s+(long|short)", re.IGNORECASE),
+    'c4_leverage': re.compile(r"плечо:\s*(\d+)x?", re.IGNORECASE),
+    'c4_stop_loss': re.compile(r"стоп:\s*([\d.,]+)", re.IGNORECASE),
+    'c4_take_profits': re.compile(r"тейк:\s*(.+)", re.IGNORECASE),
+    # Канал 5
+    'c5_entry': re.compile(r"Захожу\s+(?:в\s+)?(LONG|SHORT)\s+по\s+монете\s+#?([A-Z0-9/]+USDT)", re.IGNORECASE),
+    'c5_pair': re.compile(r"COIN\s*🪙?\s*([A-Z0-9/]+USDT)", re.IGNORECASE),
+    'c5_take_profit': re.compile(r"✅\s*TP:\s*([\d.,]+)"),
+    'c5_stop_loss': re.compile(r"🚫\s*Stop\s+([\d.,]+)", re.IGNORECASE),
+}
+
+# Дешеві попередні перевірки: підрядки (в нижньому регістрі), без яких парсер гарантовано не спрацює.
+# Вони є обов'язковими частинами відповідних патернів, тому перевірка `in` не відкидає валідні сигнали,
+# але дозволяє не запускати важкі регулярні вирази для сторонніх повідомлень.
+_PARSER_ANCHORS = {
+    'parse_channel_1_entry': ('заполняю',),
+    'parse_channel_1_details': ('монета:', 'стоп:'),
+    'parse_channel_2': ('заходим', 'точка входа:'),
+    'parse_channel_3': ('начинаю', 'открывать', 'ставлю'),
+    'parse_channel_4': ('открыл', 'стоп:'),
+    'parse_channel_5_entry': ('захожу', 'монете'),
+    'parse_channel_5_details': ('coin', 'stop'),
+}
+
+# Скомпільовані граматики каналів з config.json (channels.<key>.grammar), див. signal_grammar.py
+_COMPILED_GRAMMARS = {}
+
+def load_grammars(config: dict) -> int:
+    """Компілює граматики каналів з конфігу (викликається один раз при завантаженні конфігурації)."""
+    import signal_grammar # Локальний імпорт: signal_grammar використовує хелпери цього модуля
+    _COMPILED_GRAMMARS.clear()
+    _COMPILED_GRAMMARS.update(signal_grammar.compile_grammars(config))
+    return len(_COMPILED_GRAMMARS)
+
+def prescan_message(text: str) -> frozenset:
+    """Один прохід по тексту: повертає назви парсерів (і граматик "grammar:<key>"), які МОЖУТЬ розпізнати повідомлення."""
+    if not text:
+        return frozenset()
+    lowered = text.lower()
+    candidates = {name for name, anchors in _PARSER_ANCHORS.items() if all(anchor in lowered for anchor in anchors)}
+    candidates.update(f"grammar:{key}" for key, grammar in _COMPILED_GRAMMARS.items() if grammar.could_match(lowered))
+    return frozenset(candidates)
+
+def _anchors_present(parser_name: str, text: str) -> bool:
+    """Швидка перевірка якорів для одного парсера (перед запуском регулярних виразів)."""
+    if not text:
+        return False
+    lowered = text.lower()
+    return all(anchor in lowered for anchor in _PARSER_ANCHORS[parser_name])
+
 # --- Helper function to safely convert string to float ---
 def safe_float(value_str):
     if value_str is None:
@@ -34,14 +152,82 @@ def normalize_pair(pair_str):
     return pair
 
 # --- Function to identify the channel ---
-def identify_signal_source(forwarded_channel_title: str, config: dict):
-    """Визначає ключ каналу за його назвою з Telegram API."""
-    logger.debug(f"Визначаю джерело за назвою: '{forwarded_channel_title}'")
+
+# Маршрут каналу: ключ, назва з конфігу, прив'язаний парсер parse(text) -> ParsedSignal | None
+# та pair_hint(text) -> пара | None (лише патерни пари, для ключа доріжки виконання)
+ChannelRoute = namedtuple('ChannelRoute', ['channel_key', 'name', 'parse', 'pair_hint'])
+
+# Індекс маршрутизації: конфіг, маршрути за нормалізованою назвою та за chat_id. Будується при завантаженні
+# конфігу (build_routing_index) і замінюється цілком одним присвоєнням, тому потоки пулу та доріжки диспетчера
+# читають його без блокування. Конфіг зберігається в індексі (сильне посилання) і порівнюється через "is":
+# на відміну від id(), ідентичність живого об'єкта не може дістатися іншому конфігу після збирання сміття.
+_RoutingIndex = namedtuple('_RoutingIndex', ['config', 'by_title', 'by_chat_id'])
+_ROUTING_INDEX: Optional[_RoutingIndex] = None
+_ROUTING_LOCK = threading.Lock()
+
+def normalize_channel_title(title: str) -> str:
+    """Нормалізує назву каналу: NFKC, без регістру, без емодзі/символів, керуючих знаків та пробілів."""
+    if not title:
+        return ""
+    normalized = unicodedata.normalize('NFKC', title).casefold()
+    # Категорії S* (символи, у т.ч. емодзі), C* (керуючі/форматні, напр. ZWJ), M* (варіаційні селектори), Z* (пробіли)
+    return "".join(ch for ch in normalized if unicodedata.category(ch)[0] not in 'SCMZ' and not ch.isspace())
+
+def _build_routing_index(config: dict) -> _RoutingIndex:
+    routes_by_title = {}
+    routes_by_chat_id = {}
     for key, channel_data in config.get('channels', {}).items():
         name_from_config = channel_data.get('name')
-        if name_from_config and forwarded_channel_title == name_from_config:
-            logger.debug(f"Джерело визначено: key={key}, name={name_from_config}")
-            return key, name_from_config # Повертаємо ключ і назву
+        route = ChannelRoute(key, name_from_config, partial(parse_signal, key, config=config), partial(signal_pair_hint, key))
+        normalized_title = normalize_channel_title(name_from_config)
+        if normalized_title:
+            if normalized_title in routes_by_title:
+                logger.warning(f"Канали {routes_by_title[normalized_title].channel_key} та {key} мають однакову нормалізовану назву '{normalized_title}'. Використовується {routes_by_title[normalized_title].channel_key}.")
+            else:
+                routes_by_title[normalized_title] = route
+        chat_id = channel_data.get('chat_id')
+        if chat_id is not None:
+            try:
+                routes_by_chat_id[int(chat_id)] = route
+            except (TypeError, ValueError):
+                logger.warning(f"Некоректний chat_id '{chat_id}' для каналу {key} у config.json. Ігнорується.")
+    return _RoutingIndex(config, routes_by_title, routes_by_chat_id)
+
+def build_routing_index(config: dict) -> int:
+    """Будує індекс: нормалізована назва / chat_id каналу -> ChannelRoute. Повертає кількість маршрутів."""
+    global _ROUTING_INDEX
+    index = _build_routing_index(config)
+    with _ROUTING_LOCK:
+        _ROUTING_INDEX = index
+    return len(index.by_title) + len(index.by_chat_id)
+
+def _routing_index(config: dict) -> _RoutingIndex:
+    global _ROUTING_INDEX
+    index = _ROUTING_INDEX
+    if index is not None and index.config is config:
+        return index
+    with _ROUTING_LOCK:
+        # Індекс ще не побудовано для цього конфігу; перевірка під локом - будує лише один потік
+        if _ROUTING_INDEX is None or _ROUTING_INDEX.config is not config:
+            _ROUTING_INDEX = _build_routing_index(config)
+        return _ROUTING_INDEX
+
+def route_signal_source(forwarded_channel_title: str, config: dict, chat_id: int = None):
+    """Повертає ChannelRoute для джерела (спочатку за chat_id, потім за нормалізованою назвою) або None."""
+    index = _routing_index(config)
+    if chat_id is not None:
+        route = index.by_chat_id.get(chat_id)
+        if route:
+            return route
+    return index.by_title.get(normalize_channel_title(forwarded_channel_title))
+
+def identify_signal_source(forwarded_channel_title: str, config: dict, chat_id: int = None):
+    """Визначає ключ каналу за його назвою (або chat_id) з Telegram API."""
+    logger.debug(f"Визначаю джерело за назвою: '{forwarded_channel_title}' (chat_id={chat_id})")
+    route = route_signal_source(forwarded_channel_title, config, chat_id)
+    if route:
+        logger.debug(f"Джерело визначено: key={route.channel_key}, name={route.name}")
+        return route.channel_key, route.name # Повертаємо ключ і назву
     logger.info(f"Назва каналу '{forwarded_channel_title}' не знайдена в config.json.")
     return None, None # Якщо канал не знайдено
 
@@ -49,48 +235,46 @@ def identify_signal_source(forwarded_channel_title: str, config: dict):
 
 def parse_channel_1_entry(text: str):
     """Парсер для ПЕРШОГО повідомлення каналу 1 ('Заполняю...')."""
+    if not _anchors_present('parse_channel_1_entry', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.debug("  [C1 Entry] Спроба парсингу як повідомлення 'Заполняю...'")
     # Патерн: "Заполняю" + пробіл + (Слово) + пробіл + (long або short)
-    match = re.search(r"Заполняю\s+(\w+)\s+(long|short)", text, re.IGNORECASE)
+    match = _PATTERNS['c1_entry'].search(text)
     if match:
         pair = normalize_pair(match.group(1))
         direction = match.group(2).upper()
         logger.info(f"  [C1 Entry] Розпізнано вхідний сигнал: Pair={pair}, Direction={direction}")
-        return {"type": "entry", "pair": pair, "direction": direction}
+        return ParsedSignal(type="entry", source="channel_1", pair=pair, direction=direction, raw_text=text)
     logger.debug("  [C1 Entry] Не знайдено патерн 'Заполняю...'")
     return None
 
 def parse_channel_1_details(text: str, config: dict):
     """Парсер для ДРУГОГО повідомлення каналу 1 (з деталями TP/SL)."""
+    if not _anchors_present('parse_channel_1_details', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.debug("  [C1 Details] Спроба парсингу як повідомлення з деталями (Монета:...)")
-    signal_data = {
-        "type": "details", # Додаємо тип для розрізнення
-        "source": "channel_1",
-        "source_name": config['channels']['channel_1']['name'],
-        "pair": None,
-        "direction": None, # Напрямок теж є в цьому повідомленні
-        "entry_price": None,
-        "take_profits": [],
-        "stop_loss": None,
-        "raw_text": text,
-    }
+    pair = None
+    direction = None # Напрямок теж є в цьому повідомленні
+    entry_price = None
+    take_profits = []
+    stop_loss = None
 
     try:
         # 1. Пара та напрямок (з рядка "Монета: ...")
-        pair_match = re.search(r"Монета:\s+(\w+)\s+(LONG|SHORT)", text, re.IGNORECASE)
+        pair_match = _PATTERNS['c1_pair'].search(text)
         if pair_match:
-            signal_data["pair"] = normalize_pair(pair_match.group(1))
-            signal_data["direction"] = pair_match.group(2).upper()
-            logger.debug(f"  [C1 Details] Знайдено пару: {signal_data['pair']}, напрямок: {signal_data['direction']}")
+            pair = normalize_pair(pair_match.group(1))
+            direction = pair_match.group(2).upper()
+            logger.debug(f"  [C1 Details] Знайдено пару: {pair}, напрямок: {direction}")
         else:
             logger.warning("  [C1 Details] Не вдалося знайти пару та напрямок ('Монета:...').")
             return None # Вважаємо обов'язковим для ідентифікації
 
         # 2. Ціна входу
-        entry_match = re.search(r"Цена входа:\s*([\d.,]+)", text)
+        entry_match = _PATTERNS['c1_entry_price'].search(text)
         if entry_match:
-            signal_data["entry_price"] = safe_float(entry_match.group(1))
-            logger.debug(f"  [C1 Details] Знайдено ціну входу: {signal_data['entry_price']}")
+            entry_price = safe_float(entry_match.group(1))
+            logger.debug(f"  [C1 Details] Знайдено ціну входу: {entry_price}")
         # Не робимо return None, можливо ціна входу не критична для встановлення SL/TP?
         # Але краще залишити обов'язковим для повноти даних
         # else:
@@ -98,30 +282,33 @@ def parse_channel_1_details(text: str, config: dict):
         #     return None 
 
         # 3. Тейк-профіти
-        tp_match = re.search(r"Тэйки:\s*([\d.,\s]+)", text)
+        tp_match = _PATTERNS['c1_take_profits'].search(text)
         if tp_match:
             tp_str = tp_match.group(1).strip()
-            signal_data["take_profits"] = [p for p in (safe_float(val) for val in tp_str.split()) if p is not None]
-            logger.debug(f"  [C1 Details] Знайдено тейк-профіти: {signal_data['take_profits']}")
+            take_profits = [p for p in (safe_float(val) for val in tp_str.split()) if p is not None]
+            logger.debug(f"  [C1 Details] Знайдено тейк-профіти: {take_profits}")
         else:
             logger.warning("  [C1 Details] Не вдалося знайти тейк-профіти.")
 
         # 4. Стоп-лосс
-        sl_match = re.search(r"Стоп:\s*([\d.,]+)", text)
+        sl_match = _PATTERNS['c1_stop_loss'].search(text)
         if sl_match:
-            signal_data["stop_loss"] = safe_float(sl_match.group(1))
-            logger.debug(f"  [C1 Details] Знайдено стоп-лосс: {signal_data['stop_loss']}")
+            stop_loss = safe_float(sl_match.group(1))
+            logger.debug(f"  [C1 Details] Знайдено стоп-лосс: {stop_loss}")
         else:
             logger.warning("  [C1 Details] Не вдалося знайти стоп-лосс.")
             return None # Обов'язкове поле для встановлення ордерів
 
         # Перевірка обов'язкових полів для деталей
-        if not all([signal_data["pair"], signal_data["direction"], signal_data["stop_loss"]]):
+        if not all([pair, direction, stop_loss]):
              logger.warning("  [C1 Details] Не всі обов'язкові поля (pair, direction, stop_loss) було розпізнано.")
              return None
              
-        logger.info(f"  [C1 Details] Розпізнано деталі сигналу: { {k: v for k, v in signal_data.items() if k != 'raw_text'} }")
-        return signal_data
+        parsed_signal = ParsedSignal(type="details", source="channel_1", source_name=config['channels']['channel_1']['name'],
+                                     pair=pair, direction=direction, entry_price=entry_price,
+                                     take_profits=tuple(take_profits), stop_loss=stop_loss, raw_text=text)
+        logger.info(f"  [C1 Details] Розпізнано деталі сигналу: {parsed_signal}")
+        return parsed_signal
 
     except Exception as e:
         logger.error(f"  [C1 Details] Неочікувана помилка під час парсингу деталей каналу 1: {e}", exc_info=True)
@@ -130,103 +317,96 @@ def parse_channel_1_details(text: str, config: dict):
 # --- Заглушки для інших каналів (додаємо type) ---
 def parse_channel_2(text: str, config: dict):
     """Парсер для каналу 2 (Crypto Alliance | Мартин)."""
+    if not _anchors_present('parse_channel_2', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.info(f"Викликано парсер для каналу 2 ({config['channels']['channel_2']['name']}).")
-    signal_data = {
-        "type": "full",
-        "source": "channel_2",
-        "source_name": config['channels']['channel_2']['name'],
-        "pair": None,
-        "direction": None,
-        "entry_price": None,
-        "take_profits": [],
-        "stop_loss": None,
-        "raw_text": text,
-    }
+    pair = None
+    direction = None
+    entry_price = None
+    take_profits = []
+    stop_loss = None
 
     try:
         # 1. Пара та напрямок
-        pair_match = re.search(r"Заходим\s+([\w\/]+)\s+(long|short)", text, re.IGNORECASE)
+        pair_match = _PATTERNS['c2_pair'].search(text)
         if pair_match:
-            signal_data["pair"] = normalize_pair(pair_match.group(1))
-            signal_data["direction"] = pair_match.group(2).upper()
-            logger.debug(f"  [C2] Знайдено пару: {signal_data['pair']}, напрямок: {signal_data['direction']}")
+            pair = normalize_pair(pair_match.group(1))
+            direction = pair_match.group(2).upper()
+            logger.debug(f"  [C2] Знайдено пару: {pair}, напрямок: {direction}")
         else:
             logger.warning("  [C2] Не вдалося знайти пару та напрямок ('Заходим...').")
             return None # Обов'язкові
 
         # 2. Ціна входу (Шукаємо текст після двокрапки)
-        entry_match = re.search(r"Точка входа:\s*([\d.,]+)", text, re.IGNORECASE)
+        entry_match = _PATTERNS['c2_entry_price'].search(text)
         if entry_match:
-            signal_data["entry_price"] = safe_float(entry_match.group(1))
-            logger.debug(f"  [C2] Знайдено ціну входу: {signal_data['entry_price']}")
+            entry_price = safe_float(entry_match.group(1))
+            logger.debug(f"  [C2] Знайдено ціну входу: {entry_price}")
         else:
             logger.warning("  [C2] Не вдалося знайти ціну входу ('Точка входа:...').")
             return None # Обов'язкове
 
         # 3. Тейк-профіти (Шукаємо текст після двокрапки, розділяємо по " - ")
-        tp_match = re.search(r"Тейки:\s*(.+)", text, re.IGNORECASE)
+        tp_match = _PATTERNS['c2_take_profits'].search(text)
         if tp_match:
             tp_str = tp_match.group(1).strip()
             # Розділяємо по " - ", очищуємо від пробілів навколо чисел
-            signal_data["take_profits"] = [p for p in (safe_float(val.strip()) for val in tp_str.split(' - ')) if p is not None]
-            logger.debug(f"  [C2] Знайдено тейк-профіти: {signal_data['take_profits']}")
+            take_profits = [p for p in (safe_float(val.strip()) for val in tp_str.split(' - ')) if p is not None]
+            logger.debug(f"  [C2] Знайдено тейк-профіти: {take_profits}")
         else:
             logger.warning("  [C2] Не вдалося знайти тейк-профіти ('Тейки:...').")
             # Тейки можуть бути необов'язковими
 
         # 4. Стоп-лосс (Шукаємо текст після двокрапки)
-        sl_match = re.search(r"Стоп:\s*([\d.,]+)", text, re.IGNORECASE)
+        sl_match = _PATTERNS['c2_stop_loss'].search(text)
         if sl_match:
-            signal_data["stop_loss"] = safe_float(sl_match.group(1))
-            logger.debug(f"  [C2] Знайдено стоп-лосс: {signal_data['stop_loss']}")
+            stop_loss = safe_float(sl_match.group(1))
+            logger.debug(f"  [C2] Знайдено стоп-лосс: {stop_loss}")
         else:
             logger.warning("  [C2] Не вдалося знайти стоп-лосс ('Стоп:...'). Встановлюємо None.")
-            signal_data["stop_loss"] = None # Явно встановлюємо None, якщо не знайдено
+            stop_loss = None # Явно встановлюємо None, якщо не знайдено
             # return None # Видаляємо return None, щоб зробити SL необов'язковим
 
         # Перевірка обов'язкових полів (виключаючи stop_loss)
-        if not all([signal_data["pair"], signal_data["direction"], signal_data["entry_price"]]):
+        if not all([pair, direction, entry_price]):
              logger.warning("  [C2] Не всі обов'язкові поля (pair, direction, entry_price) було розпізнано.")
              return None
 
-        logger.info(f"  [C2] Розпізнано сигнал: { {k: v for k, v in signal_data.items() if k != 'raw_text'} }")
-        return signal_data
+        parsed_signal = ParsedSignal(type="full", source="channel_2", source_name=config['channels']['channel_2']['name'],
+                                     pair=pair, direction=direction, entry_price=entry_price,
+                                     take_profits=tuple(take_profits), stop_loss=stop_loss, raw_text=text)
+        logger.info(f"  [C2] Розпізнано сигнал: {parsed_signal}")
+        return parsed_signal
 
     except Exception as e:
         logger.error(f"  [C2] Неочікувана помилка під час парсингу каналу 2: {e}", exc_info=True)
         return None
 
 def parse_channel_3(text: str, config: dict):
+    if not _anchors_present('parse_channel_3', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.info(f"Викликано парсер для каналу 3 ({config['channels']['channel_3']['name']}).")
     # --- Log the exact text being parsed ---
-    logger.debug(f"  [C3] Текст для парсингу (repr): {repr(text)}")
-    logger.debug(f"  [C3] Текст для парсингу (raw):\n---\n{text}\n---")
-
-    signal_data = {
-        "type": "full",
-        "source": "channel_3",
-        "source_name": config['channels']['channel_3']['name'],
-        "pair": None,
-        "direction": None,
-        "entry_price": "MARKET",
-        "limit_order_price": None,
-        "take_profits": [],
-        "stop_loss": None,
-        "raw_text": text,
-    }
+    logger.debug("  [C3] Текст для парсингу (raw):\n---\n%s\n---", text)
+
+    pair = None
+    direction = None
+    limit_order_price = None
+    take_profits = []
+    stop_loss = None
 
     try:
         # 1. Напрямок та діапазон цін (з нього беремо ціну для лімітки)
         # Зробимо regex більш гнучким до пробілів, замінюючи пробіли на \s+
-        entry_range_match = re.search(r"Начинаю\s+открывать\s+(лонг|шорт)\s+в\s+диапазоне\s+цены\s+([\d.,]+)\s*-\s*([\d.,]+)", text, re.IGNORECASE)
+        entry_range_match = _PATTERNS['c3_entry_range'].search(text)
         if entry_range_match:
-            signal_data["direction"] = "LONG" if entry_range_match.group(1).lower() == "лонг" else "SHORT"
+            direction = "LONG" if entry_range_match.group(1).lower() == "лонг" else "SHORT"
             # Витягуємо обидві межі, але для лімітки беремо другу (min)
             price_high_str = entry_range_match.group(2)
             price_low_str = entry_range_match.group(3)
-            signal_data["limit_order_price"] = safe_float(price_low_str)
-            logger.debug(f"  [C3] Знайдено напрямок: {signal_data['direction']}, діапазон: {price_high_str}-{price_low_str}, ціна ліміту: {signal_data['limit_order_price']}")
-            if signal_data["limit_order_price"] is None:
+            limit_order_price = safe_float(price_low_str)
+            logger.debug(f"  [C3] Знайдено напрямок: {direction}, діапазон: {price_high_str}-{price_low_str}, ціна ліміту: {limit_order_price}")
+            if limit_order_price is None:
                  logger.warning("  [C3] Не вдалося конвертувати нижню межу діапазону в ціну лімітного ордера, але продовжуємо (для можливості market + limit).")
         else:
             # Якщо діапазону немає, це просто MARKET сигнал (але для Джиммі це не очікувано)
@@ -244,65 +424,63 @@ def parse_channel_3(text: str, config: dict):
         entry_range_start_index = entry_range_match.start()
         text_before_entry = text[:entry_range_start_index]
         pair_ticker_match = None
-        for match in re.finditer(r"\b([A-Z]{3,})\b", text_before_entry):
+        for match in _PATTERNS['c3_ticker'].finditer(text_before_entry):
             pair_ticker_match = match # Запам'ятовуємо останній
         
         if pair_ticker_match:
-            signal_data["pair"] = normalize_pair(pair_ticker_match.group(1))
-            logger.debug(f"  [C3] Знайдено пару (тікер): {signal_data['pair']}")
+            pair = normalize_pair(pair_ticker_match.group(1))
+            logger.debug(f"  [C3] Знайдено пару (тікер): {pair}")
         else:
             # Якщо тікер не знайдено, спробуємо знайти щось типу xxx/usdt
-            pair_slash_match = re.search(r"\b(\w+/usdt)\b", text_before_entry, re.IGNORECASE)
+            pair_slash_match = _PATTERNS['c3_pair_slash'].search(text_before_entry)
             if pair_slash_match:
-                signal_data["pair"] = normalize_pair(pair_slash_match.group(1))
-                logger.debug(f"  [C3] Знайдено пару (xxx/usdt): {signal_data['pair']}")
+                pair = normalize_pair(pair_slash_match.group(1))
+                logger.debug(f"  [C3] Знайдено пару (xxx/usdt): {pair}")
             else:
                 logger.warning("  [C3] Не вдалося знайти тікер пари у тексті перед описом входу.")
                 return None # Обов'язкове поле
 
         # 3. Стоп-лосс
         # Зробимо regex більш гнучким до пробілів
-        sl_match = re.search(r"Сл\s+ставлю\s+на\s+([\d.,]+)", text, re.IGNORECASE)
+        sl_match = _PATTERNS['c3_stop_loss'].search(text)
         if sl_match:
-            signal_data["stop_loss"] = safe_float(sl_match.group(1))
-            logger.debug(f"  [C3] Знайдено стоп-лосс: {signal_data['stop_loss']}")
+            stop_loss = safe_float(sl_match.group(1))
+            logger.debug(f"  [C3] Знайдено стоп-лосс: {stop_loss}")
         else:
             logger.warning("  [C3] Не вдалося знайти стоп-лосс ('Сл ставлю на...').")
             return None # Обов'язкове
 
         # 4. Тейк-профіти (Роздільник " и ")
-        tp_match = re.search(r"Мои цели на сделку\s+(.+)", text, re.IGNORECASE)
+        tp_match = _PATTERNS['c3_take_profits'].search(text)
         if tp_match:
             tp_str = tp_match.group(1).strip()
             # Розділяємо по " и ", очищуємо КОЖНУ частину від нечислових символів (крім . ,) і конвертуємо
-            take_profits = []
             for part in tp_str.split(" и "):
                 # Видаляємо все, що не є цифрою, крапкою або комою
-                cleaned_part = re.sub(r"[^\d.,]", "", part.strip())
+                cleaned_part = _PATTERNS['c3_non_numeric'].sub("", part.strip())
                 profit_value = safe_float(cleaned_part)
                 if profit_value is not None:
                     take_profits.append(profit_value)
 
-            signal_data["take_profits"] = take_profits
-            logger.debug(f"  [C3] Знайдено тейк-профіти: {signal_data['take_profits']}")
+            logger.debug(f"  [C3] Знайдено тейк-профіти: {take_profits}")
 
-            if not signal_data["take_profits"]:
+            if not take_profits:
                 logger.warning("  [C3] Знайдено рядок 'Мои цели...', але не вдалося витягти жодного числового значення тейк-профіту.")
         else:
             logger.warning("  [C3] Не вдалося знайти рядок 'Мои цели на сделку...'.")
 
         # Перевірка обов'язкових полів (включаючи перевірку типу ордера)
         required_fields_ok = all([
-            signal_data["pair"],
-            signal_data["direction"],
-            signal_data["stop_loss"]
+            pair,
+            direction,
+            stop_loss
         ])
         # --- Видаляємо некоректний блок перевірки для MARKET ---
         # # Додаткова перевірка для лімітного ордера
-        # if signal_data["entry_price"] == "LIMIT" and signal_data["limit_order_price"] is None:
+        # if entry_price == "LIMIT" and limit_order_price is None:
         #      logger.warning("  [C3] Тип ордера LIMIT, але ціна ліміту відсутня або некоректна.")
         #      return None
-        # elif signal_data["entry_price"] == "MARKET":
+        # elif entry_price == "MARKET":
         #     # Поки що для каналу 3 немає підтримки MARKET ордерів, тому якщо сюди дійшло, це помилка парсингу
         #     logger.warning("  [C3] Парсер не знайшов діапазон цін, але дійшов до кінця. Це не очікувано для каналу 3.")
         #     return None
@@ -314,8 +492,11 @@ def parse_channel_3(text: str, config: dict):
         # --- Додаткове логування перед успішним поверненням ---
         logger.debug("  [C3] Усі перевірки пройдені. Повертаю розпізнані дані.")
         # 6. Log success and return data
-        logger.info(f"  [C3] Розпізнано сигнал: { {k: v for k, v in signal_data.items() if k != 'raw_text'} }")
-        return signal_data
+        parsed_signal = ParsedSignal(type="full", source="channel_3", source_name=config['channels']['channel_3']['name'],
+                                     pair=pair, direction=direction, entry_price="MARKET", take_profits=tuple(take_profits),
+                                     stop_loss=stop_loss, limit_order_price=limit_order_price, raw_text=text)
+        logger.info(f"  [C3] Розпізнано сигнал: {parsed_signal}")
+        return parsed_signal
 
     except Exception as e:
         logger.error(f"  [C3] Неочікувана помилка під час парсингу каналу 3: {e}", exc_info=True)
@@ -324,69 +505,69 @@ def parse_channel_3(text: str, config: dict):
 # --- Parser for Channel 4 (KostyaKogan - одноетапний) ---
 def parse_channel_4(text: str, config: dict):
     """Парсер для каналу 4 (KostyaKogan), який надсилає все в одному повідомленні."""
+    if not _anchors_present('parse_channel_4', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.debug("  [C4] Спроба парсингу як одноетапного сигналу")
-    signal_data = {
-        "type": "full", # Позначаємо як повний сигнал
-        "source": "channel_4",
-        "source_name": config.get('channels', {}).get('channel_4', {}).get('name', 'KostyaKogan'),
-        "pair": None,
-        "direction": None,
-        "entry_price": "MARKET", # Вхід по ринку
-        "take_profits": [],
-        "stop_loss": None,
-        "leverage": None, # Додаємо поле для плеча
-        "raw_text": text,
-    }
+    pair = None
+    direction = None
+    take_profits = []
+    stop_loss = None
+    leverage = None
 
     try:
         # 1. Пара та Напрямок (Шукаємо в першому рядку типу "Открыл UXLINK long")
         first_line = text.splitlines()[0] if text.splitlines() else ""
-        pair_match = re.search(r"Открыл\s+([A-Z0-9/]+)\s+(long|short)", first_line, re.IGNORECASE)
+        pair_match = _PATTERNS['c4_pair'].search(first_line)
         if pair_match:
-            signal_data["pair"] = normalize_pair(pair_match.group(1))
-            signal_data["direction"] = pair_match.group(2).upper()
-            logger.debug(f"  [C4] Знайдено пару: {signal_data['pair']}, напрямок: {signal_data['direction']}")
+            pair = normalize_pair(pair_match.group(1))
+            direction = pair_match.group(2).upper()
+            logger.debug(f"  [C4] Знайдено пару: {pair}, напрямок: {direction}")
         else:
             logger.warning("  [C4] Не вдалося знайти пару та напрямок у першому рядку ('Открыл...').")
             return None # Обов'язкові
 
         # 2. Плече (опціонально)
-        leverage_match = re.search(r"плечо:\s*(\d+)x?", text, re.IGNORECASE)
+        leverage_match = _PATTERNS['c4_leverage'].search(text)
         if leverage_match:
             try:
-                signal_data["leverage"] = int(leverage_match.group(1))
-                logger.debug(f"  [C4] Знайдено плече: {signal_data['leverage']}")
+                leverage = int(leverage_match.group(1))
+                logger.debug(f"  [C4] Знайдено плече: {leverage}")
             except ValueError:
                  logger.warning("  [C4] Не вдалося конвертувати плече в число.")
         else:
              logger.debug("  [C4] Плече не знайдено.")
 
         # 3. Стоп-лосс
-        sl_match = re.search(r"стоп:\s*([\d.,]+)", text, re.IGNORECASE)
+        sl_match = _PATTERNS['c4_stop_loss'].search(text)
         if sl_match:
-            signal_data["stop_loss"] = safe_float(sl_match.group(1))
-            logger.debug(f"  [C4] Знайдено стоп-лосс: {signal_data['stop_loss']}")
+            stop_loss = safe_float(sl_match.group(1))
+            logger.debug(f"  [C4] Знайдено стоп-лосс: {stop_loss}")
         else:
             logger.warning("  [C4] Не вдалося знайти стоп-лосс ('стоп:...').")
             return None # Обов'язкове
 
         # 4. Тейк-профіти (Роздільник ", ")
-        tp_match = re.search(r"тейк:\s*(.+)", text, re.IGNORECASE)
+        tp_match = _PATTERNS['c4_take_profits'].search(text)
         if tp_match:
             tp_str = tp_match.group(1).strip()
-            signal_data["take_profits"] = [p for p in (safe_float(val.strip()) for val in tp_str.split(',')) if p is not None]
-            logger.debug(f"  [C4] Знайдено тейк-профіти: {signal_data['take_profits']}")
+            take_profits = [p for p in (safe_float(val.strip()) for val in tp_str.split(',')) if p is not None]
+            logger.debug(f"  [C4] Знайдено тейк-профіти: {take_profits}")
         else:
             logger.warning("  [C4] Не вдалося знайти тейк-профіти ('тейк:...').")
             # Тейки тут, схоже, обов'язкові?
 
         # Перевірка обов'язкових полів
-        if not all([signal_data["pair"], signal_data["direction"], signal_data["stop_loss"]]):
+        if not all([pair, direction, stop_loss]):
              logger.warning("  [C4] Не всі обов'язкові поля (pair, direction, stop_loss) було розпізнано.")
              return None
 
-        logger.info(f"  [C4] Розпізнано сигнал: { {k: v for k, v in signal_data.items() if k != 'raw_text'} }")
-        return signal_data
+        # Вхід по ринку
+        parsed_signal = ParsedSignal(type="full", source="channel_4",
+                                     source_name=config.get('channels', {}).get('channel_4', {}).get('name', 'KostyaKogan'),
+                                     pair=pair, direction=direction, entry_price="MARKET", take_profits=tuple(take_profits),
+                                     stop_loss=stop_loss, leverage=leverage, raw_text=text)
+        logger.info(f"  [C4] Розпізнано сигнал: {parsed_signal}")
+        return parsed_signal
 
     except Exception as e:
         logger.error(f"  [C4] Неочікувана помилка під час парсингу каналу 4: {e}", exc_info=True)
@@ -396,71 +577,163 @@ def parse_channel_4(text: str, config: dict):
 
 def parse_channel_5_entry(text: str):
     """Парсер для ПЕРШОГО повідомлення каналу 5 ('Захожу...')."""
+    if not _anchors_present('parse_channel_5_entry', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.debug("  [C5 Entry] Спроба парсингу як повідомлення 'Захожу...'")
     # Патерн: "Захожу" + пробіл + (в LONG / в SHORT) + "по монете" + пробіл + (#Символ) + ...
     # Додаємо # до символу і робимо його необов'язковим, шукаємо великі літери + USDT
-    match = re.search(r"Захожу\s+(?:в\s+)?(LONG|SHORT)\s+по\s+монете\s+#?([A-Z0-9/]+USDT)", text, re.IGNORECASE)
+    match = _PATTERNS['c5_entry'].search(text)
     if match:
         direction = match.group(1).upper()
         pair_raw = match.group(2) # Вже має містити USDT
         pair = normalize_pair(pair_raw)
         logger.info(f"  [C5 Entry] Розпізнано вхідний сигнал: Pair={pair}, Direction={direction}")
-        return {"type": "entry", "pair": pair, "direction": direction}
+        return ParsedSignal(type="entry", source="channel_5", pair=pair, direction=direction, raw_text=text)
     logger.debug("  [C5 Entry] Не знайдено патерн 'Захожу...'")
     return None
 
 def parse_channel_5_details(text: str, config: dict):
     """Парсер для ДРУГОГО повідомлення каналу 5 (з деталями TP/SL)."""
+    if not _anchors_present('parse_channel_5_details', text):
+        return None # Обов'язкових ключових слів немає - регулярні вирази не запускаємо
     logger.debug("  [C5 Details] Спроба парсингу як повідомлення з деталями (COIN...) ")
-    logger.debug(f"  [C5 Details] Вхідний текст для парсингу пари: {repr(text[:100])}...") # Логуємо перші 100 символів
-    signal_data = {
-        "type": "details",
-        "source": "channel_5",
-        "source_name": config.get('channels', {}).get('channel_5', {}).get('name', 'VALERIY LONG/SHORT'),
-        "pair": None,
-        "direction": None, # Залишаємо None, буде встановлено в main.py
-        "entry_price": "MARKET", # Вхід по ринку
-        "take_profits": [],
-        "stop_loss": None,
-        "raw_text": text,
-    }
+    logger.debug("  [C5 Details] Вхідний текст для парсингу пари: %r...", text[:100]) # Логуємо перші 100 символів
+    pair = None
+    take_profits = []
+    stop_loss = None
 
     try:
-        # 1. Пара (з рядка \"COIN...\") - Одинарний слеш для пробілу!
-        pair_match = re.search(r"COIN\s*🪙?\s*([A-Z0-9/]+USDT)", text, re.IGNORECASE) # <-- Одинарний \s
+        # 1. Пара (з рядка \"COIN...\")
+        pair_match = _PATTERNS['c5_pair'].search(text)
         if pair_match:
-            signal_data["pair"] = normalize_pair(pair_match.group(1))
-            logger.debug(f"  [C5 Details] Знайдено пару: {signal_data['pair']} (з {pair_match.group(1)})")
+            pair = normalize_pair(pair_match.group(1))
+            logger.debug(f"  [C5 Details] Знайдено пару: {pair} (з {pair_match.group(1)})")
         else:
             logger.warning("  [C5 Details] Не вдалося знайти пару ('COIN...XXXUSDT').")
             return None # Обов'язкове поле
 
-        # 2. Тейк-профіти (Шукаємо рядки, що починаються з ✅TP:) - Одинарний слеш!
-        tp_lines = re.findall(r"✅\s*TP:\s*([\d.,]+)", text) # <-- Одинарний \s
+        # 2. Тейк-профіти (Шукаємо рядки, що починаються з ✅TP:)
+        tp_lines = _PATTERNS['c5_take_profit'].findall(text)
         if tp_lines:
-            signal_data["take_profits"] = [p for p in (safe_float(val) for val in tp_lines) if p is not None]
-            logger.debug(f"  [C5 Details] Знайдено тейк-профіти: {signal_data['take_profits']}")
+            take_profits = [p for p in (safe_float(val) for val in tp_lines) if p is not None]
+            logger.debug(f"  [C5 Details] Знайдено тейк-профіти: {take_profits}")
         else:
             logger.warning("  [C5 Details] Не вдалося знайти тейк-профіти (рядки ✅TP:).")
             # TP можуть бути необов'язковими?
 
-        # 3. Стоп-лосс (Шукаємо рядок "🚫Stop ...") - Одинарний слеш!
-        sl_match = re.search(r"🚫\s*Stop\s+([\d.,]+)", text, re.IGNORECASE) # <-- Одинарний \s
+        # 3. Стоп-лосс (Шукаємо рядок "🚫Stop ...")
+        sl_match = _PATTERNS['c5_stop_loss'].search(text)
         if sl_match:
-            signal_data["stop_loss"] = safe_float(sl_match.group(1))
-            logger.debug(f"  [C5 Details] Знайдено стоп-лосс: {signal_data['stop_loss']}")
+            stop_loss = safe_float(sl_match.group(1))
+            logger.debug(f"  [C5 Details] Знайдено стоп-лосс: {stop_loss}")
         else:
             logger.warning("  [C5 Details] Не вдалося знайти стоп-лосс ('🚫Stop...').")
             return None # Обов'язкове поле
 
         # Перевірка обов'язкових полів (без напрямку)
-        if not all([signal_data["pair"], signal_data["stop_loss"]]):
+        if not all([pair, stop_loss]):
              logger.warning("  [C5 Details] Не всі обов'язкові поля (pair, stop_loss) було розпізнано.")
              return None
 
-        logger.info(f"  [C5 Details] Розпізнано деталі сигналу (без напрямку): { {k: v for k, v in signal_data.items() if k != 'raw_text'} }")
-        return signal_data # Повертаємо дані без напрямку
+        # Напрямок залишається None - береться з входу; вхід по ринку
+        parsed_signal = ParsedSignal(type="details", source="channel_5",
+                                     source_name=config.get('channels', {}).get('channel_5', {}).get('name', 'VALERIY LONG/SHORT'),
+                                     pair=pair, entry_price="MARKET", take_profits=tuple(take_profits),
+                                     stop_loss=stop_loss, raw_text=text)
+        logger.info(f"  [C5 Details] Розпізнано деталі сигналу (без напрямку): {parsed_signal}")
+        return parsed_signal
 
     except Exception as e:
         logger.error(f"  [C5 Details] Неочікувана помилка під час парсингу деталей каналу 5: {e}", exc_info=True)
-        return None 
\ No newline at end of file
+        return None 
+
+# --- Єдина точка входу парсингу ---
+
+# Вбудовані (ручні) парсери каналів, у порядку перевірки етапів. Використовуються, якщо для каналу
+# немає граматики в config.json.
+_BUILTIN_PARSERS = {
+    'channel_1': (lambda text, config: parse_channel_1_entry(text), parse_channel_1_details),
+    'channel_2': (parse_channel_2,),
+    'channel_3': (parse_channel_3,),
+    'channel_4': (parse_channel_4,),
+    'channel_5': (lambda text, config: parse_channel_5_entry(text), parse_channel_5_details),
+}
+
+def _pattern_pair(pattern_key: str, group: int):
+    pattern = _PATTERNS[pattern_key]
+    def pair_hint(text: str) -> Optional[str]:
+        match = pattern.search(text)
+        return match.group(group) if match else None
+    return pair_hint
+
+def _channel_3_pair(text: str) -> Optional[str]:
+    # Як у parse_channel_3: останній тікер перед рядком "Начинаю открывать...", інакше xxx/usdt
+    entry_range_match = _PATTERNS['c3_entry_range'].search(text)
+    if not entry_range_match:
+        return None
+    text_before_entry = text[:entry_range_match.start()]
+    pair_ticker_match = None
+    for pair_ticker_match in _PATTERNS['c3_ticker'].finditer(text_before_entry):
+        pass
+    if pair_ticker_match:
+        return pair_ticker_match.group(1)
+    pair_slash_match = _PATTERNS['c3_pair_slash'].search(text_before_entry)
+    return pair_slash_match.group(1) if pair_slash_match else None
+
+def _channel_4_pair(text: str) -> Optional[str]:
+    # Як у parse_channel_4: пара шукається лише в першому рядку
+    lines = text.splitlines()
+    pair_match = _PATTERNS['c4_pair'].search(lines[0]) if lines else None
+    return pair_match.group(1) if pair_match else None
+
+# Пошук лише пари (без SL/TP) для кожного вбудованого парсера - ті ж патерни, що й у парсерах
+_PAIR_HINTS = {
+    'parse_channel_1_entry': _pattern_pair('c1_entry', 1),
+    'parse_channel_1_details': _pattern_pair('c1_pair', 1),
+    'parse_channel_2': _pattern_pair('c2_pair', 1),
+    'parse_channel_3': _channel_3_pair,
+    'parse_channel_4': _channel_4_pair,
+    'parse_channel_5_entry': _pattern_pair('c5_entry', 2),
+    'parse_channel_5_details': _pattern_pair('c5_pair', 1),
+}
+
+_BUILTIN_PAIR_HINTS = {
+    'channel_1': ('parse_channel_1_entry', 'parse_channel_1_details'),
+    'channel_2': ('parse_channel_2',),
+    'channel_3': ('parse_channel_3',),
+    'channel_4': ('parse_channel_4',),
+    'channel_5': ('parse_channel_5_entry', 'parse_channel_5_details'),
+}
+
+def signal_pair_hint(channel_key: str, text: str) -> Optional[str]:
+    """Нормалізована пара повідомлення без повного парсингу (напр. для ключа доріжки виконання в циклі подій).
+
+    Запускаються лише патерни пари етапів, якорі яких є в тексті; результат збігається з ParsedSignal.pair
+    для повідомлень, які парсер розпізнає.
+    """
+    if not text:
+        return None
+    grammar = _COMPILED_GRAMMARS.get(channel_key)
+    if grammar is not None:
+        return grammar.pair_hint(text)
+    for parser_name in _BUILTIN_PAIR_HINTS.get(channel_key, ()):
+        if _anchors_present(parser_name, text):
+            pair = _PAIR_HINTS[parser_name](text)
+            if pair:
+                return normalize_pair(pair)
+    return None
+
+def parse_signal(channel_key: str, text: str, config: dict) -> Optional[ParsedSignal]:
+    """Розбирає повідомлення каналу: граматикою з конфігу, якщо вона є, інакше вбудованим парсером.
+
+    Returns:
+        ParsedSignal з полем type (entry / details / full) або None.
+    """
+    grammar = _COMPILED_GRAMMARS.get(channel_key)
+    if grammar is not None:
+        return grammar.parse(text)
+    for parser in _BUILTIN_PARSERS.get(channel_key, ()):
+        parsed_signal = parser(text, config)
+        if parsed_signal:
+            return parsed_signal
+    return None
@@ -0,0 +1,310 @@
+# Generic signal execution pipeline: validate -> size -> execute -> persist (for all configured channels)
+
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import data_manager
+import metrics
+import pending_signals
+import tracing
+from signal_interpreter import ParsedSignal
+
+logger = logging.getLogger(__name__)
+
+# Обов'язкові поля сигналу за типом (ParsedSignal.type)
+REQUIRED_FIELDS = {
+    'entry': ('pair', 'direction'),            # Перше повідомлення двохетапного сигналу - вхід по ринку
+    'details': ('pair', 'stop_loss'),          # Друге повідомлення - SL/TP (напрямок береться з entry)
+    'full': ('pair', 'direction', 'stop_loss'), # Одне повідомлення: вхід + SL/TP
+}
+
+DEFAULT_EXPIRY_SL_PERCENT = 3.0 # SL (% від ціни входу) для входу, деталі якого так і не надійшли
+
+def fit_tp_distribution(tp_prices: List[float], tp_distribution: List[float]) -> Tuple[List[float], List[float]]:
+    """Узгоджує кількість TP з сигналу з tp_distribution каналу.
+
+    Зайві TP відкидаються; якщо TP менше, ніж часток розподілу, перші частки нормуються до тієї ж суми.
+    """
+    if not tp_prices or not tp_distribution:
+        return [], []
+    if len(tp_prices) >= len(tp_distribution):
+        return list(tp_prices[:len(tp_distribution)]), list(tp_distribution)
+    head = tp_distribution[:len(tp_prices)]
+    head_sum = sum(head)
+    if head_sum <= 0:
+        return [], []
+    scale = sum(tp_distribution) / head_sum
+    return list(tp_prices), [share * scale for share in head]
+
+class SignalPipeline:
+    """Єдиний шлях виконання розпізнаних сигналів для всіх каналів з config['channels'].
+
+    Етапи: validate -> size -> execute (вхід, SL/TP) -> persist. Тип сигналу визначає маршрут:
+    full - все одразу; entry - вхід по ринку та очікування деталей; details - SL/TP для очікуючого входу.
+    """
+
+    def __init__(self, bingx_api, config: dict, persist_pending: bool = True):
+        self.bingx_api = bingx_api
+        self.config = config
+        # Виконані входи, що очікують повідомлення з деталями: (channel_key, market_symbol) -> entry_info
+        self.pending_entries = pending_signals.from_config(config, on_expire=self._protect_expired_entry, persist=persist_pending)
+        metrics.PENDING_ENTRIES.set_function(lambda: len(self.pending_entries))
+
+    # --- validate ---
+    def validate(self, channel_key: str, signal: ParsedSignal) -> bool:
+        required = REQUIRED_FIELDS.get(signal.type)
+        if required is None:
+            logger.warning(f"[Pipeline {channel_key}] Невідомий тип сигналу '{signal.type}'. Ігнорується.")
+            return False
+        missing = signal.missing_fields(required)
+        if missing:
+            logger.warning(f"[Pipeline {channel_key}] Сигнал {signal.type} без обов'язкових полів {missing}. Ігнорується.")
+            return False
+        if signal.direction is not None and signal.direction not in ('LONG', 'SHORT'):
+            logger.warning(f"[Pipeline {channel_key}] Некоректний напрямок '{signal.direction}'. Ігнорується.")
+            return False
+        # SL з неправильного боку від ціни входу спрацював би одразу після входу
+        if signal.stop_loss is not None and isinstance(signal.entry_price, float) and signal.direction:
+            if (signal.direction == 'LONG' and signal.stop_loss >= signal.entry_price) or \
+               (signal.direction == 'SHORT' and signal.stop_loss <= signal.entry_price):
+                logger.warning(f"[Pipeline {channel_key}] SL {signal.stop_loss} з неправильного боку від входу {signal.entry_price} для {signal.direction}. Ігнорується.")
+                return False
+        return True
+
+    # --- size ---
+    def size(self, channel_key: str, signal: ParsedSignal) -> Dict[str, Any]:
+        channel_config = self.config.get('channels', {}).get(channel_key, {})
+        entry_percentage = channel_config.get('entry_percentage', 5.0)
+        margin_usdt = self.config.get('global_settings', {}).get('total_bankroll', 100) * (entry_percentage / 100.0)
+        return {
+            'margin_usdt': margin_usdt,
+            # Плече з конфігу каналу має пріоритет над плечем із сигналу
+            'leverage': channel_config.get('leverage') or signal.leverage or 10,
+            'tp_distribution': channel_config.get('tp_distribution', []),
+        }
+
+    # --- execute: вхід ---
+    def _execute_entry(self, channel_key: str, signal: ParsedSignal, sizing: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        api_symbol = self.bingx_api._format_symbol_for_swap(signal.pair)
+        position_side = signal.direction
+        order_side = 'buy' if position_side == 'LONG' else 'sell'
+        logger.info(f"[Pipeline {channel_key}] Вхід по ринку: {signal.pair} ({api_symbol}) {position_side}, маржа {sizing['margin_usdt']} USDT, плече {sizing['leverage']}x...")
+        market_order = self.bingx_api.place_market_order_basic(
+            symbol=api_symbol,
+            side=order_side,
+            position_side=position_side,
+            margin_usdt=sizing['margin_usdt'],
+            leverage=sizing['leverage']
+        )
+        if not market_order or not market_order.get('id') or not market_order.get('filled'):
+            logger.error(f"[Pipeline {channel_key}] Не вдалося виконати ринковий ордер для {api_symbol}. Відповідь: {market_order}")
+            return None
+        entry_info = {
+            'channel_key': channel_key,
+            'symbol': market_order.get('symbol') or api_symbol,
+            'position_side': position_side,
+            'initial_amount': market_order.get('filled'),
+            'margin_usdt': sizing['margin_usdt'],
+            'leverage': sizing['leverage'],
+            'entry_price': market_order.get('average', market_order.get('price')),
+            'market_order_id': market_order.get('id'),
+            'market_order': market_order,
+            'limit_order': None,
+            'timestamp': time.time(),
+        }
+        logger.info(f"[Pipeline {channel_key}] Ринковий ордер виконано. Обсяг: {entry_info['initial_amount']} @ {entry_info['entry_price']}.")
+
+        # Додатковий лімітний ордер (напр. нижня межа діапазону входу каналу 3). Скасовується PositionManager після TP1.
+        if signal.limit_order_price:
+            with tracing.span('limit'):
+                entry_info['limit_order'] = self.bingx_api.place_limit_order(
+                    symbol=entry_info['symbol'],
+                    direction=position_side,
+                    amount=entry_info['initial_amount'],
+                    limit_price=signal.limit_order_price,
+                    leverage=sizing['leverage']
+                )
+            if not entry_info['limit_order']:
+                logger.warning(f"[Pipeline {channel_key}] Не вдалося розмістити лімітний ордер @ {signal.limit_order_price} для {entry_info['symbol']}. Продовжуємо без нього.")
+        return entry_info
+
+    # --- execute: SL/TP + persist ---
+    def _cancel_orders(self, symbol: str, orders: List[Optional[Dict[str, Any]]]):
+        cancel_ids = [o['id'] for o in orders if o and o.get('id')]
+        if cancel_ids:
+            self.bingx_api.cancel_multiple_orders(symbol, cancel_ids)
+
+    def _complete_position(self, channel_key: str, entry_info: Dict[str, Any], sl_price: float,
+                           tp_prices: List[float], tp_distribution: List[float]) -> Optional[int]:
+        symbol = entry_info['symbol']
+        position_side = entry_info['position_side']
+        initial_amount = entry_info['initial_amount']
+        limit_order = entry_info.get('limit_order')
+
+        with tracing.span('sl'):
+            sl_order = self.bingx_api.set_stop_loss(
+                symbol=symbol,
+                position_side=position_side,
+                sl_price=sl_price,
+                amount=initial_amount
+            )
+        if not sl_order or not sl_order.get('id'):
+            logger.error(f"[Pipeline {channel_key}] Не вдалося розмістити SL ордер для {symbol}. SL Ціна: {sl_price}. Відповідь: {sl_order}")
+            self._cancel_orders(symbol, [limit_order])
+            return None
+
+        tp_prices, tp_distribution = fit_tp_distribution(tp_prices, tp_distribution)
+        tp_orders = []
+        if tp_prices and initial_amount > 0:
+            logger.info(f"[Pipeline {channel_key}] Встановлення {len(tp_prices)} TP ордер(ів) для {symbol}...")
+            with tracing.span('tps', count=len(tp_prices)):
+                tp_orders = self.bingx_api.set_take_profits(
+                    symbol=symbol,
+                    position_side=position_side,
+                    take_profit_prices=tp_prices,
+                    tp_distribution=tp_distribution,
+                    initial_amount=initial_amount
+                ) or []
+            if len(tp_orders) != len(tp_prices):
+                logger.error(f"[Pipeline {channel_key}] Не вдалося створити повний набір ({len(tp_orders)}/{len(tp_prices)}) TP ордерів для {symbol}. Збереження в БД скасовано.")
+                self._cancel_orders(symbol, [sl_order, limit_order] + tp_orders)
+                return None
+        else:
+            logger.warning(f"[Pipeline {channel_key}] TP для {symbol} не встановлюються (ціни: {tp_prices}, розподіл: {tp_distribution}). Позиція під захистом лише SL.")
+
+        # --- persist ---
+        conn: Optional[sqlite3.Connection] = None
+        try:
+            conn = data_manager.get_db_connection()
+            if not conn:
+                logger.critical(f"[Pipeline {channel_key}] Не вдалося створити з'єднання з БД для збереження позиції {symbol}!")
+                self._cancel_orders(symbol, [sl_order, limit_order] + tp_orders)
+                return None
+            position_data_to_db = {
+                'signal_channel_key': channel_key,
+                'symbol': symbol,
+                'position_side': position_side,
+                'entry_price': entry_info['entry_price'],
+                'initial_amount': initial_amount,
+                'current_amount': initial_amount,
+                'initial_margin': entry_info['margin_usdt'],
+                'leverage': entry_info['leverage'],
+                'sl_order_id': sl_order['id'],
+                'tp_order_ids': [tp['id'] for tp in tp_orders],
+                'related_limit_order_id': limit_order.get('id') if limit_order else None,
+                'stop_loss_price': sl_price,
+                'is_breakeven': 0,
+                'is_active': 1
+            }
+            with tracing.span('db'):
+                new_pos_id = data_manager.add_new_position(conn, position_data_to_db)
+            if not new_pos_id:
+                logger.error(f"[Pipeline {channel_key}] Не вдалося зберегти позицію {symbol} в БД!")
+                self._cancel_orders(symbol, [sl_order, limit_order] + tp_orders)
+                return None
+            logger.info(f"[Pipeline {channel_key}] Позиція {symbol} ({position_side}) успішно збережена в БД з ID {new_pos_id}.")
+            # Журнал ордерів позиції (для аналітики/експорту)
+            order_events = [('entry_fill', entry_info.get('market_order')), ('sl', sl_order)] + [('tp', tp) for tp in tp_orders]
+            if limit_order:
+                order_events.append(('limit', limit_order))
+            with tracing.span('db_order_events'):
+                data_manager.record_order_events(conn, symbol, order_events, position_id=new_pos_id)
+            return new_pos_id
+        except sqlite3.Error as db_err:
+            logger.error(f"[Pipeline {channel_key}] Помилка БД при збереженні позиції {symbol}: {db_err}", exc_info=True)
+            self._cancel_orders(symbol, [sl_order, limit_order] + tp_orders)
+            return None
+        finally:
+            if conn:
+                conn.close()
+
+    # --- маршрути за типом сигналу ---
+    def _process_full(self, channel_key: str, signal: ParsedSignal) -> bool:
+        sizing = self.size(channel_key, signal)
+        entry_info = self._execute_entry(channel_key, signal, sizing)
+        if not entry_info:
+            return False
+        if self._complete_position(channel_key, entry_info, signal.stop_loss, list(signal.take_profits), sizing['tp_distribution']) is None:
+            # Позиція вже відкрита, а SL/TP та лімітний ордер скасовано - без захисту її залишати не можна
+            self._secure_entry(dict(entry_info, limit_order=None))
+        return True
+
+    def _process_entry(self, channel_key: str, signal: ParsedSignal) -> bool:
+        entry_info = self._execute_entry(channel_key, signal, self.size(channel_key, signal))
+        if not entry_info:
+            return False
+        self.pending_entries.put((channel_key, entry_info['symbol']), entry_info)
+        logger.info(f"[Pipeline {channel_key}] Очікуємо деталі сигналу для {entry_info['symbol']}...")
+        return True
+
+    def _process_details(self, channel_key: str, signal: ParsedSignal) -> bool:
+        api_symbol = self.bingx_api._format_symbol_for_swap(signal.pair)
+        entry_info = self.pending_entries.pop((channel_key, api_symbol), None)
+        if not entry_info:
+            logger.warning(f"[Pipeline {channel_key}] Отримано деталі для {api_symbol}, але немає відповідного виконаного входу.")
+            return False
+        if signal.direction and signal.direction != entry_info['position_side']:
+            logger.warning(f"[Pipeline {channel_key}] Напрямок у деталях ({signal.direction}) не збігається з входом ({entry_info['position_side']}) для {api_symbol}. Використовується напрямок входу.")
+        # Перевірка SL відносно фактичної ціни входу
+        checked = signal.with_changes(direction=entry_info['position_side'], entry_price=entry_info['entry_price'])
+        if not self.validate(channel_key, checked):
+            # Позиція вже відкрита - повертаємо вхід в очікування, щоб коректні деталі ще могли надійти
+            self.pending_entries.put((channel_key, api_symbol), entry_info)
+            return False
+        tp_distribution = self.size(channel_key, signal)['tp_distribution']
+        if self._complete_position(channel_key, entry_info, signal.stop_loss, list(signal.take_profits), tp_distribution) is None:
+            # Вхід вже вилучено з очікування (TTL його не захистить), а SL/TP та лімітний ордер скасовано
+            self._secure_entry(dict(entry_info, limit_order=None))
+        return True
+
+    # --- виконаний вхід без SL/TP ---
+    def _protect_with_default_sl(self, entry_info: Dict[str, Any]) -> Optional[int]:
+        """Ставить SL за замовчуванням (pending_signals.default_sl_percent від ціни входу) і зберігає позицію без TP."""
+        channel_key = entry_info['channel_key']
+        symbol = entry_info['symbol']
+        entry_price = entry_info.get('entry_price')
+        if not entry_price:
+            logger.critical(f"[Pipeline {channel_key}] Позиція {symbol} без відомої ціни входу - SL за замовчуванням не розраховано!")
+            return None
+        sl_percent = self.config.get('pending_signals', {}).get('default_sl_percent', DEFAULT_EXPIRY_SL_PERCENT)
+        sl_offset = float(entry_price) * sl_percent / 100.0
+        sl_price = float(entry_price) - sl_offset if entry_info['position_side'] == 'LONG' else float(entry_price) + sl_offset
+        logger.warning(f"[Pipeline {channel_key}] Встановлюється SL за замовчуванням {sl_price} ({sl_percent}% від {entry_price}) для {symbol}.")
+        return self._complete_position(channel_key, entry_info, sl_price, [], [])
+
+    def _secure_entry(self, entry_info: Dict[str, Any]) -> Optional[int]:
+        """Відкрита позиція без SL та запису в БД: SL за замовчуванням, а якщо не вдалося - закриття по ринку.
+           Повертає ID збереженої позиції (None - позицію закрито або потрібне ручне втручання)."""
+        channel_key = entry_info['channel_key']
+        symbol = entry_info['symbol']
+        new_pos_id = self._protect_with_default_sl(entry_info)
+        if new_pos_id:
+            return new_pos_id
+        close_order = self.bingx_api.close_position_market(symbol, entry_info['position_side'], entry_info['initial_amount'])
+        if close_order and close_order.get('id'):
+            logger.warning(f"[Pipeline {channel_key}] Позицію {symbol} не вдалося захистити - її закрито по ринку.")
+        else:
+            logger.critical(f"[Pipeline {channel_key}] Не вдалося ні захистити, ні закрити позицію {symbol}! Потрібне ручне втручання.")
+        return None
+
+    def _protect_expired_entry(self, entry_info: Dict[str, Any]) -> Optional[int]:
+        """Деталі не надійшли за pending_signals.ttl_seconds: позиція захищається SL за замовчуванням (або закривається)."""
+        logger.warning(f"[Pipeline {entry_info['channel_key']}] Деталі для {entry_info['symbol']} не надійшли.")
+        return self._secure_entry(entry_info)
+
+    def expire_pending(self) -> int:
+        """Обробляє входи, деталі яких не надійшли за pending_signals.ttl_seconds. Викликається періодично."""
+        return self.pending_entries.expire()
+
+    def process(self, channel_key: str, signal: ParsedSignal) -> bool:
+        """Виконує розпізнаний сигнал. Повертає True, якщо за сигналом відкрито позицію (навіть якщо її довелося
+           захистити SL за замовчуванням або закрити) або вхід очікує деталей - повторно такий сигнал не виконується."""
+        if not self.validate(channel_key, signal):
+            return False
+        if signal.type == 'full':
+            return self._process_full(channel_key, signal)
+        if signal.type == 'entry':
+            return self._process_entry(channel_key, signal)
+        return self._process_details(channel_key, signal)
@@ -0,0 +1,340 @@
+# In-process simulated BingX swap exchange for replay and benchmarks (no network, no API keys)
+#
+# SimulatedExchange реалізує ту частину інтерфейсу ccxt.bingx, яку використовує BingXClient
+# (ринки, плече, тікер, ринкові/лімітні ордери, STOP_MARKET/TAKE_PROFIT_MARKET, статус, зміна та
+# скасування ордерів, позиції). BingXClient створюється з exchange=SimulatedExchange(...), тому весь
+# його код (форматування символів, округлення, логування, метрики) виконується так само, як з біржею.
+#
+# Ринкові ордери виконуються одразу за поточною ціною. Лімітні, STOP_MARKET та TAKE_PROFIT_MARKET
+# ордери виконуються, коли ціна з price feed (update_price / run_feed) досягає їхньої ціни.
+# Затримка відповіді (latency_seconds + jitter) та помилки (error_rate, inject_error) налаштовуються.
+#
+#   exchange = SimulatedExchange(latency_seconds=0.05, error_rate=0.01, seed=1)
+#   client = create_client(exchange)
+#   exchange.run_feed(random_walk({'BTC/USDT:USDT': 65000.0}, steps=1000))
+
+import logging
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+import ccxt
+
+import bingx_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICE = 1.0
+TRIGGER_ORDER_TYPES = ('STOP_MARKET', 'TAKE_PROFIT_MARKET')
+SWAP_SYMBOL_PATTERN = re.compile(r'^[A-Z0-9]+/[A-Z0-9]+:[A-Z0-9]+$') # BASE/QUOTE:SETTLE
+
+class SimulatedExchange:
+    """Імітація ccxt.bingx (swap). Ціни задаються set_price()/update_price(); ринок створюється лише для символу
+       BASE/QUOTE:SETTLE з відомою ціною (або заданого у markets), інакше - ccxt.BadSymbol, як на біржі."""
+
+    def __init__(self, default_price: float = DEFAULT_PRICE, latency_seconds: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, error_class: Type[Exception] = ccxt.NetworkError, seed: Optional[int] = None):
+        self.default_price = default_price
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_class = error_class
+        self.options: Dict[str, Any] = {}
+        self.markets: Dict[str, Dict[str, Any]] = {}
+        self.prices: Dict[str, float] = {}
+        self.leverage: Dict[tuple, int] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.open_orders: Dict[str, Dict[str, Dict[str, Any]]] = {} # символ -> {id: ордер} (для перевірки спрацювання)
+        self.positions: Dict[tuple, Dict[str, Any]] = {} # (символ, positionSide) -> позиція
+        self.realized_pnl = 0.0
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self._injected: Dict[str, List[Exception]] = {}
+        self._random = random.Random(seed)
+        self._next_order_id = 1000000
+        self._lock = threading.Lock()
+
+    # --- затримка та помилки ---
+    def inject_error(self, method: str, error: Optional[Exception] = None, count: int = 1):
+        """Наступні count викликів method (напр. 'create_order') завершаться помилкою error (за замовчуванням error_class)."""
+        with self._lock:
+            self._injected.setdefault(method, []).extend([error or self.error_class(f"bingx simulated {method} error")] * count)
+
+    def _call(self, method: str):
+        """Облік виклику API, затримка відповіді та імітація помилки (до будь-яких змін стану)."""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            injected = self._injected.get(method)
+            error = injected.pop(0) if injected else None
+            if error is None and self.error_rate and self._random.random() < self.error_rate:
+                error = self.error_class(f"bingx simulated {method} error")
+            delay = self.latency_seconds + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0)
+            if error is not None:
+                self.errors[method] = self.errors.get(method, 0) + 1
+        if delay > 0:
+            time.sleep(delay)
+        if error is not None:
+            raise error
+
+    # --- ціни та ринки ---
+    def set_price(self, symbol: str, price: float):
+        """Задає ціну без перевірки ордерів (початкові ціни)."""
+        self.prices[symbol] = float(price)
+
+    def update_price(self, symbol: str, price: float) -> List[Dict[str, Any]]:
+        """Тік price feed: нова ціна та виконання ордерів, які вона досягла. Повертає виконані ордери."""
+        price = float(price)
+        filled = []
+        with self._lock:
+            self.prices[symbol] = price
+            open_orders = self.open_orders.get(symbol)
+            if not open_orders:
+                return filled
+            for order in list(open_orders.values()):
+                if order['status'] == 'open' and self._is_triggered(order, price):
+                    fill_price = order['price'] if order['type'] == 'limit' else price
+                    self._fill(order, fill_price)
+                    filled.append(dict(order))
+        return filled
+
+    def run_feed(self, ticks: Iterable[Tuple[str, float]]) -> int:
+        """Проганяє послідовність тіків (символ, ціна). Повертає кількість виконаних ордерів."""
+        return sum(len(self.update_price(symbol, price)) for symbol, price in ticks)
+
+    @staticmethod
+    def _is_triggered(order: Dict[str, Any], price: float) -> bool:
+        if order['type'] == 'limit':
+            return price <= order['price'] if order['side'] == 'buy' else price >= order['price']
+        stop_price = order['stopPrice']
+        closes_long = order['info']['positionSide'] == 'LONG'
+        if order['type'] == 'STOP_MARKET':
+            return price <= stop_price if closes_long else price >= stop_price
+        if order['type'] == 'TAKE_PROFIT_MARKET':
+            return price >= stop_price if closes_long else price <= stop_price
+        return False
+
+    def _price(self, symbol: str) -> float:
+        return self.prices.setdefault(symbol, self.default_price)
+
+    def load_markets(self, reload: bool = False):
+        return self.markets
+
+    def market(self, symbol: str) -> Dict[str, Any]:
+        market = self.markets.get(symbol)
+        if market is None:
+            if symbol not in self.prices or not SWAP_SYMBOL_PATTERN.match(symbol):
+                raise ccxt.BadSymbol(f"bingx does not have market symbol {symbol}")
+            base, _, rest = symbol.partition('/')
+            quote = rest.split(':')[0]
+            # Точність як у реальних контрактів: ~6 значущих цифр ціни, крок обсягу обернений до ціни
+            magnitude = math.floor(math.log10(self._price(symbol)))
+            amount_step = 10.0 ** -max(0, magnitude + 3)
+            market = self.markets[symbol] = {
+                'id': f"{base}-{quote}",
+                'symbol': symbol,
+                'base': base,
+                'quote': quote,
+                'type': 'swap',
+                'precision': {'amount': amount_step, 'price': 10.0 ** (magnitude - 5)},
+                'limits': {'amount': {'min': amount_step}, 'cost': {'min': None}},
+            }
+        return market
+
+    def price_to_precision(self, symbol: str, price: float) -> str:
+        step = self.market(symbol)['precision']['price']
+        digits = max(0, -int(math.floor(math.log10(step))))
+        return f"{round(float(price), digits):.{digits}f}"
+
+    def set_leverage(self, leverage: int, symbol: str, params: Optional[dict] = None):
+        self._call('set_leverage')
+        self.market(symbol)
+        self.leverage[(symbol, (params or {}).get('side'))] = leverage
+        return {'symbol': symbol, 'leverage': leverage}
+
+    def fetch_ticker(self, symbol: str) -> Dict[str, Any]:
+        self._call('fetch_ticker')
+        self.market(symbol)
+        price = self._price(symbol)
+        return {'symbol': symbol, 'last': price, 'bid': price, 'ask': price, 'timestamp': int(time.time() * 1000)}
+
+    # --- ордери ---
+    def create_order(self, symbol: str, type: str, side: str, amount: float, price: Optional[float] = None,
+                     params: Optional[dict] = None) -> Dict[str, Any]:
+        self._call('create_order')
+        self.market(symbol)
+        params = params or {}
+        position_side = str(params.get('positionSide', 'LONG' if side == 'buy' else 'SHORT')).upper()
+        if amount is None or amount <= 0:
+            raise ccxt.InvalidOrder(f"bingx Invalid amount {amount}")
+        if type == 'limit' and price is None:
+            raise ccxt.InvalidOrder("bingx limit order requires price")
+        stop_price = params.get('stopPrice')
+        if type in TRIGGER_ORDER_TYPES and stop_price is None:
+            raise ccxt.InvalidOrder(f"bingx {type} order requires stopPrice")
+        with self._lock:
+            self._next_order_id += 1
+            order_id = str(self._next_order_id)
+            order = {
+                'id': order_id,
+                'clientOrderId': None,
+                'timestamp': int(time.time() * 1000),
+                'symbol': symbol,
+                'type': type,
+                'side': side,
+                'price': float(price) if price is not None else None,
+                'stopPrice': float(stop_price) if stop_price is not None else None,
+                'triggerPrice': float(stop_price) if stop_price is not None else None,
+                'amount': float(amount),
+                'filled': 0.0,
+                'remaining': float(amount),
+                'average': None,
+                'status': 'open',
+                'reduceOnly': type in TRIGGER_ORDER_TYPES,
+                'info': {'orderId': order_id, 'positionSide': position_side, 'type': type.upper()},
+            }
+            self.orders[order_id] = order
+            current_price = self._price(symbol)
+            if type == 'market':
+                self._fill(order, current_price)
+            elif type == 'limit' and self._is_triggered(order, current_price):
+                self._fill(order, current_price) # Лімітний ордер "через ринок" виконується одразу
+            else:
+                self.open_orders.setdefault(symbol, {})[order_id] = order
+            return dict(order)
+
+    def _fill(self, order: Dict[str, Any], price: float):
+        """Виконує ордер за ціною price та оновлює позицію (під self._lock)."""
+        key = (order['symbol'], order['info']['positionSide'])
+        position = self.positions.get(key)
+        opening = (order['side'] == 'buy') == (key[1] == 'LONG')
+        amount = order['amount']
+        if not opening:
+            # Закриваючий ордер не може закрити більше, ніж є в позиції
+            amount = min(amount, position['contracts']) if position else 0.0
+        order.update(filled=amount, remaining=order['amount'] - amount, average=price, status='closed')
+        if order['price'] is None:
+            order['price'] = price
+        self.open_orders.get(order['symbol'], {}).pop(order['id'], None)
+        if opening:
+            if position is None:
+                position = self.positions[key] = {'symbol': key[0], 'side': key[1].lower(), 'contracts': 0.0,
+                                                  'entryPrice': price, 'leverage': self.leverage.get(key)}
+            total = position['contracts'] + amount
+            position['entryPrice'] = (position['entryPrice'] * position['contracts'] + price * amount) / total
+            position['contracts'] = total
+        elif position is not None:
+            direction = 1 if key[1] == 'LONG' else -1
+            self.realized_pnl += (price - position['entryPrice']) * amount * direction
+            position['contracts'] -= amount
+            if position['contracts'] <= 1e-12:
+                del self.positions[key]
+                self._cancel_reduce_only(key)
+
+    def _cancel_reduce_only(self, key: tuple):
+        """Позицію закрито - біржа скасовує її SL/TP ордери, що залишились."""
+        for order in list(self.open_orders.get(key[0], {}).values()):
+            if order['reduceOnly'] and order['info']['positionSide'] == key[1]:
+                order['status'] = 'canceled'
+                del self.open_orders[key[0]][order['id']]
+
+    def create_market_buy_order(self, symbol: str, amount: float, params: Optional[dict] = None):
+        return self.create_order(symbol, 'market', 'buy', amount, None, params)
+
+    def create_market_sell_order(self, symbol: str, amount: float, params: Optional[dict] = None):
+        return self.create_order(symbol, 'market', 'sell', amount, None, params)
+
+    def create_limit_buy_order(self, symbol: str, amount: float, price: float, params: Optional[dict] = None):
+        return self.create_order(symbol, 'limit', 'buy', amount, float(price), params)
+
+    def create_limit_sell_order(self, symbol: str, amount: float, price: float, params: Optional[dict] = None):
+        return self.create_order(symbol, 'limit', 'sell', amount, float(price), params)
+
+    def _get_order(self, order_id: str) -> Dict[str, Any]:
+        order = self.orders.get(str(order_id))
+        if order is None:
+            raise ccxt.OrderNotFound(f"bingx order {order_id} not found")
+        return order
+
+    def fetch_order(self, order_id: str, symbol: Optional[str] = None) -> Dict[str, Any]:
+        self._call('fetch_order')
+        with self._lock:
+            return dict(self._get_order(order_id))
+
+    def fetch_open_orders(self, symbol: Optional[str] = None, since=None, limit=None, params: Optional[dict] = None) -> List[Dict[str, Any]]:
+        self._call('fetch_open_orders')
+        with self._lock:
+            books = [self.open_orders.get(symbol, {})] if symbol else list(self.open_orders.values())
+            return [dict(order) for book in books for order in book.values()]
+
+    def cancel_order(self, order_id: str, symbol: Optional[str] = None) -> Dict[str, Any]:
+        self._call('cancel_order')
+        with self._lock:
+            order = self._get_order(order_id)
+            if order['status'] != 'open':
+                raise ccxt.OrderNotFound(f"bingx order {order_id} is {order['status']}")
+            order['status'] = 'canceled'
+            self.open_orders.get(order['symbol'], {}).pop(order['id'], None)
+            return {'orderId': order['id'], 'symbol': order['symbol'], 'status': 'CANCELLED'}
+
+    def edit_order(self, id: str, symbol: str, type: str, side: str, amount: Optional[float] = None,
+                   price: Optional[float] = None, params: Optional[dict] = None) -> Dict[str, Any]:
+        self._call('edit_order')
+        params = params or {}
+        with self._lock:
+            order = self._get_order(id)
+            if order['status'] != 'open':
+                raise ccxt.InvalidOrder(f"bingx order {id} is {order['status']}")
+            if amount is not None:
+                order['amount'] = order['remaining'] = float(amount)
+            if price is not None:
+                order['price'] = float(price)
+            if params.get('stopPrice') is not None:
+                order['stopPrice'] = order['triggerPrice'] = float(params['stopPrice'])
+            return dict(order)
+
+    def fetch_positions(self, symbols: Optional[List[str]] = None, params: Optional[dict] = None) -> List[Dict[str, Any]]:
+        self._call('fetch_positions')
+        with self._lock:
+            positions = []
+            for (symbol, side), p in self.positions.items():
+                if symbols and symbol not in symbols:
+                    continue
+                mark_price = self._price(symbol)
+                direction = 1 if side == 'LONG' else -1
+                positions.append(dict(p, markPrice=mark_price, unrealizedPnl=(mark_price - p['entryPrice']) * p['contracts'] * direction))
+            return positions
+
+    # --- підсумок ---
+    def summary(self) -> Dict[str, Any]:
+        """Стан біржі: ордери за типом і статусом, відкриті позиції, PnL, кількість викликів API та помилок."""
+        with self._lock:
+            orders: Dict[str, Dict[str, int]] = {}
+            for order in self.orders.values():
+                by_status = orders.setdefault(order['type'], {})
+                by_status[order['status']] = by_status.get(order['status'], 0) + 1
+            return {
+                'orders': orders,
+                'positions': {f"{symbol} {side}": round(p['contracts'], 8) for (symbol, side), p in self.positions.items()},
+                'realized_pnl': round(self.realized_pnl, 8),
+                'calls': dict(self.calls),
+                'errors': dict(self.errors),
+            }
+
+def random_walk(start_prices: Dict[str, float], steps: int, volatility: float = 0.002,
+                seed: Optional[int] = None) -> Iterator[Tuple[str, float]]:
+    """Price feed: тіки (символ, ціна) геометричного випадкового блукання для кожного символу по черзі."""
+    rng = random.Random(seed)
+    prices = dict(start_prices)
+    for _ in range(steps):
+        for symbol, price in prices.items():
+            price *= math.exp(rng.gauss(0.0, volatility))
+            prices[symbol] = price
+            yield symbol, price
+
+def create_client(exchange: Optional[SimulatedExchange] = None, logger: Optional[logging.Logger] = None) -> bingx_client.BingXClient:
+    """BingXClient поверх симульованої біржі (ключі API не потрібні)."""
+    return bingx_client.BingXClient('sim', 'sim', logger or logging.getLogger('BingXClient'),
+                                    exchange=exchange or SimulatedExchange())
@@ -0,0 +1,100 @@
+# Startup orchestrator: runs independent startup phases concurrently and reports per-phase timings
+
+import concurrent.futures
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class StartupError(RuntimeError):
+    """Помилка у фазі старту. phase - назва фази, error - вихідний виняток."""
+
+    def __init__(self, phase: str, error: BaseException):
+        super().__init__(f"Фаза '{phase}': {error}")
+        self.phase = phase
+        self.error = error
+
+class StartupOrchestrator:
+    """Запускає фази старту бота з урахуванням залежностей між ними.
+
+    Фаза - функція func(results) -> значення, де results містить результати вже завершених фаз.
+    Фаза стартує одразу, як завершились усі її залежності, незалежні фази виконуються паралельно
+    в пулі потоків (вони блокуючі: мережа, SQLite, імпорти важких пакетів). Тому час старту
+    визначається найдовшим ланцюжком залежностей, а не сумою всіх фаз.
+    Помилка будь-якої фази зупиняє старт (ще не запущені фази скасовуються) - StartupError.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._phases: Dict[str, Tuple[Callable[[Dict[str, Any]], Any], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {} # фаза -> (початок від старту, тривалість), секунди
+        self.total_seconds = 0.0
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Tuple[str, ...] = ()):
+        if name in self._phases:
+            raise ValueError(f"Фазу '{name}' вже додано.")
+        self._phases[name] = (func, tuple(deps))
+
+    def phase(self, name: str, *deps: str):
+        """Декоратор: @orchestrator.phase('exchange', 'env')."""
+        def register(func: Callable[[Dict[str, Any]], Any]):
+            self.add(name, func, deps)
+            return func
+        return register
+
+    def _check_dependencies(self):
+        for name, (_, deps) in self._phases.items():
+            unknown = [dep for dep in deps if dep not in self._phases]
+            if unknown:
+                raise ValueError(f"Фаза '{name}' залежить від невідомих фаз: {unknown}")
+
+    def _timed(self, name: str, func: Callable[[Dict[str, Any]], Any], results: Dict[str, Any], started_at: float) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(results)
+        finally:
+            self.timings[name] = (start - started_at, time.perf_counter() - start)
+
+    def run(self) -> Dict[str, Any]:
+        """Виконує всі фази. Повертає {назва фази: результат}."""
+        self._check_dependencies()
+        started_at = time.perf_counter()
+        results: Dict[str, Any] = {}
+        waiting = dict(self._phases)
+        running: Dict[concurrent.futures.Future, str] = {}
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Startup")
+        try:
+            while waiting or running:
+                for name, (func, deps) in list(waiting.items()):
+                    if all(dep in results for dep in deps):
+                        del waiting[name]
+                        logger.debug(f"[Startup] Старт фази '{name}'.")
+                        running[executor.submit(self._timed, name, func, dict(results), started_at)] = name
+                if not running:
+                    raise ValueError(f"Циклічні залежності між фазами старту: {sorted(waiting)}")
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        raise StartupError(name, error) from error
+                    results[name] = future.result()
+        finally:
+            # Фази, що вже виконуються, перервати неможливо - не чекаємо їх, решту скасовуємо
+            executor.shutdown(wait=not running, cancel_futures=True)
+            self.total_seconds = time.perf_counter() - started_at
+        return results
+
+    def report(self) -> List[str]:
+        """Рядки таблиці таймінгів (у порядку старту фаз) для логу."""
+        lines = [f"{'phase':<20}{'start s':>10}{'duration s':>12}"]
+        for name, (offset, duration) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            lines.append(f"{name:<20}{offset:>10.3f}{duration:>12.3f}")
+        serial = sum(duration for _, duration in self.timings.values())
+        lines.append(f"Готовність за {self.total_seconds:.3f} с (послідовно було б {serial:.3f} с).")
+        return lines
+
+    def log_report(self, level: int = logging.INFO, log: Optional[logging.Logger] = None):
+        for line in self.report():
+            (log or logger).log(level, f"[Startup] {line}")
@@ -5,8 +5,12 @@ from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ContextTypes
 from telegram.constants import ChatType, MessageOriginType
 from typing import Callable, Optional # Додаємо Callable та Optional
-import threading # Додаємо threading
 import asyncio # Додаємо імпорт asyncio
+import importlib.util
+import inspect
+import os
+import signal_dispatcher
+import tracing
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +23,11 @@ async def post_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Перевіряємо, чи це переслане повідомлення з каналу
     forwarded_channel_title = None
+    forwarded_chat_id = None
     if message.forward_origin and message.forward_origin.type == MessageOriginType.CHANNEL:
         if message.forward_origin.chat and message.forward_origin.chat.title:
              forwarded_channel_title = message.forward_origin.chat.title
+             forwarded_chat_id = message.forward_origin.chat.id
              logger.debug(f"Повідомлення переслано з каналу: '{forwarded_channel_title}'")
         else:
              logger.warning("Знайдено forward_origin типу CHANNEL, але без назви чату.")
@@ -56,35 +62,73 @@ async def post_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Якщо чат правильний, логуємо та передаємо далі
     logger.info(f"Отримано пересланий пост з каналу '{forwarded_channel_title}' в цільовому чаті ({chat_id}). Текст: {signal_text[:100]}...")
 
-    # Отримуємо функцію-обробник з контексту
+    # Траса сигналу починається з моменту прийому (якщо трасування увімкнено, див. tracing.configure)
+    trace = tracing.Trace('signal', channel=forwarded_channel_title, update_id=update.update_id) if tracing.enabled() else None
+
+    # Ставимо повідомлення в чергу воркерів і одразу повертаємось - прийом оновлень не чекає на біржу/БД
+    dispatcher = context.bot_data.get("signal_dispatcher")
+    if dispatcher and dispatcher.running:
+        if not dispatcher.submit(forwarded_channel_title, signal_text, forwarded_chat_id, trace=trace):
+            # Відкинуте повідомлення вже враховано в метриці signals_total{result="dropped"} (SignalDispatcher.submit)
+            logger.warning(f"Пост з каналу '{forwarded_channel_title}' не прийнято в обробку (черга сигналів переповнена). Сигнал втрачено.")
+            tracing.finish_trace(trace)
+        return
+
+    # Отримуємо функцію-обробник з контексту (без диспетчера - виклик напряму)
     main_handler = context.bot_data.get("main_message_handler")
     if main_handler:
+        token = tracing.activate(trace)
         try:
-            # Передаємо назву джерела та текст сигналу
-            main_handler(forwarded_channel_title, signal_text)
+            # Передаємо назву джерела, текст сигналу та ID каналу-джерела (для маршрутизації за chat_id).
+            # Асинхронний обробник очікуємо, щоб він не блокував цикл подій (напр. запити до БД)
+            result = main_handler(forwarded_channel_title, signal_text, forwarded_chat_id)
+            if inspect.isawaitable(result):
+                await result
         except Exception as e:
             logger.error(f"Помилка під час виклику головного обробника: {e}", exc_info=True)
+        finally:
+            tracing.deactivate(token)
+            tracing.finish_trace(trace)
     else:
         logger.warning("Головний обробник повідомлень не знайдено в контексті бота.")
 
-def start_monitoring(token: str, config: dict, target_chat_id: int, main_message_handler: Callable) -> Optional[Application]:
+def start_monitoring(token: str, config: dict, target_chat_id: int, main_message_handler: Callable,
+                     lane_key: Optional[Callable] = None) -> Optional[Application]:
     """Створює та налаштовує екземпляр Application для Telegram бота.
     
     Args:
         token: Токен Telegram бота.
         config: Словник конфігурації.
         target_chat_id: ID цільового чату/каналу для моніторингу.
-        main_message_handler: Функція, яку потрібно викликати при отриманні нового повідомлення.
+        main_message_handler: Функція (або корутина) handler(title, text, source_chat_id), яку потрібно викликати при отриманні нового повідомлення.
+        lane_key: Функція lane_key(title, text, source_chat_id) -> ключ доріжки (напр. символ). Повідомлення з однаковим
+            ключем обробляються послідовно (FIFO), з різними - паралельно.
         
     Returns:
         Налаштований об'єкт Application або None у разі помилки.
     """
     try:
         logger.info(f"Ініціалізація Application для Telegram монітора (чат {target_chat_id})...")
-        application = Application.builder().token(token).build()
+        # Доріжки обробки сигналів; запускаються/зупиняються разом з циклом подій Application
+        dispatcher = signal_dispatcher.from_config(main_message_handler, config, lane_key=lane_key)
+
+        async def _post_init(app: Application):
+            await dispatcher.start()
+
+        async def _post_shutdown(app: Application):
+            await dispatcher.stop()
+
+        builder = Application.builder().token(token).post_init(_post_init).post_shutdown(_post_shutdown)
+        api_url = _api_url(config)
+        if api_url:
+            # Інший Bot API сервер замість api.telegram.org (напр. локальний mock_telegram_server.py)
+            builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+            logger.warning(f"[Telegram] Bot API перенаправлено на {api_url}")
+        application = builder.build()
 
         # Зберігаємо необхідні дані в контексті бота
         application.bot_data["main_message_handler"] = main_message_handler
+        application.bot_data["signal_dispatcher"] = dispatcher
         application.bot_data["config"] = config
         application.bot_data["target_chat_id"] = target_chat_id
 
@@ -99,40 +143,79 @@ def start_monitoring(token: str, config: dict, target_chat_id: int, main_message
         logger.critical(f"Помилка під час створення/налаштування Telegram Application: {e}", exc_info=True)
         return None
 
-# --- ОНОВЛЕНА ФУНКЦІЯ ДЛЯ ЗАПУСКУ В ОКРЕМОМУ ПОТОЦІ ---
-def run_telegram_polling(application: Application, stop_event: Optional[threading.Event] = None):
-    """Запускає polling для переданого Application в окремому потоці,
-       створюючи та керуючи власним циклом подій asyncio.
-    Args:
-        application: Налаштований об'єкт Application.
-        stop_event: (Не використовується run_polling напряму, але може знадобитися для інших підходів).
+def _api_url(config: dict) -> Optional[str]:
+    """Адреса Bot API з config['telegram']['api_url'] або TELEGRAM_API_URL (None - api.telegram.org)."""
+    api_url = config.get('telegram', {}).get('api_url') or os.getenv('TELEGRAM_API_URL')
+    return api_url.rstrip('/') if api_url else None
+
+def _webhook_settings(config: dict) -> Optional[dict]:
+    """Перевіряє секцію config['telegram']['webhook']. Повертає параметри для updater.start_webhook або None (тоді - polling)."""
+    webhook_config = config.get('telegram', {}).get('webhook', {})
+    webhook_url = webhook_config.get('webhook_url') or os.getenv('TELEGRAM_WEBHOOK_URL')
+    if not webhook_url:
+        logger.warning("[Telegram] Режим webhook: не задано telegram.webhook.webhook_url (або TELEGRAM_WEBHOOK_URL).")
+        return None
+    # Вбудований сервер webhook у python-telegram-bot потребує tornado (python-telegram-bot[webhooks])
+    if importlib.util.find_spec('tornado') is None:
+        logger.warning("[Telegram] Режим webhook: не встановлено python-telegram-bot[webhooks] (tornado).")
+        return None
+    return {
+        'listen': webhook_config.get('listen', '127.0.0.1'),
+        'port': int(webhook_config.get('port', 8443)),
+        'url_path': webhook_config.get('url_path', 'telegram'),
+        'webhook_url': webhook_url,
+        'cert': webhook_config.get('cert'),
+        'key': webhook_config.get('key'),
+        # Telegram додає цей токен у заголовок кожного запиту - чужі запити на порт відхиляються
+        'secret_token': os.getenv('TELEGRAM_WEBHOOK_SECRET') or webhook_config.get('secret_token'),
+    }
+
+async def _start_updater(application: Application, config: dict):
+    """Запускає прийом оновлень у режимі з config['telegram']['mode'] ('polling' за замовчуванням або 'webhook').
+       Якщо webhook неможливо налаштувати або запустити, бот переходить на polling.
+    """
+    mode = config.get('telegram', {}).get('mode', 'polling')
+    if mode == 'webhook':
+        settings = _webhook_settings(config)
+        if settings:
+            try:
+                logger.info(f"[Telegram] Запуск webhook сервера на {settings['listen']}:{settings['port']}/{settings['url_path']} "
+                            f"(публічна адреса {settings['webhook_url']})...")
+                await application.updater.start_webhook(**settings)
+                return
+            except Exception as e:
+                logger.error(f"[Telegram] Не вдалося запустити webhook сервер: {e}", exc_info=True)
+        logger.warning("[Telegram] Webhook недоступний. Перехід на polling.")
+    elif mode != 'polling':
+        logger.warning(f"[Telegram] Невідомий режим telegram.mode '{mode}'. Використовується polling.")
+    logger.info("[Telegram] Запуск polling...")
+    await application.updater.start_polling()
+
+async def run_telegram(application: Application, config: dict):
+    """Задача прийому оновлень Telegram у спільному циклі подій бота.
+
+    Виконує той самий життєвий цикл, що й run_polling/run_webhook (initialize -> post_init -> updater ->
+    start ... stop -> post_shutdown -> shutdown), але не створює власний цикл подій і не встановлює обробники
+    сигналів ОС. Працює до скасування задачі; зупинка (включно з дочищенням черги сигналів) - у finally.
     """
     if not application:
-        logger.error("[run_telegram_polling] Передано невалідний об'єкт application.")
+        logger.error("[run_telegram] Передано невалідний об'єкт application.")
         return
-
-    # Створюємо новий цикл подій для цього потоку
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    logger.info(f"[run_telegram_polling] Створено та встановлено новий цикл подій asyncio для потоку {threading.current_thread().name}.")
-
+    await application.initialize()
     try:
-        logger.info("[run_telegram_polling] Запуск Telegram монітора (application.run_polling())...")
-        # Запускаємо polling всередині створеного циклу подій
-        # run_polling тепер має знайти поточний цикл подій
-        application.run_polling()
-        logger.info("[run_telegram_polling] application.run_polling() завершено.")
-    except Exception as e:
-        logger.error(f"[run_telegram_polling] Помилка під час роботи run_polling: {e}", exc_info=True)
+        if application.post_init:
+            await application.post_init(application)
+        await _start_updater(application, config)
+        await application.start()
+        logger.info("[run_telegram] Прийом оновлень Telegram запущено.")
+        await asyncio.Event().wait() # Працюємо до скасування задачі
     finally:
-        # Гарантовано закриваємо цикл подій при виході з потоку
-        logger.info(f"[run_telegram_polling] Закриття циклу подій asyncio для потоку {threading.current_thread().name}.")
-        loop.close()
-        logger.info(f"[run_telegram_polling] Потік polling завершує роботу.")
-
-# Функція для явної зупинки (може знадобитися в майбутньому, поки не використовуємо)
-# async def stop_telegram_polling(application: Application):
-#     if application:
-#         logger.info("[stop_telegram_polling] Виклик application.shutdown()...")
-#         await application.shutdown()
-#         logger.info("[stop_telegram_polling] application.shutdown() завершено.") 
\ No newline at end of file
+        logger.info("[run_telegram] Зупинка прийому оновлень Telegram...")
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+        logger.info("[run_telegram] Прийом оновлень Telegram зупинено.")
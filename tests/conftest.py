@@ -0,0 +1,13 @@
+import pytest
+
+import data_manager
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Тимчасова БД з актуальною схемою та власним потоком асинхронного доступу. Повертає шлях до файлу."""
+    db_path = str(tmp_path / 'positions.sqlite')
+    monkeypatch.setattr(data_manager, 'DATABASE_FILE', db_path)
+    monkeypatch.setattr(data_manager, '_async_db', data_manager.AsyncDBExecutor())
+    assert data_manager.initialize_database()
+    yield db_path
+    data_manager.close_async_db()
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import data_manager
+
+def _add_position(conn, channel_key='channel_1', symbol='INJ/USDT:USDT', side='LONG', entry=10.0, amount=2.0, sl=9.0):
+    return data_manager.add_new_position(conn, {
+        'signal_channel_key': channel_key, 'symbol': symbol, 'position_side': side, 'entry_price': entry,
+        'initial_amount': amount, 'current_amount': amount, 'stop_loss_price': sl,
+    })
+
+def _recomputed_stats(conn, channel_key):
+    """Агрегати каналу, перераховані з усіх закритих позицій (еталон для інкрементального channel_stats)."""
+    rows = conn.execute("SELECT * FROM active_positions WHERE is_active = 0 AND signal_channel_key = ?", (channel_key,)).fetchall()
+    r_values = [row['realized_pnl'] / (abs(row['entry_price'] - row['stop_loss_price']) * row['initial_amount'])
+                for row in rows if row['stop_loss_price']]
+    tp_hit_distribution = {}
+    for row in rows:
+        tp_hit_distribution[row['tp_hits']] = tp_hit_distribution.get(row['tp_hits'], 0) + 1
+    return {
+        'closed_count': len(rows),
+        'wins': sum(1 for row in rows if row['realized_pnl'] > 0),
+        'losses': sum(1 for row in rows if row['realized_pnl'] < 0),
+        'realized_pnl': pytest.approx(sum(row['realized_pnl'] for row in rows)),
+        'r_count': len(r_values),
+        'avg_r': pytest.approx(sum(r_values) / len(r_values)),
+        'tp_hit_distribution': tp_hit_distribution,
+    }
+
+def test_close_position_updates_channel_stats_incrementally(temp_db):
+    conn = data_manager.get_db_connection()
+    try:
+        # (сторона, вхід, SL, виконання TP: [(залишок, PnL)], фінальне закриття: (ціна, обсяг))
+        scenarios = [
+            ('LONG', 10.0, 9.0, [], (9.0, 2.0)),                       # SL: -1R
+            ('LONG', 10.0, 9.0, [(1.0, 1.0)], (10.0, 1.0)),            # TP1, решта в БЗ
+            ('SHORT', 20.0, 22.0, [(1.0, 2.0), (0.5, 1.5)], (17.0, 0.5)), # TP1, TP2, решта по TP3
+        ]
+        for side, entry, sl, tp_fills, (exit_price, exit_amount) in scenarios:
+            position_id = _add_position(conn, side=side, entry=entry, sl=sl)
+            for new_amount, pnl in tp_fills:
+                assert data_manager.record_tp_fill(conn, position_id, new_amount, pnl)
+            position = data_manager.get_position_by_id(conn, position_id)
+            assert data_manager.close_position_with_stats(conn, position, 'closed', exit_price, exit_amount)
+
+            stats = data_manager.get_channel_stats(conn, 'channel_1')
+            expected = _recomputed_stats(conn, 'channel_1')
+            assert {key: stats[key] for key in expected} == expected
+
+        stats = data_manager.get_channel_stats(conn, 'channel_1')
+        assert (stats['closed_count'], stats['wins'], stats['losses']) == (3, 2, 1)
+        assert stats['tp_hit_distribution'] == {0: 1, 1: 1, 2: 1}
+        # Повторне закриття не змінює агрегати
+        assert not data_manager.close_position_with_stats(conn, position, 'closed again', exit_price, exit_amount)
+        assert data_manager.get_channel_stats(conn, 'channel_1') == stats
+        assert data_manager.get_channel_stats(conn, 'channel_2') is None
+    finally:
+        conn.close()
+
+def _archived_rows(conn):
+    return [tuple(row) for row in conn.execute("SELECT id, symbol, is_active, status_info, archive_seq FROM closed_positions ORDER BY id")]
+
+def test_archive_moves_only_closed_positions(temp_db):
+    conn = data_manager.get_db_connection()
+    try:
+        ids = [_add_position(conn, symbol=f"S{index}/USDT:USDT") for index in range(5)]
+        closed_ids = ids[:3]
+        for position_id in closed_ids:
+            assert data_manager.update_position_status(conn, position_id, False, 'SL')
+
+        assert data_manager.archive_closed_positions(conn, batch_size=2) == 3
+        assert [p['id'] for p in data_manager.get_active_positions(conn)] == ids[3:]
+        assert conn.execute("SELECT COUNT(*) FROM active_positions").fetchone()[0] == 2
+        archived = _archived_rows(conn)
+        assert archived == [(ids[0], 'S0/USDT:USDT', 0, 'SL', 1), (ids[1], 'S1/USDT:USDT', 0, 'SL', 1), (ids[2], 'S2/USDT:USDT', 0, 'SL', 2)]
+        # Архівна позиція доступна за тим самим ID
+        assert data_manager.get_position_by_id(conn, ids[0])['symbol'] == 'S0/USDT:USDT'
+
+        # Повторний запуск нічого не змінює
+        assert data_manager.archive_closed_positions(conn, batch_size=2) == 0
+        assert _archived_rows(conn) == archived
+        assert conn.execute("SELECT COUNT(*) FROM active_positions").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+LATEST_VERSION = max(version for version, _, _ in data_manager.MIGRATIONS)
+
+def _schema(conn):
+    return sorted(tuple(row) for row in conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+
+def test_migrations_from_fresh_db_and_rerun(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'fresh.sqlite'))
+    try:
+        assert data_manager.get_schema_version(conn) == 0
+        assert data_manager.apply_migrations(conn)
+        assert data_manager.get_schema_version(conn) == LATEST_VERSION
+        applied = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        assert applied == sorted(version for version, _, _ in data_manager.MIGRATIONS)
+        schema = _schema(conn)
+        # Повторний запуск - нічого не застосовується і схема не змінюється
+        assert data_manager.apply_migrations(conn)
+        assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(applied)
+        assert _schema(conn) == schema
+    finally:
+        conn.close()
+
+def test_migrations_upgrade_baseline_schema_db(tmp_path):
+    fresh = sqlite3.connect(str(tmp_path / 'fresh.sqlite'))
+    conn = sqlite3.connect(str(tmp_path / 'baseline.sqlite'))
+    try:
+        # БД до появи міграцій: active_positions і тригер (міграція 1), без таблиці schema_version
+        _, _, baseline_steps = data_manager.MIGRATIONS[0]
+        for step in baseline_steps:
+            conn.execute(step)
+        conn.execute("INSERT INTO active_positions (signal_channel_key, symbol, position_side, entry_price, initial_amount, current_amount) "
+                     "VALUES ('channel_1', 'INJ/USDT:USDT', 'LONG', 12.35, 4.0, 4.0)")
+        conn.commit()
+
+        assert data_manager.apply_migrations(conn)
+        assert data_manager.get_schema_version(conn) == LATEST_VERSION
+        row = conn.execute("SELECT symbol, current_amount, realized_pnl, tp_hits FROM active_positions").fetchone()
+        assert row == ('INJ/USDT:USDT', 4.0, 0, 0)
+        assert data_manager.apply_migrations(fresh)
+        assert _schema(conn) == _schema(fresh)
+    finally:
+        conn.close()
+        fresh.close()
+
+def test_async_db_runs_on_single_thread_and_propagates_errors(temp_db):
+    def db_thread(conn):
+        return threading.get_ident(), threading.current_thread().name
+
+    def failing_query(conn):
+        conn.execute("SELECT * FROM no_such_table")
+
+    async def scenario():
+        threads = await asyncio.gather(*(data_manager.run_db_async(db_thread) for _ in range(5)))
+        position_id = await data_manager.add_new_position_async({
+            'signal_channel_key': 'channel_1', 'symbol': 'INJ/USDT:USDT', 'position_side': 'LONG',
+            'entry_price': 12.35, 'initial_amount': 4.0, 'current_amount': 4.0})
+        count = await data_manager.get_total_active_position_count_async()
+        with pytest.raises(sqlite3.OperationalError, match='no_such_table'):
+            await data_manager.run_db_async(failing_query)
+        # Після помилки потік БД продовжує працювати
+        position = await data_manager.get_position_by_id_async(position_id)
+        return threads, count, position
+
+    threads, count, position = asyncio.run(scenario())
+    assert len(set(threads)) == 1
+    thread_id, thread_name = threads[0]
+    assert thread_id != threading.get_ident() and thread_name.startswith('AsyncDBThread')
+    assert count == 1
+    assert position['symbol'] == 'INJ/USDT:USDT'
+
+def _order(order_id, side='buy', amount=4.0, price=12.35):
+    return {'id': order_id, 'side': side, 'amount': amount, 'filled': amount, 'price': price, 'status': 'closed'}
+
+def test_incremental_export_writes_only_new_fills(temp_db, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    conn = data_manager.get_db_connection()
+    try:
+        assert data_manager.record_order_events(conn, 'INJ/USDT:USDT', [
+            ('entry', _order('1')), ('entry_fill', _order('1')), ('sl', _order('2', 'sell')),
+            ('tp', _order('3', 'sell')), ('tp_fill', _order('3', 'sell', 1.2)),
+        ], position_id=1) == 5
+
+        first = data_manager.export_dataset(conn, 'fills', str(tmp_path))
+        assert first and first.endswith('.parquet')
+        table = pq.read_table(first)
+        assert table.column('event_type').to_pylist() == ['entry_fill', 'tp_fill']
+        assert table.column('amount').to_pylist() == [4.0, 1.2]
+        # Нових виконань немає - файл не створюється, водяний знак не змінюється
+        watermark = data_manager._get_export_state(conn, 'fills')
+        assert data_manager.export_dataset(conn, 'fills', str(tmp_path)) == ''
+        assert data_manager._get_export_state(conn, 'fills') == watermark
+
+        assert data_manager.record_order_events(conn, 'INJ/USDT:USDT', [
+            ('limit', _order('4')), ('limit_fill', _order('4')), ('sl_fill', _order('2', 'sell', 5.2)),
+        ], position_id=1) == 3
+        second = data_manager.export_dataset(conn, 'fills', str(tmp_path))
+        assert second and second != first
+        table = pq.read_table(second)
+        assert table.column('event_type').to_pylist() == ['limit_fill', 'sl_fill']
+        assert table.column('order_id').to_pylist() == ['4', '2']
+        assert data_manager._get_export_state(conn, 'fills') == max(table.column('id').to_pylist())
+        # Повний (неінкрементальний) експорт містить усі виконання, але не зсуває водяний знак
+        full = data_manager.export_dataset(conn, 'fills', str(tmp_path / 'full'), incremental=False)
+        assert len(pq.read_table(full)) == 4
+        assert sorted(os.listdir(tmp_path / 'fills')) == sorted(os.path.basename(path) for path in (first, second))
+    finally:
+        conn.close()
@@ -0,0 +1,80 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+import log_queue
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(log_queue._Limits, 'max_message_chars', 10)
+    monkeypatch.setattr(log_queue._Limits, 'large_debug_sample_every', 3)
+    return log_queue._Limits
+
+def _record(msg, *args, level=logging.DEBUG):
+    return logging.LogRecord('test', level, __file__, 1, msg, args or None, None)
+
+def test_large_debug_sampler_keeps_every_nth_large_debug(limits):
+    sampler = log_queue.LargeDebugSampler()
+    large = [sampler.filter(_record("Ордер: %s", 'x' * 20)) for _ in range(7)]
+    assert large == [True, False, False, True, False, False, True]
+    assert (sampler.seen, sampler.skipped) == (7, 4)
+    # Короткі DEBUG та великі повідомлення вищих рівнів не відкидаються
+    assert sampler.filter(_record("коротке"))
+    assert sampler.filter(_record('y' * 20, level=logging.INFO))
+    limits.large_debug_sample_every = 1
+    assert sampler.filter(_record('x' * 20))
+    assert sampler.skipped == 4
+
+def test_formatters_truncate_long_messages(limits):
+    text = log_queue.TruncatingFormatter('%(levelname)s %(message)s').format(_record("Ордер: %s", 'x' * 15))
+    assert text == "DEBUG Ордер: xxx... [обрізано 12 символів]"
+    assert log_queue.TruncatingFormatter('%(message)s').format(_record("коротке")) == "коротке"
+
+    entry = json.loads(log_queue.TruncatingJsonFormatter(log_queue.JSON_FIELDS).format(_record('z' * 25)))
+    assert entry['message'] == 'z' * 10 + "... [обрізано 15 символів]"
+    assert entry['levelname'] == 'DEBUG'
+
+def test_queue_handler_drops_records_when_queue_is_full():
+    handler = log_queue.NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    order = {'id': '1', 'status': 'open'}
+    for index in range(5):
+        handler.handle(_record("Ордер %s: %s", index, order))
+    assert handler.dropped == 3
+    assert handler.queue.qsize() == 2
+    # Повідомлення не форматується в потоці виклику - аргументи передаються як є
+    record = handler.queue.get_nowait()
+    assert record.msg == "Ордер %s: %s" and record.args == (0, order)
+    assert record.getMessage() == "Ордер 0: {'id': '1', 'status': 'open'}"
+
+def test_install_writes_json_in_background_and_reports_losses(limits, monkeypatch):
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    monkeypatch.setattr(log_queue, '_sampler', log_queue.LargeDebugSampler())
+    limits.max_message_chars = 100
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(log_queue.TruncatingJsonFormatter(log_queue.JSON_FIELDS))
+    try:
+        log_queue.install([handler], queue_size=100)
+        logger = logging.getLogger('bot.test')
+        logger.info("Старт")
+        for _ in range(3):
+            logger.debug("Дамп: %s", 'x' * 200)
+        log_queue.stop()
+        log_queue.stop() # Повторний виклик безпечний
+    finally:
+        for installed in root.handlers[:]:
+            root.removeHandler(installed)
+        for saved in saved_handlers:
+            root.addHandler(saved)
+        root.setLevel(saved_level)
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry['message'] for entry in entries[:2]] == ["Старт", "Дамп: " + 'x' * 94 + "... [обрізано 106 символів]"]
+    assert entries[0]['name'] == 'bot.test' and entries[0]['threadName'] == 'MainThread'
+    assert entries[-1]['levelname'] == 'WARNING'
+    assert "пропущено великих DEBUG повідомлень (вибірка): 2" in entries[-1]['message']
+    assert len(entries) == 3
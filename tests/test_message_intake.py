@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+import data_manager
+import main
+import signal_dedup
+
+CONFIG = {'channels': {'channel_1': {'name': 'Канал 1'}}, 'position_limits': {'total_max_open': 5}}
+SIGNAL = "Монета: INJ LONG\nЦена входа: 12.35\nТэйки: 12.6 12.9 13.4\nСтоп: 11.8"
+
+def _seen_hashes():
+    conn = data_manager.get_db_connection()
+    try:
+        return [content_hash for content_hash, _ in data_manager.load_seen_signals(conn, 0.0, 10)]
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize('executed', [False, True])
+def test_seen_hash_is_persisted_only_for_executed_signal(temp_db, monkeypatch, executed):
+    monkeypatch.setattr(main, 'handle_new_message', lambda *args, **kwargs: executed)
+    deduplicator = signal_dedup.SignalDeduplicator(ttl_seconds=60)
+    slot_reservations = {'count': 0}
+
+    result = asyncio.run(main.process_forwarded_signal('Канал 1', SIGNAL, CONFIG, object(), deduplicator, slot_reservations))
+
+    assert result is executed
+    assert slot_reservations == {'count': 0}
+    content_hash = signal_dedup.signal_content_hash('channel_1', SIGNAL)
+    assert _seen_hashes() == ([content_hash] if executed else [])
+    # Невиконаний сигнал забуто і в пам'яті - повторне пересилання не вважається дублікатом
+    assert deduplicator.check_and_remember('channel_1', SIGNAL) == (executed, content_hash)
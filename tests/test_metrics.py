@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import metrics
+
+def _parse(text):
+    """Розбирає вивід render(): ({назва з мітками: значення}, {метрика: тип}, порядок зразків)."""
+    assert text.endswith('\n')
+    samples, types, order = {}, {}, []
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, metric_type = line.split(' ')
+            types[name] = metric_type
+        elif line and not line.startswith('#'):
+            series, value = line.rsplit(' ', 1)
+            samples[series] = float(value)
+            order.append(series)
+    return samples, types, order
+
+def test_counter_and_gauge_exposition():
+    registry = metrics.MetricsRegistry()
+    requests = registry.counter('api_requests_total', 'Запити.', ('method', 'status'))
+    requests.inc(method='GET', status='ok')
+    requests.inc(2, method='GET', status='ok')
+    requests.inc(method='POST', status='error')
+    depth = registry.gauge('queue_depth', 'Глибина черги.')
+    depth.set(7)
+    lanes = registry.gauge('active_lanes', 'Доріжки.')
+    lanes.set_function(lambda: 3)
+    broken = registry.gauge('broken', 'Помилка обчислення.')
+    broken.set_function(lambda: 1 / 0)
+
+    text = registry.render()
+    samples, types, _ = _parse(text)
+    assert types == {'api_requests_total': 'counter', 'queue_depth': 'gauge', 'active_lanes': 'gauge', 'broken': 'gauge'}
+    assert "# HELP api_requests_total Запити." in text
+    assert samples == {
+        'api_requests_total{method="GET",status="ok"}': 3,
+        'api_requests_total{method="POST",status="error"}': 1,
+        'queue_depth': 7,
+        'active_lanes': 3,
+    }
+    assert requests.value(method='GET', status='ok') == 3
+    assert requests.value(method='PUT', status='ok') == 0
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    registry = metrics.MetricsRegistry()
+    latency = registry.histogram('latency_seconds', 'Затримка.', ('endpoint',), buckets=(0.5, 0.1, 1.0))
+    # Значення, що дорівнює межі, потрапляє в кошик цієї межі (le - "менше або дорівнює")
+    for value in (0.05, 0.1, 0.3, 1.0, 2.5):
+        latency.observe(value, endpoint='/order')
+
+    samples, types, order = _parse(registry.render())
+    assert types == {'latency_seconds': 'histogram'}
+    assert order == [
+        'latency_seconds_bucket{endpoint="/order",le="0.1"}',
+        'latency_seconds_bucket{endpoint="/order",le="0.5"}',
+        'latency_seconds_bucket{endpoint="/order",le="1.0"}',
+        'latency_seconds_bucket{endpoint="/order",le="+Inf"}',
+        'latency_seconds_sum{endpoint="/order"}',
+        'latency_seconds_count{endpoint="/order"}',
+    ]
+    assert [samples[series] for series in order[:4]] == [2, 3, 4, 5]
+    assert samples['latency_seconds_sum{endpoint="/order"}'] == pytest.approx(3.95)
+    assert samples['latency_seconds_count{endpoint="/order"}'] == 5
+    assert latency.count(endpoint='/order') == 5
+    assert latency.count(endpoint='/ticker') == 0
+
+def test_histogram_time_and_label_escaping():
+    registry = metrics.MetricsRegistry()
+    histogram = registry.histogram('op_seconds', 'Операції.', ('name',), buckets=(60.0,))
+    with pytest.raises(RuntimeError):
+        with histogram.time(name='a "quoted"\\path\nnext'):
+            raise RuntimeError("операція впала") # Час записується і при помилці
+
+    samples, _, _ = _parse(registry.render())
+    assert samples['op_seconds_bucket{name="a \\"quoted\\"\\\\path\\nnext",le="60.0"}'] == 1
+    assert samples['op_seconds_count{name="a \\"quoted\\"\\\\path\\nnext"}'] == 1
+
+def test_registry_returns_existing_metric_and_rejects_type_conflicts():
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter('events_total', 'Події.')
+    assert registry.counter('events_total', 'Події.') is counter
+    with pytest.raises(ValueError):
+        registry.gauge('events_total', 'Події.')
+
+def test_http_endpoint_serves_registry():
+    registry = metrics.MetricsRegistry()
+    registry.counter('events_total', 'Події.').inc()
+
+    async def request(path):
+        server = await asyncio.start_server(lambda r, w: metrics._handle_request(r, w, registry), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response.decode()
+
+    response = asyncio.run(request('/metrics'))
+    assert response.startswith('HTTP/1.1 200 OK')
+    assert response.endswith('events_total 1\n')
+    assert asyncio.run(request('/other')).startswith('HTTP/1.1 404')
@@ -0,0 +1,31 @@
+import pending_signals
+
+KEY = ('channel', 'BTC/USDT:USDT')
+
+def test_put_pop_round_trip():
+    store = pending_signals.PendingSignalStore(persist=False)
+    entry_info = {'symbol': KEY[1], 'direction': 'LONG'}
+    store.put(KEY, entry_info)
+    assert KEY in store
+    assert store.get(KEY) is entry_info
+    assert store.pop(KEY, None) is entry_info
+    assert KEY not in store
+    assert len(store) == 0
+
+def test_pop_missing_or_expired_returns_default():
+    store = pending_signals.PendingSignalStore(ttl_seconds=60, persist=False)
+    assert store.pop(KEY) is None
+    assert store.pop(KEY, {}) == {}
+    store.put(KEY, {'symbol': KEY[1]}, now=0.0)
+    assert store.pop(KEY, None) is None
+    assert KEY in store # прострочений запис чекає expire()
+
+def test_expire_and_eviction_call_on_expire():
+    expired = []
+    store = pending_signals.PendingSignalStore(ttl_seconds=60, max_entries=2, on_expire=expired.append, persist=False)
+    for index in range(3):
+        store.put(('channel', f"S{index}"), {'symbol': f"S{index}"}, now=1000.0 + index)
+    assert [info['symbol'] for info in expired] == ['S0']
+    assert store.expire(now=1061.5) == 1
+    assert [info['symbol'] for info in expired] == ['S0', 'S1']
+    assert len(store) == 1
@@ -0,0 +1,19 @@
+import sqlite3
+
+import data_manager
+import signal_dedup
+
+def test_forget_allows_the_same_message_again():
+    deduplicator = signal_dedup.SignalDeduplicator(ttl_seconds=60)
+    is_duplicate, content_hash = deduplicator.check_and_remember('channel_1', "Монета: BTC LONG", now=100.0)
+    assert not is_duplicate
+    assert deduplicator.check_and_remember('channel_1', "монета:  btc long", now=101.0) == (True, content_hash)
+    deduplicator.forget(content_hash)
+    assert deduplicator.check_and_remember('channel_1', "Монета: BTC LONG", now=102.0) == (False, content_hash)
+
+def test_remember_seen_signal_refreshes_seen_at():
+    conn = sqlite3.connect(':memory:')
+    assert data_manager.initialize_database(conn)
+    assert data_manager.remember_seen_signal(conn, 'hash', 'channel_1', 100.0)
+    assert data_manager.remember_seen_signal(conn, 'hash', 'channel_1', 200.0)
+    assert data_manager.load_seen_signals(conn, 150.0, 10) == [('hash', 200.0)]
@@ -0,0 +1,90 @@
+import asyncio
+
+import signal_dispatcher
+
+def _dispatcher(handler, **kwargs):
+    # Ключ доріжки - символ (перший аргумент повідомлення)
+    return signal_dispatcher.SignalDispatcher(handler, lane_key=lambda symbol, index: symbol, **kwargs)
+
+def test_messages_of_one_symbol_run_in_order():
+    processed = []
+
+    async def handler(symbol, index):
+        await asyncio.sleep(0.001 * (5 - index)) # Раніші повідомлення обробляються довше
+        processed.append((symbol, index))
+
+    async def scenario():
+        dispatcher = _dispatcher(handler, workers=4)
+        await dispatcher.start()
+        for index in range(5):
+            assert dispatcher.submit('BTC', index)
+            assert dispatcher.submit('ETH', index)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert [index for symbol, index in processed if symbol == 'BTC'] == list(range(5))
+    assert [index for symbol, index in processed if symbol == 'ETH'] == list(range(5))
+
+def test_symbols_run_in_parallel_up_to_workers():
+    running = []
+    peak = []
+
+    async def handler(symbol, index):
+        running.append(symbol)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(symbol)
+
+    async def scenario():
+        dispatcher = _dispatcher(handler, workers=3)
+        await dispatcher.start()
+        for symbol in ('BTC', 'ETH', 'SOL', 'INJ', 'LINK', 'DOGE'):
+            dispatcher.submit(symbol, 0)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    # 6 доріжок: одночасно виконуються рівно workers обробників
+    assert max(peak) == 3
+    assert len(peak) == 6
+
+def test_submit_returns_false_when_queue_is_full():
+    release = None
+
+    async def handler(symbol, index):
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        dispatcher = _dispatcher(handler, max_queue_size=2)
+        assert dispatcher.submit('BTC', 0) is False # Ще не запущено
+        await dispatcher.start()
+        results = [dispatcher.submit('BTC', index) for index in range(3)]
+        qsize = dispatcher.qsize()
+        release.set()
+        await dispatcher.stop()
+        return results, qsize, dispatcher.qsize()
+
+    assert asyncio.run(scenario()) == ([True, True, False], 2, 0)
+
+def test_stop_cancels_lanes_after_drain_timeout():
+    cancelled = []
+
+    async def handler(symbol, index):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(symbol)
+            raise
+
+    async def scenario():
+        dispatcher = _dispatcher(handler)
+        await dispatcher.start()
+        dispatcher.submit('BTC', 0)
+        dispatcher.submit('BTC', 1)
+        await asyncio.sleep(0)
+        await dispatcher.stop(drain_timeout=0.01)
+        return dispatcher.running, dispatcher.qsize()
+
+    assert asyncio.run(scenario()) == (False, 0)
+    assert cancelled == ['BTC']
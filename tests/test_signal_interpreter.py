@@ -0,0 +1,47 @@
+import json
+import os
+
+import pytest
+
+import signal_interpreter
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'corpus', 'signals.jsonl')
+CHANNEL_KEYS = ('channel_1', 'channel_2', 'channel_3', 'channel_4', 'channel_5')
+
+def _corpus_texts():
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        return [json.loads(line)['text'] for line in f if line.strip()]
+
+@pytest.mark.parametrize('channel_key', CHANNEL_KEYS)
+def test_pair_hint_matches_parsed_pair(channel_key):
+    config = {'channels': {key: {'name': key} for key in CHANNEL_KEYS}}
+    signal_interpreter.load_grammars(config) # без граматик - вбудовані парсери
+    parsed = 0
+    for text in _corpus_texts():
+        parsed_signal = signal_interpreter.parse_signal(channel_key, text, config)
+        if parsed_signal:
+            parsed += 1
+            assert signal_interpreter.signal_pair_hint(channel_key, text) == parsed_signal.pair
+    assert parsed
+
+def test_route_by_normalized_title_and_chat_id():
+    config = {'channels': {
+        'channel_1': {'name': '🚀 𝐕𝐈𝐏 Марафон | Даниэль'},
+        'channel_2': {'name': 'Crypto Signals', 'chat_id': '-1002'},
+    }}
+    assert signal_interpreter.build_routing_index(config) == 3
+    # NFKC (математичні літери -> VIP), casefold, без емодзі, символів та пробілів
+    assert signal_interpreter.route_signal_source('vip марафон даниэль', config).channel_key == 'channel_1'
+    assert signal_interpreter.route_signal_source('VIP\u200dМАРАФОН | ДАНИЭЛЬ ✅', config).channel_key == 'channel_1'
+    # chat_id має пріоритет над назвою (канал перейменовано)
+    route = signal_interpreter.route_signal_source('Нова назва', config, -1002)
+    assert (route.channel_key, route.name) == ('channel_2', 'Crypto Signals')
+    assert signal_interpreter.route_signal_source('Нова назва', config, -1003) is None
+    assert signal_interpreter.route_signal_source('Crypto Signals', config, -1003).channel_key == 'channel_2'
+
+def test_routing_index_follows_config_object():
+    first = {'channels': {'channel_1': {'name': 'Канал'}}}
+    second = {'channels': {'channel_2': {'name': 'Канал'}}}
+    signal_interpreter.build_routing_index(first)
+    assert signal_interpreter.route_signal_source('Канал', second).channel_key == 'channel_2'
+    assert signal_interpreter.route_signal_source('Канал', first).channel_key == 'channel_1'
@@ -0,0 +1,104 @@
+import pytest
+
+import data_manager
+import sim_exchange
+from signal_interpreter import ParsedSignal
+from signal_pipeline import SignalPipeline
+
+SYMBOL = 'INJ/USDT:USDT'
+ENTRY_PRICE = 12.35
+CONFIG = {
+    'global_settings': {'total_bankroll': 100},
+    'channels': {'channel_1': {'name': 'Канал 1', 'entry_percentage': 5.0, 'leverage': 10, 'tp_distribution': [0.3, 0.5, 0.2]}},
+    'pending_signals': {'default_sl_percent': 3.0},
+}
+FULL = ParsedSignal(type='full', source='channel_1', pair='INJUSDT', direction='LONG', entry_price=ENTRY_PRICE,
+                    take_profits=(12.6, 12.9, 13.4), stop_loss=11.8)
+ENTRY = ParsedSignal(type='entry', source='channel_1', pair='INJUSDT', direction='LONG', entry_price='MARKET')
+DETAILS = ParsedSignal(type='details', source='channel_1', pair='INJUSDT', direction='LONG', entry_price=ENTRY_PRICE,
+                       take_profits=(12.6, 12.9, 13.4), stop_loss=11.8)
+
+@pytest.fixture
+def exchange():
+    exchange = sim_exchange.SimulatedExchange()
+    exchange.set_price(SYMBOL, ENTRY_PRICE)
+    return exchange
+
+@pytest.fixture
+def pipeline(temp_db, exchange):
+    return SignalPipeline(sim_exchange.create_client(exchange), CONFIG, persist_pending=False)
+
+def _active_positions():
+    conn = data_manager.get_db_connection()
+    try:
+        return data_manager.get_active_positions(conn)
+    finally:
+        conn.close()
+
+def _open_orders(exchange):
+    return sorted(order['type'] for order in exchange.fetch_open_orders(SYMBOL))
+
+def _fail_stop_loss(pipeline, monkeypatch, failures):
+    """Перші failures викликів set_stop_loss повертають None (біржа відхилила SL)."""
+    set_stop_loss = pipeline.bingx_api.set_stop_loss
+    calls = []
+
+    def failing_set_stop_loss(**kwargs):
+        calls.append(kwargs['sl_price'])
+        return None if len(calls) <= failures else set_stop_loss(**kwargs)
+
+    monkeypatch.setattr(pipeline.bingx_api, 'set_stop_loss', failing_set_stop_loss)
+    return calls
+
+def test_full_signal_opens_protected_position(pipeline, exchange):
+    assert pipeline.process('channel_1', FULL) is True
+    [position] = _active_positions()
+    assert (position['symbol'], position['position_side'], position['stop_loss_price']) == (SYMBOL, 'LONG', 11.8)
+    assert len(position['tp_order_ids']) == 3
+    assert _open_orders(exchange) == ['STOP_MARKET'] + ['TAKE_PROFIT_MARKET'] * 3
+    assert list(exchange.summary()['positions']) == [f"{SYMBOL} LONG"]
+
+def test_two_stage_signal_completes_pending_entry(pipeline, exchange):
+    assert pipeline.process('channel_1', ENTRY) is True
+    assert ('channel_1', SYMBOL) in pipeline.pending_entries
+    assert _active_positions() == []
+
+    assert pipeline.process('channel_1', DETAILS) is True
+    assert len(pipeline.pending_entries) == 0
+    [position] = _active_positions()
+    assert position['stop_loss_price'] == 11.8
+    assert _open_orders(exchange) == ['STOP_MARKET'] + ['TAKE_PROFIT_MARKET'] * 3
+
+def test_entry_failure_opens_nothing(pipeline, exchange):
+    exchange.inject_error('create_order')
+    assert pipeline.process('channel_1', FULL) is False
+    assert _active_positions() == []
+    assert exchange.summary()['positions'] == {}
+
+def test_sl_failure_falls_back_to_default_sl(pipeline, exchange, monkeypatch):
+    sl_prices = _fail_stop_loss(pipeline, monkeypatch, failures=1)
+    # Позицію відкрито - результат не може означати "нічого не сталося" (хеш сигналу зберігається)
+    assert pipeline.process('channel_1', FULL) is True
+    default_sl = ENTRY_PRICE * (1 - 0.03)
+    assert sl_prices == [11.8, pytest.approx(default_sl)]
+    [position] = _active_positions()
+    assert position['stop_loss_price'] == pytest.approx(default_sl)
+    assert position['tp_order_ids'] == []
+    assert _open_orders(exchange) == ['STOP_MARKET']
+
+def test_unprotectable_position_is_closed(pipeline, exchange, monkeypatch):
+    _fail_stop_loss(pipeline, monkeypatch, failures=2)
+    assert pipeline.process('channel_1', FULL) is True
+    assert _active_positions() == []
+    assert exchange.summary()['positions'] == {}
+    assert _open_orders(exchange) == []
+
+def test_details_sl_failure_protects_popped_entry(pipeline, exchange, monkeypatch):
+    assert pipeline.process('channel_1', ENTRY) is True
+    _fail_stop_loss(pipeline, monkeypatch, failures=1)
+    assert pipeline.process('channel_1', DETAILS) is True
+    # Вхід вилучено з очікування, але позиція не залишилась без SL та запису в БД
+    assert len(pipeline.pending_entries) == 0
+    [position] = _active_positions()
+    assert position['stop_loss_price'] == pytest.approx(ENTRY_PRICE * (1 - 0.03))
+    assert _open_orders(exchange) == ['STOP_MARKET']
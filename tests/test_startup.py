@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+import startup
+
+def test_phases_start_after_their_dependencies():
+    orchestrator = startup.StartupOrchestrator()
+    seen = {}
+
+    @orchestrator.phase('exchange', 'env')
+    def exchange(results):
+        seen['exchange'] = sorted(results)
+        return results['env'] + '-exchange'
+
+    @orchestrator.phase('positions', 'db', 'exchange')
+    def positions(results):
+        seen['positions'] = sorted(results)
+        return 'positions'
+
+    @orchestrator.phase('db')
+    def db(results):
+        return 'db'
+
+    @orchestrator.phase('env')
+    def env(results):
+        return 'env'
+
+    results = orchestrator.run()
+    assert results == {'env': 'env', 'db': 'db', 'exchange': 'env-exchange', 'positions': 'positions'}
+    assert 'env' in seen['exchange']
+    assert seen['positions'] == ['db', 'env', 'exchange']
+    # Фаза стартує не раніше, ніж завершилась її залежність
+    for name, deps in (('exchange', ['env']), ('positions', ['db', 'exchange'])):
+        for dep in deps:
+            dep_start, dep_duration = orchestrator.timings[dep]
+            assert orchestrator.timings[name][0] >= dep_start + dep_duration
+    assert len(orchestrator.report()) == 6
+
+def test_independent_phases_run_concurrently():
+    orchestrator = startup.StartupOrchestrator(max_workers=3)
+    # Бар'єр пропускає лише коли всі три фази виконуються одночасно
+    barrier = threading.Barrier(3, timeout=5)
+
+    def phase(results):
+        barrier.wait()
+        return threading.current_thread().name
+
+    for name in ('env', 'db', 'telegram'):
+        orchestrator.add(name, phase)
+
+    results = orchestrator.run()
+    assert len(set(results.values())) == 3
+    assert all(thread_name.startswith('Startup') for thread_name in results.values())
+
+def test_failed_phase_raises_startup_error_and_skips_dependents():
+    orchestrator = startup.StartupOrchestrator()
+    started = []
+    error = ConnectionError("exchange unavailable")
+
+    def failing(results):
+        started.append('exchange')
+        raise error
+
+    orchestrator.add('exchange', failing)
+    orchestrator.add('positions', lambda results: started.append('positions'), deps=('exchange',))
+
+    with pytest.raises(startup.StartupError) as excinfo:
+        orchestrator.run()
+    assert excinfo.value.phase == 'exchange'
+    assert excinfo.value.error is error
+    assert excinfo.value.__cause__ is error
+    assert started == ['exchange']
+    assert 'exchange' in orchestrator.timings
+
+def test_invalid_dependencies_are_rejected():
+    orchestrator = startup.StartupOrchestrator()
+    orchestrator.add('exchange', lambda results: None, deps=('env',))
+    with pytest.raises(ValueError, match='невідомих фаз'):
+        orchestrator.run()
+    with pytest.raises(ValueError, match='вже додано'):
+        orchestrator.add('exchange', lambda results: None)
+
+    orchestrator.add('env', lambda results: None, deps=('exchange',))
+    with pytest.raises(ValueError, match='Циклічні залежності'):
+        orchestrator.run()
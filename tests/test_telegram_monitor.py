@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.constants import MessageOriginType
+
+import metrics
+import signal_dispatcher
+import telegram_monitor
+import tracing
+
+TARGET_CHAT_ID = 42
+
+@pytest.fixture
+def recorder():
+    recorder = tracing.configure({'tracing': {'enabled': True}})
+    yield recorder
+    tracing.configure({})
+
+def _channel_post(text: str, update_id: int = 1):
+    origin = SimpleNamespace(type=MessageOriginType.CHANNEL, chat=SimpleNamespace(title='Канал 1', id=-1001))
+    message = SimpleNamespace(forward_origin=origin, text=text, caption=None, chat_id=TARGET_CHAT_ID)
+    return SimpleNamespace(channel_post=message, message=None, update_id=update_id)
+
+def test_rejected_post_is_logged_counted_and_traced(recorder, caplog):
+    async def scenario():
+        dispatcher = signal_dispatcher.SignalDispatcher(lambda *args: None, max_queue_size=0)
+        await dispatcher.start()
+        context = SimpleNamespace(bot_data={'target_chat_id': TARGET_CHAT_ID, 'signal_dispatcher': dispatcher})
+        await telegram_monitor.post_handler(_channel_post("Заполняю INJ long"), context)
+        await dispatcher.stop()
+
+    dropped = metrics.SIGNALS.value(result='dropped')
+    asyncio.run(scenario())
+    assert metrics.SIGNALS.value(result='dropped') == dropped + 1
+    assert len(recorder) == 1
+    assert "не прийнято в обробку" in caplog.text
+
+class _FakeUpdater:
+    def __init__(self, webhook_error=None):
+        self.webhook_error = webhook_error
+        self.calls = []
+
+    async def start_webhook(self, **settings):
+        self.calls.append(('webhook', settings))
+        if self.webhook_error:
+            raise self.webhook_error
+
+    async def start_polling(self):
+        self.calls.append(('polling', None))
+
+WEBHOOK_CONFIG = {'telegram': {'mode': 'webhook', 'webhook': {'webhook_url': 'https://bot.example.com/telegram', 'port': '8443'}}}
+
+@pytest.fixture
+def tornado_installed(monkeypatch):
+    monkeypatch.setattr(telegram_monitor.importlib.util, 'find_spec', lambda name: object())
+
+def test_webhook_mode_starts_webhook(tornado_installed):
+    updater = _FakeUpdater()
+    asyncio.run(telegram_monitor._start_updater(SimpleNamespace(updater=updater), WEBHOOK_CONFIG))
+    assert [mode for mode, _ in updater.calls] == ['webhook']
+    settings = updater.calls[0][1]
+    assert (settings['listen'], settings['port'], settings['url_path']) == ('127.0.0.1', 8443, 'telegram')
+
+def test_failed_webhook_start_falls_back_to_polling(tornado_installed, caplog):
+    updater = _FakeUpdater(webhook_error=OSError("Address already in use"))
+    asyncio.run(telegram_monitor._start_updater(SimpleNamespace(updater=updater), WEBHOOK_CONFIG))
+    assert [mode for mode, _ in updater.calls] == ['webhook', 'polling']
+    assert "Перехід на polling" in caplog.text
+
+@pytest.mark.parametrize('config', [
+    {'telegram': {'mode': 'webhook'}},  # Немає webhook_url
+    {'telegram': {'mode': 'websocket'}}, # Невідомий режим
+])
+def test_unusable_webhook_config_uses_polling(config, tornado_installed, monkeypatch):
+    monkeypatch.delenv('TELEGRAM_WEBHOOK_URL', raising=False)
+    updater = _FakeUpdater()
+    asyncio.run(telegram_monitor._start_updater(SimpleNamespace(updater=updater), config))
+    assert updater.calls == [('polling', None)]
+
+def test_webhook_without_tornado_uses_polling(monkeypatch):
+    monkeypatch.setattr(telegram_monitor.importlib.util, 'find_spec', lambda name: None)
+    assert telegram_monitor._webhook_settings(WEBHOOK_CONFIG) is None
+    updater = _FakeUpdater()
+    asyncio.run(telegram_monitor._start_updater(SimpleNamespace(updater=updater), WEBHOOK_CONFIG))
+    assert updater.calls == [('polling', None)]
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import tracing
+
+def _trace(name='signal', spans=(), **attrs):
+    trace = tracing.Trace(name, **attrs)
+    for span_name, offset_ms, duration_ms in spans:
+        start = trace.start_ns + int(offset_ms * 1e6)
+        trace.add_span(span_name, start, start + int(duration_ms * 1e6))
+    trace.end_ns = trace.start_ns + int(10 * 1e6)
+    return trace
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_recorder_writes_jsonl_in_background_and_flushes_on_close(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    recorder = tracing.TraceRecorder(max_traces=2, jsonl_path=str(path))
+    writer = recorder._writer
+    assert writer.name == 'TraceWriter' and writer.is_alive()
+    traces = [_trace(spans=[('parse', 0.5, 1.25), ('entry', 2, 5)], channel='Канал 1', index=index) for index in range(3)]
+    for trace in traces:
+        recorder.record(trace)
+    recorder.close()
+    assert not writer.is_alive()
+    recorder.close() # Повторний виклик безпечний
+
+    written = _read_jsonl(path)
+    # У файл потрапляють усі траси, у пам'яті - лише останні max_traces
+    assert [entry['trace_id'] for entry in written] == [trace.trace_id for trace in traces]
+    assert [entry['attrs']['index'] for entry in recorder.traces()] == [1, 2]
+    assert written[0]['attrs']['channel'] == 'Канал 1'
+    assert written[0]['duration_ms'] == 10.0
+    assert written[0]['spans'] == [
+        {'name': 'parse', 'offset_ms': 0.5, 'duration_ms': 1.25},
+        {'name': 'entry', 'offset_ms': 2.0, 'duration_ms': 5.0},
+    ]
+
+def test_recorder_appends_to_existing_file(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    for _ in range(2):
+        recorder = tracing.TraceRecorder(jsonl_path=str(path))
+        recorder.record(_trace())
+        recorder.close()
+    assert len(_read_jsonl(path)) == 2
+
+def test_summarize_percentiles():
+    traces = [{'duration_ms': float(value), 'spans': [{'name': 'entry', 'duration_ms': float(value) / 10}]}
+              for value in range(100, 0, -1)]
+    summary = tracing.summarize(traces)
+    # Найближчий ранг за індексом round(pct * (n - 1)) у відсортованих значеннях 1..100
+    assert summary['total'] == {'count': 100, 'p50': 51.0, 'p90': 90.0, 'p99': 99.0, 'max': 100.0}
+    assert summary['entry'] == {'count': 100, 'p50': 5.1, 'p90': 9.0, 'p99': 9.9, 'max': 10.0}
+    assert tracing.summarize([{'duration_ms': 3.0, 'spans': []}]) == {'total': {'count': 1, 'p50': 3.0, 'p90': 3.0, 'p99': 3.0, 'max': 3.0}}
+    assert tracing.summarize([]) == {}
+    assert tracing._percentile([], 50) == 0.0
+    assert tracing.format_summary(summary)[1].startswith('total')
+
+def test_spans_from_worker_threads_reach_the_jsonl_file(tmp_path, capsys):
+    path = tmp_path / 'traces.jsonl'
+    recorder = tracing.configure({'tracing': {'enabled': True, 'jsonl_path': str(path)}})
+    try:
+        assert tracing.enabled() and tracing.get_recorder() is recorder
+
+        def place_order():
+            with tracing.span('entry', order_type='market'):
+                pass
+
+        async def handle():
+            trace = tracing.start_trace('signal', channel='Канал 1')
+            with tracing.span('parse'):
+                tracing.set_attrs(symbol='INJ/USDT:USDT')
+            # Контекст (поточна траса) копіюється в потік пулу
+            await asyncio.to_thread(place_order)
+            tracing.finish_trace(trace)
+            tracing.finish_trace(trace) # Повторне завершення ігнорується
+
+        asyncio.run(handle())
+        with tracing.span('outside'): # Без активної траси - no-op
+            pass
+    finally:
+        tracing.configure({})
+    assert not tracing.enabled()
+
+    [entry] = _read_jsonl(path)
+    assert entry['attrs'] == {'channel': 'Канал 1', 'symbol': 'INJ/USDT:USDT'}
+    assert [span['name'] for span in entry['spans']] == ['parse', 'entry']
+    assert entry['spans'][1]['attrs'] == {'order_type': 'market'}
+
+    assert tracing.main([str(path)]) == 0
+    assert "Трас: 1" in capsys.readouterr().out
+    assert tracing.main([]) == 2
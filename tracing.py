@@ -0,0 +1,278 @@
+# Lightweight end-to-end latency tracing for signals (Telegram update -> order acks -> DB)
+#
+# Кожен сигнал отримує трасу (trace_id) в момент прийому в post_handler. Етапи обробки позначаються
+# спанами (with tracing.span('parse'): ...) з монотонними таймінгами. Поточна траса передається через
+# contextvars, тому спани з asyncio.to_thread та синхронного коду біржі/БД потрапляють у ту ж трасу.
+# Без активної траси span() нічого не робить (одна перевірка contextvar).
+#
+# Підсумок збереженого файлу:
+#   python tracing.py traces.jsonl
+
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TRACES = 1000
+
+class Trace:
+    """Траса одного сигналу: спани (name, start_ns від початку траси, duration_ns, attrs)."""
+
+    __slots__ = ('trace_id', 'name', 'attrs', 'start_ns', 'start_wall', 'end_ns', 'spans', '_lock')
+
+    def __init__(self, name: str, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = time.perf_counter_ns()
+        self.start_wall = time.time()
+        self.end_ns: Optional[int] = None
+        self.spans: List[tuple] = []
+        self._lock = threading.Lock() # Спани можуть додаватися з потоків пулу (asyncio.to_thread)
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, **attrs):
+        with self._lock:
+            self.spans.append((name, start_ns - self.start_ns, end_ns - start_ns, attrs))
+
+    @property
+    def duration_ns(self) -> int:
+        return (self.end_ns or time.perf_counter_ns()) - self.start_ns
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start_time': self.start_wall,
+            'duration_ms': round(self.duration_ns / 1e6, 3),
+            'attrs': self.attrs,
+            'spans': [
+                {'name': name, 'offset_ms': round(offset / 1e6, 3), 'duration_ms': round(duration / 1e6, 3), **({'attrs': attrs} if attrs else {})}
+                for name, offset, duration, attrs in self.spans
+            ],
+        }
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('signal_trace', default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def activate(trace: Optional[Trace]) -> contextvars.Token:
+    """Робить трасу поточною (напр. у доріжці диспетчера). Повернений токен - для deactivate()."""
+    return _current_trace.set(trace)
+
+def deactivate(token: contextvars.Token):
+    _current_trace.reset(token)
+
+def start_trace(name: str, **attrs) -> Trace:
+    """Створює трасу та робить її поточною у цьому контексті."""
+    trace = Trace(name, **attrs)
+    _current_trace.set(trace)
+    return trace
+
+def set_attrs(**attrs):
+    """Додає атрибути до поточної траси (напр. channel_key, symbol після розбору)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+@contextlib.contextmanager
+def _span(trace: Trace, name: str, attrs: dict):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter_ns(), **attrs)
+
+def span(name: str, **attrs):
+    """Контекстний менеджер етапу: with tracing.span('entry'): ... Без активної траси - no-op."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _span(trace, name, attrs)
+
+def record_span(name: str, start_ns: int, end_ns: int, trace: Optional[Trace] = None, **attrs):
+    """Додає вже виміряний етап (напр. очікування в черзі) за значеннями time.perf_counter_ns()."""
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start_ns, end_ns, **attrs)
+
+# --- Збір завершених трас ---
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(traces: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Перцентилі тривалості (мс) для кожного етапу та траси загалом: {назва: {count, p50, p90, p99, max}}."""
+    durations: Dict[str, List[float]] = {}
+    for trace in traces:
+        durations.setdefault('total', []).append(trace['duration_ms'])
+        for span_dict in trace['spans']:
+            durations.setdefault(span_dict['name'], []).append(span_dict['duration_ms'])
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            'count': len(values),
+            'p50': _percentile(values, 50),
+            'p90': _percentile(values, 90),
+            'p99': _percentile(values, 99),
+            'max': values[-1],
+        }
+    return summary
+
+def format_summary(summary: Dict[str, Dict[str, float]]) -> List[str]:
+    lines = [f"{'stage':<16}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for name, s in sorted(summary.items(), key=lambda item: item[0] != 'total'):
+        lines.append(f"{name:<16}{s['count']:>7}{s['p50']:>10.2f}{s['p90']:>10.2f}{s['p99']:>10.2f}{s['max']:>10.2f}")
+    return lines
+
+_WRITER_STOP = object()
+
+class TraceRecorder:
+    """Зберігає останні max_traces завершених трас і (опційно) дописує кожну у JSONL файл.
+
+    Файл відкривається один раз і пишеться фоновим потоком (пачками, з flush після кожної), тому
+    record() з доріжки диспетчера в циклі подій не чекає на диск. close() дописує чергу та закриває файл.
+    """
+
+    def __init__(self, max_traces: int = DEFAULT_MAX_TRACES, jsonl_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self._traces: deque = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._writer: Optional[threading.Thread] = None
+        if jsonl_path:
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._write_loop, name="TraceWriter", daemon=True)
+            self._writer.start()
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+    def record(self, trace: Trace):
+        trace_dict = trace.to_dict()
+        with self._lock:
+            self._traces.append(trace_dict)
+        trace_queue = self._queue
+        if trace_queue is not None:
+            trace_queue.put(trace_dict)
+
+    def _write_loop(self):
+        try:
+            f = open(self.jsonl_path, 'a', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"[Tracing] Не вдалося відкрити файл трас {self.jsonl_path}: {e}")
+            while self._queue.get() is not _WRITER_STOP:
+                pass
+            return
+        with f:
+            while True:
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = _WRITER_STOP in batch
+                try:
+                    f.writelines(json.dumps(trace_dict, ensure_ascii=False) + '\n' for trace_dict in batch if trace_dict is not _WRITER_STOP)
+                    f.flush()
+                except OSError as e:
+                    logger.error(f"[Tracing] Не вдалося записати траси у {self.jsonl_path}: {e}")
+                if stop:
+                    return
+
+    def close(self, timeout: float = 5.0):
+        """Дописує траси з черги у файл і зупиняє фоновий потік. Безпечно викликати повторно."""
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        self._queue.put(_WRITER_STOP)
+        writer.join(timeout)
+        self._queue = None
+
+    def traces(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._traces)
+
+    def export_jsonl(self, path: str) -> int:
+        """Записує всі збережені траси у JSONL файл. Повертає кількість записаних трас."""
+        traces = self.traces()
+        with open(path, 'w', encoding='utf-8') as f:
+            for trace_dict in traces:
+                f.write(json.dumps(trace_dict, ensure_ascii=False) + '\n')
+        return len(traces)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return summarize(self.traces())
+
+_recorder: Optional[TraceRecorder] = None
+
+def configure(config: dict) -> Optional[TraceRecorder]:
+    """Вмикає збір трас з секції config['tracing'] (enabled, max_traces, jsonl_path). Вимкнено за замовчуванням."""
+    global _recorder
+    close()
+    tracing_config = config.get('tracing', {})
+    if not tracing_config.get('enabled', False):
+        _recorder = None
+        return None
+    _recorder = TraceRecorder(tracing_config.get('max_traces', DEFAULT_MAX_TRACES), tracing_config.get('jsonl_path'))
+    logger.info(f"[Tracing] Трасування сигналів увімкнено (файл: {_recorder.jsonl_path or '-'}).")
+    return _recorder
+
+def get_recorder() -> Optional[TraceRecorder]:
+    return _recorder
+
+def enabled() -> bool:
+    return _recorder is not None
+
+def finish_trace(trace: Optional[Trace]):
+    """Завершує трасу та передає її в TraceRecorder."""
+    if trace is None or trace.end_ns is not None:
+        return
+    trace.end_ns = time.perf_counter_ns()
+    if _recorder is not None:
+        _recorder.record(trace)
+    logger.debug(f"[Tracing] Траса {trace.trace_id} ({trace.name}) завершена за {trace.duration_ns / 1e6:.1f} мс.")
+
+def close():
+    """Дописує траси у JSONL файл (якщо задано) та зупиняє потік запису."""
+    if _recorder is not None:
+        _recorder.close()
+
+atexit.register(close)
+
+def log_summary(level: int = logging.INFO):
+    if _recorder is None or not len(_recorder):
+        return
+    for line in format_summary(_recorder.summary()):
+        logger.log(level, f"[Tracing] {line}")
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Використання: python tracing.py traces.jsonl")
+        return 2
+    with open(argv[0], 'r', encoding='utf-8') as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    print(f"Трас: {len(traces)}")
+    for line in format_summary(summarize(traces)):
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
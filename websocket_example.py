@@ -6,13 +6,15 @@ import hashlib
 import threading
 import gzip
 import io
+import os
 
 # Налаштування API ключів
 API_KEY = '6M15q6s4P0vQT9I2BwdPoBgqbrPAwUQJqzcKMzAMY0jpk5zP1ToSklF2iDnGj5obmtHmdh6knNYFTNA'
 API_SECRET = '1g8c3ZV5TGGFYE9ZJTSXMEfKs9rusx9bMHYLhruprks6oBezJy1PurHe9EQFBbNq9FQlZjLzssoNXkyhXGQ'
 
 # Правильна URL для WebSocket API BingX згідно документації
-WS_URL = 'wss://open-api-swap.bingx.com/swap-market'
+# (BINGX_WS_URL=ws://127.0.0.1:8765/swap-market - локальний mock_bingx_server.py)
+WS_URL = os.getenv('BINGX_WS_URL', 'wss://open-api-swap.bingx.com/swap-market')
 
 # Функція для генерації підпису
 def generate_signature(params, secret_key):